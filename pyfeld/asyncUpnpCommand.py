@@ -0,0 +1,303 @@
+from __future__ import unicode_literals
+
+import asyncio
+import time
+import weakref
+
+from pyfeld.callPolicy import CallPolicy
+from pyfeld.soapAction import SoapAction
+from pyfeld.soapResponse import SoapResponseParser, SoapResult, VolumeInfo, PositionInfo, TransportSettings, \
+    MediaInfo, BrowseResult, ZoneSnapshot
+
+
+class AsyncConnectionState:
+    def __init__(self):
+        self.semaphores = dict()
+        self.idle = dict()
+
+
+class AsyncUpnpCommand:
+    """asyncio counterpart of UpnpCommand, many actions can run concurrently on one event loop"""
+
+    max_per_host = 4
+    chunk_size = 16384
+    max_idle_per_host = 4
+
+    __loop_states = weakref.WeakKeyDictionary()
+
+    def __init__(self, host):
+        self.host = host
+        self.verbose = False
+        if host.startswith("http://"):
+            self.host_name = host[7:]
+        else:
+            self.host_name = host
+        self.host_name = self.host_name.rstrip('/')
+        if ':' in self.host_name:
+            (self.address, port) = self.host_name.split(':', 1)
+            self.port = int(port)
+        else:
+            self.address = self.host_name
+            self.port = 80
+
+    @staticmethod
+    def run(coroutine):
+        async def run_and_close():
+            try:
+                return await coroutine
+            finally:
+                AsyncUpnpCommand.close_idle()
+        return asyncio.run(run_and_close())
+
+    @staticmethod
+    def close_idle():
+        state = AsyncUpnpCommand.__get_state()
+        for connections in state.idle.values():
+            for (reader, writer) in connections:
+                writer.close()
+        state.idle.clear()
+
+    @staticmethod
+    async def gather(*coroutines):
+        return await asyncio.gather(*coroutines, return_exceptions=True)
+
+    @staticmethod
+    def __get_state():
+        loop = asyncio.get_running_loop()
+        state = AsyncUpnpCommand.__loop_states.get(loop)
+        if state is None:
+            state = AsyncConnectionState()
+            AsyncUpnpCommand.__loop_states[loop] = state
+        return state
+
+    def __get_semaphore(self):
+        state = AsyncUpnpCommand.__get_state()
+        semaphore = state.semaphores.get(self.host_name)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(AsyncUpnpCommand.max_per_host)
+            state.semaphores[self.host_name] = semaphore
+        return semaphore
+
+    async def __open_connection(self):
+        idle = AsyncUpnpCommand.__get_state().idle.get(self.host_name)
+        while idle:
+            (reader, writer) = idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+        (reader, writer) = await asyncio.open_connection(self.address, self.port)
+        return reader, writer, False
+
+    def __release_connection(self, reader, writer):
+        idle = AsyncUpnpCommand.__get_state().idle.setdefault(self.host_name, list())
+        if len(idle) < AsyncUpnpCommand.max_idle_per_host:
+            idle.append((reader, writer))
+        else:
+            writer.close()
+
+    @staticmethod
+    async def __read_response(reader, feed):
+        header_block = await reader.readuntil(b"\r\n\r\n")
+        lines = header_block.decode('iso-8859-1').split("\r\n")
+        status_code = int(lines[0].split(' ')[1])
+        headers = dict()
+        for line in lines[1:]:
+            if ':' in line:
+                (key, value) = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                feed(await reader.readexactly(size))
+                await reader.readline()
+        elif 'content-length' in headers:
+            remaining = int(headers['content-length'])
+            while remaining > 0:
+                chunk = await reader.read(min(remaining, AsyncUpnpCommand.chunk_size))
+                if not chunk:
+                    raise asyncio.IncompleteReadError(b"", remaining)
+                feed(chunk)
+                remaining -= len(chunk)
+        else:
+            while True:
+                chunk = await reader.read(AsyncUpnpCommand.chunk_size)
+                if not chunk:
+                    break
+                feed(chunk)
+            headers['connection'] = 'close'
+        keep_alive = headers.get('connection', '').lower() != 'close'
+        return status_code, keep_alive
+
+    async def __post(self, request, result_class):
+        (reader, writer, reused) = await self.__open_connection()
+        parser = SoapResponseParser(result_class)
+        try:
+            writer.write(request)
+            await writer.drain()
+            (status_code, keep_alive) = await AsyncUpnpCommand.__read_response(reader, parser.feed)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            writer.close()
+            if not reused:
+                raise
+            # the device dropped an idle keep-alive connection, try once more on a fresh one
+            return await self.__post(request, result_class)
+        except BaseException:
+            writer.close()
+            raise
+        if keep_alive:
+            self.__release_connection(reader, writer)
+        else:
+            writer.close()
+        return status_code, parser.close()
+
+    async def host_send(self, action, control_path, control_name, action_args, result_class=SoapResult):
+        soap_action = SoapAction.for_service(control_name, action)
+        request = soap_action.request(control_path, self.host_name, action_args)
+        if self.verbose:
+            print(request)
+        try:
+            async with self.__get_semaphore():
+                (status_code, result) = await CallPolicy.call_async(
+                    self.host_name, lambda timeout: self.__post(request, result_class), soap_action.idempotent,
+                    (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError))
+            if status_code < 300:
+                return result
+            else:
+                print("query {0}{1} returned status_code:{2} {3}".format(self.host_name, control_path, status_code,
+                                                                        result.error or ""))
+        except Exception as e:
+            print("async host send error {0}".format(e))
+        return None
+
+    async def host_send_rendering(self, action, action_args, result_class=SoapResult):
+        return await self.host_send(action,
+                                    "/RenderingService/Control",
+                                    "RenderingControl",
+                                    action_args,
+                                    result_class)
+
+    async def host_send_transport(self, action, action_args, result_class=SoapResult):
+        return await self.host_send(action,
+                                    "/TransportService/Control",
+                                    "AVTransport",
+                                    action_args,
+                                    result_class)
+
+    async def host_send_contentdirectory(self, action, action_args, result_class=SoapResult):
+        return await self.host_send(action,
+                                    "/cd/Control",
+                                    "ContentDirectory",
+                                    action_args,
+                                    result_class)
+
+    async def play(self):
+        return await self.host_send_transport("Play", (('InstanceID', 0), ('Speed', 1)))
+
+    async def stop(self):
+        return await self.host_send_transport("Stop", (('InstanceID', 0),))
+
+    async def seek(self, value):
+        return await self.host_send_transport("Seek", (('InstanceID', 0),
+                                                       ('Unit', 'ABS_TIME'),
+                                                       ('Target', value)))
+
+    async def previous(self):
+        return await self.host_send_transport("Previous", (('InstanceID', 0),))
+
+    async def next(self):
+        return await self.host_send_transport("Next", (('InstanceID', 0),))
+
+    async def get_position_info(self):
+        return await self.host_send_transport("GetPositionInfo", (('InstanceID', 0),),
+                                              PositionInfo) or PositionInfo()
+
+    async def get_transport_setting(self):
+        return await self.host_send_transport("GetTransportSettings", (('InstanceID', 0),),
+                                              TransportSettings) or TransportSettings()
+
+    async def get_media_info(self):
+        return await self.host_send_transport("GetMediaInfo", (('InstanceID', 0),),
+                                              MediaInfo) or MediaInfo()
+
+    async def set_transport_uri(self, data):
+        add_uri = data['CurrentURI']
+        if 'raumfeldname' in data:
+            if data['raumfeldname'] == 'Station':
+                if 'TrackURI' in data:
+                    add_uri = data['TrackURI']
+        send_data = (('InstanceID', 0),
+                     ('CurrentURI', add_uri),
+                     ('CurrentURIMetaData', data['CurrentURIMetaData']))
+        return await self.host_send_transport("SetAVTransportURI", send_data) or SoapResult()
+
+    async def get_zone_snapshot(self, room_udns=()):
+        start = time.monotonic()
+        room_udns = list(room_udns)
+        results = await asyncio.gather(self.get_volume_info(),
+                                       self.get_position_info(),
+                                       self.get_transport_setting(),
+                                       self.get_media_info(),
+                                       *[self.get_room_volume(udn) for udn in room_udns])
+        snapshot = ZoneSnapshot(results[0], results[1], results[2], results[3], dict(zip(room_udns, results[4:])))
+        snapshot.latency = time.monotonic() - start
+        return snapshot
+
+    '''Rendering service'''
+
+    async def get_volume_info(self):
+        return await self.host_send_rendering("GetVolume", (('InstanceID', 0), ('Channel', 'Master')),
+                                              VolumeInfo) or VolumeInfo()
+
+    async def get_volume(self, format='plain'):
+        dict = await self.get_volume_info()
+        if format == 'json':
+            return '{ "CurrentVolume": "' + dict['CurrentVolume'] + '"}'
+        else:
+            return dict['CurrentVolume']
+
+    async def set_volume(self, value):
+        return await self.host_send_rendering("SetVolume", (('InstanceID', 0),
+                                                            ('Channel', 'Master'),
+                                                            ('DesiredVolume', value)))
+
+    async def get_room_volume(self, uuid):
+        return await self.host_send_rendering("GetRoomVolume", (('InstanceID', 0), ('Room', uuid)),
+                                              VolumeInfo) or VolumeInfo()
+
+    async def set_room_volume(self, uuid, value):
+        return await self.host_send_rendering("SetVolume", (('InstanceID', 0),
+                                                            ('Channel', 'Master'),
+                                                            ('DesiredVolume', value),
+                                                            ('Room', uuid)))
+
+    '''Content directory'''
+
+    async def browse(self, path):
+        browseData = (('ObjectID', path),
+                      ('BrowseFlag', 'BrowseMetadata'),
+                      ('Filter', '*'),
+                      ('StartingIndex', 0),
+                      ('RequestedCount', 0),
+                      ('SortCriteria', 'dc:title'))
+        return await self.host_send_contentdirectory("Browse", browseData, BrowseResult) or BrowseResult()
+
+    async def browsechildren(self, path):
+        browseData = (('ObjectID', path),
+                      ('BrowseFlag', 'BrowseDirectChildren'),
+                      ('Filter', '*'),
+                      ('StartingIndex', 0),
+                      ('RequestedCount', 0),
+                      ('SortCriteria', 'dc:title'))
+        return await self.host_send_contentdirectory("Browse", browseData, BrowseResult)
+
+    async def search(self, path, search_string):
+        browseData = (('ContainerID', path),
+                      ('SearchCriteria', search_string),
+                      ('Filter', '*'),
+                      ('StartingIndex', 0),
+                      ('RequestedCount', 0),
+                      ('SortCriteria', 'dc:title'))
+        return await self.host_send_contentdirectory("Search", browseData, BrowseResult) or BrowseResult()
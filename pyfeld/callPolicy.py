@@ -0,0 +1,212 @@
+from __future__ import unicode_literals
+
+import asyncio
+import contextvars
+import random
+import threading
+import time
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class HostUnavailable(ConnectionError):
+    pass
+
+
+class Deadline:
+    """absolute point in time a whole operation has to finish by, inherited by every device call made inside it
+
+    with Deadline(3.0):
+        zones_handler.get_zones_as_dict()
+    """
+
+    default_timeout = 5.0
+
+    __current = contextvars.ContextVar('pyfeld_deadline', default=None)
+    # --timeout of one command, it lives in the context the command runs in and ends with it
+    __call_timeout = contextvars.ContextVar('pyfeld_call_timeout', default=None)
+
+    def __init__(self, seconds):
+        self.expires = time.monotonic() + float(seconds)
+        self.token = None
+
+    def __enter__(self):
+        outer = Deadline.__current.get()
+        if outer is not None and outer.expires < self.expires:
+            self.expires = outer.expires
+        self.token = Deadline.__current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        Deadline.__current.reset(self.token)
+        self.token = None
+
+    def remaining(self):
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self):
+        return time.monotonic() >= self.expires
+
+    @staticmethod
+    def current():
+        return Deadline.__current.get()
+
+    @staticmethod
+    def set_call_timeout(seconds):
+        """longest single call for the rest of the current context instead of default_timeout"""
+        Deadline.__call_timeout.set(float(seconds))
+
+    @staticmethod
+    def call_timeout():
+        seconds = Deadline.__call_timeout.get()
+        return Deadline.default_timeout if seconds is None else seconds
+
+    @staticmethod
+    def timeout():
+        """seconds left for the next call, the call timeout applies when no deadline is active"""
+        deadline = Deadline.__current.get()
+        if deadline is None:
+            return Deadline.call_timeout()
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded("deadline exceeded")
+        return min(remaining, Deadline.call_timeout())
+
+
+class RetryPolicy:
+    attempts = 3
+    base_delay = 0.1
+    max_delay = 1.0
+
+    @staticmethod
+    def delay(attempt):
+        # full jitter exponential backoff
+        return random.uniform(0, min(RetryPolicy.max_delay, RetryPolicy.base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """per device failure counter, after failure_threshold failures calls fail fast for reset_timeout seconds
+
+    devices are told apart by host:port, a bare host means port 80
+    """
+
+    failure_threshold = 3
+    reset_timeout = 30.0
+
+    __lock = threading.Lock()
+    __hosts = dict()
+
+    @staticmethod
+    def key(host):
+        """host:port of a host name or netloc"""
+        host = host.lower()
+        if host.rpartition(':')[2].isdigit() and not host.endswith(']'):
+            return host
+        return host + ':80'
+
+    @staticmethod
+    def allow(host):
+        host = CircuitBreaker.key(host)
+        with CircuitBreaker.__lock:
+            state = CircuitBreaker.__hosts.get(host)
+            if state is None or state[1] is None:
+                return True
+            if time.monotonic() - state[1] >= CircuitBreaker.reset_timeout:
+                # half open, let one call through to probe the device
+                state[1] = time.monotonic()
+                return True
+            return False
+
+    @staticmethod
+    def record_success(host):
+        host = CircuitBreaker.key(host)
+        with CircuitBreaker.__lock:
+            CircuitBreaker.__hosts.pop(host, None)
+
+    @staticmethod
+    def record_failure(host):
+        host = CircuitBreaker.key(host)
+        with CircuitBreaker.__lock:
+            state = CircuitBreaker.__hosts.setdefault(host, [0, None])
+            state[0] += 1
+            if state[0] >= CircuitBreaker.failure_threshold:
+                state[1] = time.monotonic()
+
+    @staticmethod
+    def is_open(host):
+        host = CircuitBreaker.key(host)
+        with CircuitBreaker.__lock:
+            state = CircuitBreaker.__hosts.get(host)
+            return state is not None and state[1] is not None
+
+    @staticmethod
+    def reset(host=None):
+        with CircuitBreaker.__lock:
+            if host is None:
+                CircuitBreaker.__hosts.clear()
+            else:
+                CircuitBreaker.__hosts.pop(CircuitBreaker.key(host), None)
+
+
+class CallPolicy:
+    """runs one device call under the current deadline, retrying idempotent ones and feeding the circuit breaker
+
+    function gets the timeout in seconds for this attempt, the breaker sees one success or failure per call
+    """
+
+    @staticmethod
+    def __check(host):
+        if not CircuitBreaker.allow(host):
+            raise HostUnavailable("{0} is not responding, skipping call".format(host))
+
+    @staticmethod
+    def __may_retry(attempt, attempts, delay):
+        if attempt + 1 >= attempts:
+            return False
+        deadline = Deadline.current()
+        return deadline is None or deadline.remaining() > delay
+
+    @staticmethod
+    def call(host, function, idempotent=False, retry_on=(OSError,)):
+        attempts = RetryPolicy.attempts if idempotent else 1
+        attempt = 0
+        while True:
+            CallPolicy.__check(host)
+            try:
+                result = function(Deadline.timeout())
+                CircuitBreaker.record_success(host)
+                return result
+            except DeadlineExceeded:
+                raise
+            except retry_on:
+                delay = RetryPolicy.delay(attempt)
+                if not CallPolicy.__may_retry(attempt, attempts, delay):
+                    # the breaker counts failed calls, not attempts
+                    CircuitBreaker.record_failure(host)
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    @staticmethod
+    async def call_async(host, function, idempotent=False, retry_on=(OSError, asyncio.TimeoutError)):
+        attempts = RetryPolicy.attempts if idempotent else 1
+        attempt = 0
+        while True:
+            CallPolicy.__check(host)
+            try:
+                timeout = Deadline.timeout()
+                result = await asyncio.wait_for(function(timeout), timeout)
+                CircuitBreaker.record_success(host)
+                return result
+            except DeadlineExceeded:
+                raise
+            except retry_on:
+                delay = RetryPolicy.delay(attempt)
+                if not CallPolicy.__may_retry(attempt, attempts, delay):
+                    # the breaker counts failed calls, not attempts
+                    CircuitBreaker.record_failure(host)
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
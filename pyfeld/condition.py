@@ -0,0 +1,51 @@
+from __future__ import unicode_literals
+
+import ast
+
+
+class ConditionError(ValueError):
+    pass
+
+
+class Condition:
+    """wait condition like "volume < 5 or position >= 120", parsed and checked once, then evaluated cheaply
+
+    only comparisons, boolean and arithmetic operators, numbers, strings and the names in
+    Condition.variables are allowed, anything else (calls, attributes, subscripts...) is rejected
+    """
+
+    variables = ('volume', 'position', 'duration', 'title', 'artist', 'track')
+
+    __allowed_nodes = (ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+                       ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod,
+                       ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn,
+                       ast.Tuple, ast.Name, ast.Load, ast.Constant)
+
+    def __init__(self, text):
+        self.text = text
+        try:
+            tree = ast.parse(text.strip(), mode='eval')
+        except SyntaxError as e:
+            raise ConditionError("invalid condition '{0}': {1}".format(text, e.msg))
+        self.names = set()
+        for node in ast.walk(tree):
+            if not isinstance(node, Condition.__allowed_nodes):
+                raise ConditionError("'{0}' is not allowed in a condition".format(type(node).__name__))
+            if isinstance(node, ast.Name):
+                if node.id not in Condition.variables:
+                    raise ConditionError("unknown name '{0}', use one of {1}".format(
+                        node.id, ", ".join(Condition.variables)))
+                self.names.add(node.id)
+            elif isinstance(node, ast.Constant) and type(node.value) not in (int, float, str):
+                raise ConditionError("constant {0!r} is not allowed in a condition".format(node.value))
+        self.code = compile(tree, '<condition>', 'eval')
+
+    def uses(self, *names):
+        return any(name in self.names for name in names)
+
+    def evaluate(self, values):
+        """values maps the variables to their current values, comparing mismatched types counts as false"""
+        try:
+            return bool(eval(self.code, {'__builtins__': {}}, values))
+        except (TypeError, ZeroDivisionError):
+            return False
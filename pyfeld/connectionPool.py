@@ -0,0 +1,124 @@
+from __future__ import unicode_literals
+
+import contextlib
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class HostSession:
+    def __init__(self, host_name, pool_size):
+        self.host_name = host_name
+        self.session = requests.Session()
+        self.session.verify = False
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.last_used = time.monotonic()
+        self.users = 0
+        self.retired = False
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+    def retire(self):
+        """taken out of the pool, True when nobody is using it and it can be closed now"""
+        self.retired = True
+        return self.users == 0
+
+    def close(self):
+        try:
+            self.session.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """one keep-alive session per device (host:port), shared by every UpnpCommand talking to it
+
+    sessions dropped from the pool (idle, too many hosts, configure) are closed by their last user
+
+    with ConnectionPool.session(host_name) as session:
+        session.post(...)
+    """
+
+    pool_size = 4
+    max_hosts = 64
+    idle_timeout = 60.0
+
+    __lock = threading.Lock()
+    __sessions = dict()
+
+    @staticmethod
+    def configure(pool_size=None, max_hosts=None, idle_timeout=None):
+        with ConnectionPool.__lock:
+            if pool_size is not None:
+                ConnectionPool.pool_size = int(pool_size)
+            if max_hosts is not None:
+                ConnectionPool.max_hosts = int(max_hosts)
+            if idle_timeout is not None:
+                ConnectionPool.idle_timeout = float(idle_timeout)
+        ConnectionPool.close_all()
+
+    @staticmethod
+    @contextlib.contextmanager
+    def session(host_name):
+        """session of host_name, it stays open until the block ends even when it leaves the pool meanwhile"""
+        with ConnectionPool.__lock:
+            ConnectionPool.__evict_idle()
+            host_session = ConnectionPool.__sessions.get(host_name)
+            if host_session is None:
+                if len(ConnectionPool.__sessions) >= ConnectionPool.max_hosts:
+                    ConnectionPool.__evict_oldest()
+                host_session = HostSession(host_name, ConnectionPool.pool_size)
+                ConnectionPool.__sessions[host_name] = host_session
+            host_session.touch()
+            host_session.users += 1
+        try:
+            yield host_session.session
+        finally:
+            with ConnectionPool.__lock:
+                host_session.users -= 1
+                close = host_session.retired and host_session.users == 0
+            if close:
+                host_session.close()
+
+    @staticmethod
+    def release(host_name):
+        with ConnectionPool.__lock:
+            host_session = ConnectionPool.__sessions.pop(host_name, None)
+            close = host_session is not None and host_session.retire()
+        if close:
+            host_session.close()
+
+    @staticmethod
+    def close_all():
+        with ConnectionPool.__lock:
+            sessions = [s for s in ConnectionPool.__sessions.values() if s.retire()]
+            ConnectionPool.__sessions.clear()
+        for host_session in sessions:
+            host_session.close()
+
+    @staticmethod
+    def get_hosts():
+        with ConnectionPool.__lock:
+            return list(ConnectionPool.__sessions.keys())
+
+    @staticmethod
+    def __evict_idle():
+        now = time.monotonic()
+        for host_name, host_session in list(ConnectionPool.__sessions.items()):
+            if host_session.users == 0 and now - host_session.last_used > ConnectionPool.idle_timeout:
+                del ConnectionPool.__sessions[host_name]
+                host_session.retire()
+                host_session.close()
+
+    @staticmethod
+    def __evict_oldest():
+        # sessions in use are evicted last, their last user closes them
+        oldest = min(ConnectionPool.__sessions.values(), key=lambda s: (s.users > 0, s.last_used))
+        del ConnectionPool.__sessions[oldest.host_name]
+        if oldest.retire():
+            oldest.close()
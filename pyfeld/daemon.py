@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+from __future__ import unicode_literals
+
+import contextvars
+import io
+import json
+import os
+import socket
+import sys
+import threading
+
+from pyfeld.settings import Settings
+
+
+class DaemonClient:
+    """forwards one pyfeld command line to a running daemon, kept free of heavy imports"""
+
+    connect_timeout = 0.5
+
+    @staticmethod
+    def socket_path():
+        return os.path.join(Settings.home_directory(), "daemon.sock")
+
+    @staticmethod
+    def run(args):
+        """(exit code, output) of args run by the daemon, None when no daemon is listening
+
+        once the command is sent it may have run, a daemon going away without answering is an error
+        and not a reason to run the command again
+        """
+        if not hasattr(socket, 'AF_UNIX'):
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(DaemonClient.connect_timeout)
+            try:
+                sock.connect(DaemonClient.socket_path())
+            except OSError:
+                return None
+            # commands like wait or fade may run for minutes
+            sock.settimeout(None)
+            try:
+                sock.sendall(json.dumps({'argv': list(args)}).encode('utf-8') + b'\n')
+                reply = sock.makefile('rb').readline()
+                answer = json.loads(reply.decode('utf-8'))
+                return answer.get('code', 1), answer.get('output', '')
+            except (OSError, ValueError, AttributeError):
+                return 1, "error: pyfeld daemon closed the connection without answering\n"
+        finally:
+            sock.close()
+
+
+class ThreadOutput(io.TextIOBase):
+    """sys.stdout replacement sending the prints of a command to the buffer it captures to
+
+    the buffer lives in the context of the command, worker threads running a copy of it (fan out,
+    fades) write to the same buffer, threads of their own (listeners) write to stream
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.captured = contextvars.ContextVar('pyfeld_output', default=None)
+
+    def capture(self, buffer):
+        """buffer for the prints of the current context, None writes to stream again"""
+        self.captured.set(buffer)
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        buffer = self.captured.get()
+        if buffer is None:
+            return self.stream.write(text)
+        return buffer.write(text)
+
+    def flush(self):
+        if self.captured.get() is None:
+            self.stream.flush()
+
+
+class PyfeldDaemon:
+    """keeps topology, connection pools and caches resident and runs pyfeld command lines sent by DaemonClient
+
+    every command runs in a thread and context of its own, its options (--json, --timeout, ...) and
+    its prints stay with it while other commands run
+    """
+
+    def __init__(self, path=None):
+        self.path = path if path is not None else DaemonClient.socket_path()
+        self.sock = None
+        self.running = False
+        self.zones_handler = None
+
+    def __remove_stale_socket(self):
+        if not os.path.exists(self.path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+            raise RuntimeError("a pyfeld daemon is already listening on " + self.path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(self.path)
+        finally:
+            probe.close()
+
+    def __watch_topology(self):
+        from pyfeld.zonesHandler import ZonesHandler
+        self.zones_handler = ZonesHandler()
+        if not self.zones_handler.reprocess():
+            self.zones_handler.discover()
+        self.zones_handler.start_presence_listener()
+        # active zones are saved to data.json on every change, the commands pick that up
+        self.zones_handler.watch_topology()
+
+    def __handle(self, connection):
+        from pyfeld import rfcmd
+        try:
+            request = connection.makefile('rb').readline()
+            if not request:
+                return
+            args = json.loads(request.decode('utf-8')).get('argv', [])
+            output = io.StringIO()
+            sys.stdout.capture(output)
+            sys.stderr.capture(output)
+            try:
+                code = rfcmd.execute(['pyfeld'] + args)
+            except Exception as e:
+                output.write("error: {0}\n".format(e))
+                code = 1
+            finally:
+                sys.stdout.capture(None)
+                sys.stderr.capture(None)
+            connection.sendall(json.dumps({'code': code, 'output': output.getvalue()}).encode('utf-8') + b'\n')
+        except Exception as e:
+            print("pyfeld daemon: request failed: {0}".format(e))
+        finally:
+            connection.close()
+
+    def serve_forever(self, watch=True):
+        self.__remove_stale_socket()
+        sys.stdout = ThreadOutput(sys.stdout)
+        sys.stderr = ThreadOutput(sys.stderr)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        os.chmod(self.path, 0o600)
+        self.sock.listen(16)
+        self.running = True
+        if watch:
+            watcher = threading.Thread(target=self.__watch_topology, name="pyfeld-topology")
+            watcher.daemon = True
+            watcher.start()
+        print("pyfeld daemon listening on " + self.path)
+        try:
+            while self.running:
+                (connection, address) = self.sock.accept()
+                if not self.running:
+                    connection.close()
+                    break
+                handler = threading.Thread(target=self.__handle, args=(connection,), name="pyfeld-command")
+                handler.daemon = True
+                handler.start()
+        finally:
+            self.sock.close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            sys.stdout = sys.stdout.stream
+            sys.stderr = sys.stderr.stream
+
+    def shutdown(self):
+        """stops serve_forever, commands still running finish in their threads"""
+        self.running = False
+        # wakes the accept of serve_forever
+        wakeup = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            wakeup.connect(self.path)
+        except OSError:
+            pass
+        finally:
+            wakeup.close()
+
+
+def run_main():
+    if not hasattr(socket, 'AF_UNIX'):
+        print("pyfeld daemon needs unix domain sockets")
+        sys.exit(2)
+    watch = '--nowatch' not in sys.argv[1:]
+    try:
+        PyfeldDaemon().serve_forever(watch)
+    except KeyboardInterrupt:
+        pass
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    run_main()
@@ -0,0 +1,141 @@
+from __future__ import unicode_literals
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+from pyfeld.errorPrint import err_print
+from pyfeld.settings import Settings
+
+
+class DescriptionCache:
+    """parsed service lists of device descriptions, kept in ~/.pyfeld/descriptions.json
+
+    entries younger than trust_age are used without asking the device, older ones are
+    revalidated with ETag/Last-Modified, a changed CONFIGID.UPNP.ORG or BOOTID.UPNP.ORG
+    seen in ssdp drops the entry right away
+    """
+
+    version = 1
+    file_name = "descriptions.json"
+    trust_age = 24 * 3600
+    max_entries = 512
+
+    __lock = threading.Lock()
+    __save_lock = threading.Lock()
+    __entries = None
+    __dirty = False
+
+    @staticmethod
+    def path():
+        return Settings.home_directory() + "/" + DescriptionCache.file_name
+
+    @staticmethod
+    def __load():
+        # called with the lock held
+        if DescriptionCache.__entries is not None:
+            return DescriptionCache.__entries
+        entries = dict()
+        try:
+            with open(DescriptionCache.path(), 'r') as f:
+                content = json.load(f)
+            if content.get('version') == DescriptionCache.version:
+                entries = content.get('entries', dict())
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            err_print("DescriptionCache: ignoring unreadable cache: {0}".format(e))
+        DescriptionCache.__entries = entries
+        return entries
+
+    @staticmethod
+    def get(location):
+        with DescriptionCache.__lock:
+            return DescriptionCache.__load().get(location)
+
+    @staticmethod
+    def is_fresh(entry):
+        return time.time() - entry.get('checked', 0) < DescriptionCache.trust_age
+
+    @staticmethod
+    def put(location, services, etag=None, last_modified=None):
+        with DescriptionCache.__lock:
+            entries = DescriptionCache.__load()
+            previous = entries.get(location, dict())
+            entries[location] = {'services': services,
+                                 'etag': etag,
+                                 'last_modified': last_modified,
+                                 'config_id': previous.get('config_id'),
+                                 'boot_id': previous.get('boot_id'),
+                                 'checked': time.time()}
+            if len(entries) > DescriptionCache.max_entries:
+                oldest = sorted(entries, key=lambda key: entries[key].get('checked', 0))
+                for key in oldest[:len(entries) - DescriptionCache.max_entries]:
+                    del entries[key]
+            DescriptionCache.__dirty = True
+
+    @staticmethod
+    def touch(location):
+        """the device confirmed the entry (304), trust it for another trust_age"""
+        with DescriptionCache.__lock:
+            entry = DescriptionCache.__load().get(location)
+            if entry is not None:
+                entry['checked'] = time.time()
+                DescriptionCache.__dirty = True
+
+    @staticmethod
+    def note_ssdp(location, config_id=None, boot_id=None):
+        """drop the entry of location when the device announces a different configuration or reboot"""
+        if not location or (config_id is None and boot_id is None):
+            return
+        with DescriptionCache.__lock:
+            entry = DescriptionCache.__load().get(location)
+            if entry is None:
+                return
+            changed = ((config_id is not None and entry.get('config_id') not in (None, config_id)) or
+                       (boot_id is not None and entry.get('boot_id') not in (None, boot_id)))
+            if changed:
+                del DescriptionCache.__entries[location]
+            else:
+                if config_id is not None:
+                    entry['config_id'] = config_id
+                if boot_id is not None:
+                    entry['boot_id'] = boot_id
+            DescriptionCache.__dirty = True
+
+    @staticmethod
+    def invalidate(location=None):
+        with DescriptionCache.__lock:
+            entries = DescriptionCache.__load()
+            if location is None:
+                entries.clear()
+            else:
+                entries.pop(location, None)
+            DescriptionCache.__dirty = True
+
+    @staticmethod
+    def save():
+        # one save at a time, an older snapshot must not replace a newer one
+        with DescriptionCache.__save_lock:
+            with DescriptionCache.__lock:
+                if not DescriptionCache.__dirty:
+                    return
+                # serialised under the lock, other threads keep changing the entries while the file is written
+                content = json.dumps({'version': DescriptionCache.version, 'entries': DescriptionCache.__entries},
+                                     ensure_ascii=True)
+                DescriptionCache.__dirty = False
+            path = DescriptionCache.path()
+            temporary = None
+            try:
+                # a file of its own per writer, other pyfeld processes save at the same time
+                with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(path), prefix=DescriptionCache.file_name,
+                                                 suffix=".tmp", delete=False) as f:
+                    temporary = f.name
+                    f.write(content)
+                os.replace(temporary, path)
+            except Exception as e:
+                err_print("DescriptionCache: could not save: {0}".format(e))
+                if temporary is not None and os.path.exists(temporary):
+                    os.unlink(temporary)
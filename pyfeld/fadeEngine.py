@@ -0,0 +1,145 @@
+from __future__ import unicode_literals
+
+import contextvars
+import math
+import threading
+import time
+
+from pyfeld.upnpCommand import UpnpCommand
+
+
+class FadeCurve:
+    """progress of a fade (0..1) over its elapsed fraction (0..1)"""
+
+    linear = 'linear'
+    log = 'log'
+    scurve = 'scurve'
+    names = (linear, log, scurve)
+
+    @staticmethod
+    def progress(curve, fraction):
+        fraction = min(1.0, max(0.0, fraction))
+        if curve == FadeCurve.log:
+            # quick at the start, gentle towards the end, like turning a volume knob
+            return math.log10(1.0 + 9.0 * fraction)
+        if curve == FadeCurve.scurve:
+            return fraction * fraction * (3.0 - 2.0 * fraction)
+        return fraction
+
+
+class Fade:
+    """volume ramp over one or more targets, each target is (label, set_volume(value))
+
+    a step is sent whenever the rounded volume changes, but never faster than the targets
+    answered SetVolume so far, slow devices get bigger steps instead of a queue of requests
+    """
+
+    # shortest time between two steps, 20 steps a second at most
+    min_step_interval = 0.05
+    # weight of the latest SetVolume round trip in the latency estimate
+    latency_weight = 0.3
+
+    def __init__(self, targets, from_value, to_value, duration, curve=FadeCurve.linear, on_done=None):
+        if curve not in FadeCurve.names:
+            raise ValueError("unknown fade curve '{0}', use one of {1}".format(curve, ", ".join(FadeCurve.names)))
+        self.targets = targets
+        self.from_value = int(from_value)
+        self.to_value = int(to_value)
+        self.duration = max(0.0, float(duration))
+        self.curve = curve
+        self.on_done = on_done
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+        self.latency = 0.0
+        self.steps = 0
+        self.thread = None
+
+    def value_at(self, elapsed):
+        if self.duration == 0:
+            return self.to_value
+        progress = FadeCurve.progress(self.curve, elapsed / self.duration)
+        return int(round(self.from_value + (self.to_value - self.from_value) * progress))
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def wait(self, timeout=None):
+        """True when the fade ran to its end, False when it was cancelled or is still running"""
+        self.done.wait(timeout)
+        return self.done.is_set() and not self.cancelled.is_set()
+
+    def __send(self, value):
+        result = UpnpCommand.fan_out([(label, set_volume, (value,)) for (label, set_volume) in self.targets])
+        if self.steps == 0:
+            self.latency = result.latency
+        else:
+            self.latency += Fade.latency_weight * (result.latency - self.latency)
+        self.steps += 1
+
+    def run(self):
+        try:
+            start = time.monotonic()
+            last_value = None
+            while not self.cancelled.is_set():
+                now = time.monotonic()
+                if now - start >= self.duration:
+                    break
+                value = self.value_at(now - start)
+                next_step = now + Fade.min_step_interval
+                if value != last_value:
+                    self.__send(value)
+                    last_value = value
+                    next_step = now + max(Fade.min_step_interval, self.latency)
+                # a cancel wakes the wait at once
+                self.cancelled.wait(max(0.0, next_step - time.monotonic()))
+            if not self.cancelled.is_set():
+                if last_value != self.to_value:
+                    self.__send(self.to_value)
+                if self.on_done is not None:
+                    self.on_done()
+        finally:
+            self.done.set()
+
+
+class FadeEngine:
+    """runs fades on background threads, one per key (zone or room), a new fade cancels the running one right away"""
+
+    __lock = threading.Lock()
+    __fades = dict()
+
+    @staticmethod
+    def start(key, targets, from_value, to_value, duration, curve=FadeCurve.linear, on_done=None):
+        fade = Fade(targets, from_value, to_value, duration, curve, on_done)
+        with FadeEngine.__lock:
+            running = FadeEngine.__fades.get(key)
+            if running is not None:
+                running.cancel()
+            FadeEngine.__fades[key] = fade
+        # the steps use the transport and timeouts of the command that started the fade
+        fade.thread = threading.Thread(target=contextvars.copy_context().run, args=(FadeEngine.__run, key, fade),
+                                       name="pyfeld-fade")
+        fade.thread.daemon = True
+        fade.thread.start()
+        return fade
+
+    @staticmethod
+    def __run(key, fade):
+        try:
+            fade.run()
+        finally:
+            with FadeEngine.__lock:
+                if FadeEngine.__fades.get(key) is fade:
+                    del FadeEngine.__fades[key]
+
+    @staticmethod
+    def cancel(key):
+        with FadeEngine.__lock:
+            fade = FadeEngine.__fades.pop(key, None)
+        if fade is not None:
+            fade.cancel()
+        return fade is not None
+
+    @staticmethod
+    def is_fading(key):
+        with FadeEngine.__lock:
+            return key in FadeEngine.__fades
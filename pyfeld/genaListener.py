@@ -0,0 +1,210 @@
+from __future__ import unicode_literals
+
+import http.server
+import socketserver
+import threading
+import urllib3
+from xml.parsers import expat
+
+from pyfeld.errorPrint import err_print
+from pyfeld.localNetwork import LocalNetwork
+from pyfeld.upnpsoap import UpnpSoap
+
+
+class GenaSubscription:
+    def __init__(self, event_url, callback):
+        self.event_url = event_url
+        self.callback = callback
+        self.sid = None
+        self.timer = None
+
+
+class GenaListener:
+    """receives UPnP GENA events (NOTIFY) for the subscriptions made through it
+
+    callback(variables) is called on a server thread with the evented state variables of one
+    notification, the LastChange variable of AVTransport and RenderingControl comes unpacked
+    """
+
+    timeout = 300
+    # renew this many seconds before the subscription runs out
+    renew_margin = 30
+    # the first NOTIFY may overtake the SUBSCRIBE answer carrying its SID
+    sid_wait = 2.0
+
+    def __init__(self):
+        self.server = None
+        self.thread = None
+        self.condition = threading.Condition()
+        self.subscriptions = dict()
+
+    def start(self):
+        if self.server is not None:
+            return
+        listener = self
+
+        class NotifyHandler(http.server.BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_NOTIFY(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length)
+                known = listener.notify(self.headers.get('SID'), body)
+                self.send_response(200 if known else 412)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+        self.server = socketserver.ThreadingTCPServer(('', 0), NotifyHandler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="pyfeld-gena")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            subscriptions = list(self.subscriptions.values())
+        for subscription in subscriptions:
+            self.unsubscribe(subscription)
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def callback_url(self, event_url):
+        host = urllib3.util.parse_url(event_url).host
+        address = LocalNetwork.address_towards(host)
+        if address is None:
+            return None
+        return "http://{0}:{1}/event".format(address, self.server.server_address[1])
+
+    def subscribe(self, event_url, callback):
+        """GenaSubscription kept alive until unsubscribe, None when the device refused"""
+        self.start()
+        callback_url = self.callback_url(event_url)
+        if callback_url is None:
+            err_print("gena: no route to {0}".format(event_url))
+            return None
+        subscription = GenaSubscription(event_url, callback)
+        response = UpnpSoap.request("SUBSCRIBE", event_url, {'CALLBACK': '<' + callback_url + '>',
+                                                             'NT': 'upnp:event',
+                                                             'TIMEOUT': 'Second-{0}'.format(GenaListener.timeout)},
+                                    False)
+        if response is None or response.status != 200 or not response.headers.get('SID'):
+            err_print("gena: subscribe to {0} failed".format(event_url))
+            return None
+        self.__register(subscription, response)
+        return subscription
+
+    def __register(self, subscription, response):
+        with self.condition:
+            if subscription.sid is not None:
+                self.subscriptions.pop(subscription.sid, None)
+            subscription.sid = response.headers.get('SID')
+            self.subscriptions[subscription.sid] = subscription
+            self.condition.notify_all()
+        self.__schedule_renewal(subscription, response.headers.get('TIMEOUT', ''))
+
+    def __schedule_renewal(self, subscription, timeout_header):
+        try:
+            seconds = int(timeout_header.lower().replace('second-', ''))
+        except ValueError:
+            seconds = GenaListener.timeout
+        delay = max(seconds / 2, seconds - GenaListener.renew_margin)
+        subscription.timer = threading.Timer(delay, self.__renew, (subscription,))
+        subscription.timer.daemon = True
+        subscription.timer.start()
+
+    def __renew(self, subscription):
+        with self.condition:
+            if self.subscriptions.get(subscription.sid) is not subscription:
+                return
+        response = UpnpSoap.request("SUBSCRIBE", subscription.event_url,
+                                    {'SID': subscription.sid, 'TIMEOUT': 'Second-{0}'.format(GenaListener.timeout)})
+        if response is not None and response.status == 200:
+            self.__schedule_renewal(subscription, response.headers.get('TIMEOUT', ''))
+            return
+        # the device forgot us (reboot), start over
+        callback_url = self.callback_url(subscription.event_url)
+        if callback_url is not None:
+            response = UpnpSoap.request("SUBSCRIBE", subscription.event_url,
+                                        {'CALLBACK': '<' + callback_url + '>',
+                                         'NT': 'upnp:event',
+                                         'TIMEOUT': 'Second-{0}'.format(GenaListener.timeout)},
+                                        False)
+            if response is not None and response.status == 200 and response.headers.get('SID'):
+                self.__register(subscription, response)
+                return
+        err_print("gena: lost subscription to {0}".format(subscription.event_url))
+
+    def unsubscribe(self, subscription):
+        with self.condition:
+            self.subscriptions.pop(subscription.sid, None)
+        if subscription.timer is not None:
+            subscription.timer.cancel()
+        if subscription.sid is not None:
+            UpnpSoap.request("UNSUBSCRIBE", subscription.event_url, {'SID': subscription.sid})
+
+    def notify(self, sid, body):
+        with self.condition:
+            self.condition.wait_for(lambda: sid in self.subscriptions, GenaListener.sid_wait)
+            subscription = self.subscriptions.get(sid)
+        if subscription is None:
+            return False
+        try:
+            subscription.callback(GenaListener.parse_propertyset(body))
+        except Exception as e:
+            err_print("gena: event handler failed: {0}".format(e))
+        return True
+
+    @staticmethod
+    def parse_propertyset(data):
+        """evented variables of a NOTIFY body, LastChange is replaced by the variables it carries"""
+        variables = dict()
+        stack = []
+        chunks = []
+
+        def start_element(name, attributes):
+            stack.append(name.split(':')[-1])
+            del chunks[:]
+
+        def end_element(name):
+            name = stack.pop()
+            # the variables are the children of e:property
+            if len(stack) == 2 and stack[1] == 'property':
+                variables[name] = ''.join(chunks)
+            del chunks[:]
+
+        parser = expat.ParserCreate()
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+        parser.CharacterDataHandler = chunks.append
+        parser.Parse(data, True)
+        if 'LastChange' in variables:
+            variables.update(GenaListener.parse_last_change(variables.pop('LastChange')))
+        return variables
+
+    @staticmethod
+    def parse_last_change(text):
+        """val attributes of the first instance of a LastChange event, per channel values only for Master"""
+        variables = dict()
+        depth = [0]
+
+        def start_element(name, attributes):
+            depth[0] += 1
+            name = name.split(':')[-1]
+            if depth[0] == 3 and 'val' in attributes:
+                if attributes.get('channel', 'Master') == 'Master':
+                    variables[name] = attributes['val']
+
+        def end_element(name):
+            depth[0] -= 1
+
+        parser = expat.ParserCreate()
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+        try:
+            parser.Parse(text.encode('utf-8'), True)
+        except expat.ExpatError as e:
+            err_print("gena: unreadable LastChange: {0}".format(e))
+        return variables
@@ -40,6 +40,10 @@ import xml.etree.ElementTree as ET
 
 import subprocess
 from time import sleep
+from urllib.parse import urlsplit
+
+from pyfeld.callPolicy import CallPolicy
+from pyfeld.localNetwork import LocalNetwork
 
 class HostDevice:
 
@@ -74,8 +78,14 @@ class RaumfeldDeviceSettings:
     def set_verbose(self):
         self.verbose = True
 
+    def __get(self, url, idempotent=True, **kwargs):
+        # zone changes are sent once, a retried connectRoomsToZone could regroup rooms twice
+        # the breaker key is the host:port of the url, like the SOAP and description calls to the same device
+        return CallPolicy.call(urlsplit(url).netloc, lambda timeout: requests.get(url, timeout=timeout, **kwargs),
+                               idempotent)
+
     def retrieve_device_settings(self):
-        self.local_ip = self.get_local_ip_address()
+        self.local_ip = self.get_local_ip_address(self.server_ip)
         json_result = self.get_hostdata("device")
         if json_result is None:
             return
@@ -126,11 +136,17 @@ class RaumfeldDeviceSettings:
         return hash_result
 
     @staticmethod
-    def get_local_ip_address():
+    def get_local_ip_address(target=None):
+        """local address facing target (the device), the first local interface without target"""
         try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            s.connect(("8.8.8.8", 80))
-            res = s.getsockname()[0]
+            if target is not None:
+                res = LocalNetwork.address_towards(target)
+            else:
+                addresses = LocalNetwork.addresses()
+                res = addresses[0] if len(addresses) else None
+            if res is None:
+                print("get_local_ip_address: no local address found")
+                return None
             print("Local IP address:" + res)
             return res
         except Exception as err:
@@ -142,7 +158,7 @@ class RaumfeldDeviceSettings:
             requests.packages.urllib3.disable_warnings()
             url = "http://"+self.server_ip+":47365/getMediaServers"
             print(url)
-            r = requests.get(url)
+            r = self.__get(url)
             root = ET.fromstring(r.content)
             #print(ET.dump(root))
 
@@ -162,7 +178,7 @@ class RaumfeldDeviceSettings:
             for item in rooms:
                 url += item+","
             url = url[:-1]
-            r = requests.get(url)
+            r = self.__get(url, False)
             return r
 
         except Exception as err:
@@ -178,7 +194,7 @@ class RaumfeldDeviceSettings:
             for item in rooms:
                 url += item+","
             url = url[:-1]
-            r = requests.get(url)
+            r = self.__get(url, False)
             return r
 
         except Exception as err:
@@ -198,7 +214,7 @@ class RaumfeldDeviceSettings:
             requests.packages.urllib3.disable_warnings()
             url = "http://" + self.server_ip + ":47365/"+cmd+"?"
             url += "&roomUDN=" + uuid
-            r = requests.get(url)
+            r = self.__get(url, False)
             return r
 
         except Exception as err:
@@ -210,7 +226,7 @@ class RaumfeldDeviceSettings:
             requests.packages.urllib3.disable_warnings()
             url = "http://" + self.server_ip + ":47365/dropRoomJob?"
             url += "&roomUDN=" + room_udn
-            r = requests.get(url)
+            r = self.__get(url, False)
             return r
 
         except Exception as err:
@@ -223,7 +239,7 @@ class RaumfeldDeviceSettings:
             requests.packages.urllib3.disable_warnings()
             url = "http://"+self.server_ip+":47365/getZones"
             print(url)
-            r = requests.get(url)
+            r = self.__get(url)
             root = ET.fromstring(r.content)
             #print(ET.dump(root))
 
@@ -249,7 +265,7 @@ class RaumfeldDeviceSettings:
                        "X-AuthKey": self.create_auth_key()}
             url = "https://"+self.server_ip+":48366/raumfeldSetup/v1/" + what
             print(url)
-            r = requests.get(url, headers=headers, verify=False)
+            r = self.__get(url, headers=headers, verify=False)
             return r
         except Exception as err:
             print("Exception get_hostdata: {0}".format(err))
@@ -0,0 +1,140 @@
+from __future__ import unicode_literals
+
+import ipaddress
+import socket
+import struct
+import sys
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class LocalInterface:
+    def __init__(self, name, address, netmask):
+        self.name = name
+        self.address = address
+        self.netmask = netmask
+        self.interface = ipaddress.IPv4Interface(address + "/" + netmask)
+
+    @property
+    def network(self):
+        return self.interface.network
+
+    def scan_range(self, max_addresses):
+        """the attached subnet, narrowed around our own address when it is too large to scan"""
+        network = self.network
+        prefix = network.prefixlen
+        while network.num_addresses > max_addresses and prefix < 32:
+            prefix += 1
+            network = ipaddress.IPv4Interface(self.address + "/" + str(prefix)).network
+        return str(network)
+
+
+class LocalNetwork:
+    """IPv4 interfaces of this machine with their real netmasks, no route to the internet needed"""
+
+    # a /22 at most, bigger subnets are narrowed around the local address
+    max_scan_addresses = 1024
+
+    if sys.platform == 'darwin':
+        SIOCGIFADDR = 0xc0206921
+        SIOCGIFNETMASK = 0xc0206925
+    else:
+        SIOCGIFADDR = 0x8915
+        SIOCGIFNETMASK = 0x891b
+
+    @staticmethod
+    def __ioctl_address(sock, name, request):
+        ifreq = struct.pack('256s', name.encode('utf-8')[:15])
+        return socket.inet_ntoa(fcntl.ioctl(sock.fileno(), request, ifreq)[20:24])
+
+    @staticmethod
+    def __from_ioctl():
+        interfaces = []
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            for (index, name) in socket.if_nameindex():
+                try:
+                    address = LocalNetwork.__ioctl_address(sock, name, LocalNetwork.SIOCGIFADDR)
+                    netmask = LocalNetwork.__ioctl_address(sock, name, LocalNetwork.SIOCGIFNETMASK)
+                except OSError:
+                    # no IPv4 address on this interface
+                    continue
+                interfaces.append(LocalInterface(name, address, netmask))
+        finally:
+            sock.close()
+        return interfaces
+
+    @staticmethod
+    def __from_hostname():
+        interfaces = []
+        try:
+            infos = socket.getaddrinfo(socket.gethostname(), None, socket.AF_INET)
+        except OSError:
+            return interfaces
+        for address in sorted(set(info[4][0] for info in infos)):
+            interfaces.append(LocalInterface('', address, '255.255.255.0'))
+        return interfaces
+
+    @staticmethod
+    def __from_route(target):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            # connecting an udp socket sends nothing, it only picks the outgoing address
+            sock.connect((target, 80))
+            return [LocalInterface('', sock.getsockname()[0], '255.255.255.0')]
+        except OSError:
+            return []
+        finally:
+            sock.close()
+
+    @staticmethod
+    def interfaces(include_loopback=False):
+        found = []
+        if fcntl is not None and hasattr(socket, 'if_nameindex'):
+            try:
+                found = LocalNetwork.__from_ioctl()
+            except OSError:
+                found = []
+        if not any(not interface.interface.is_loopback for interface in found):
+            found.extend(LocalNetwork.__from_hostname())
+        if not any(not interface.interface.is_loopback for interface in found):
+            found.extend(LocalNetwork.__from_route('239.255.255.250'))
+        result = []
+        seen = set()
+        for interface in found:
+            if interface.address in seen or interface.address == '0.0.0.0':
+                continue
+            if interface.interface.is_loopback and not include_loopback:
+                continue
+            seen.add(interface.address)
+            result.append(interface)
+        return result
+
+    @staticmethod
+    def addresses():
+        return [interface.address for interface in LocalNetwork.interfaces()]
+
+    @staticmethod
+    def scan_ranges():
+        ranges = []
+        for interface in LocalNetwork.interfaces():
+            scan_range = interface.scan_range(LocalNetwork.max_scan_addresses)
+            if scan_range not in ranges:
+                ranges.append(scan_range)
+        return ranges
+
+    @staticmethod
+    def address_towards(target):
+        """local address used to reach target, None when there is no route"""
+        routed = LocalNetwork.__from_route(target)
+        if len(routed) == 0:
+            return None
+        return routed[0].address
+
+
+if __name__ == "__main__":
+    for found in LocalNetwork.interfaces(True):
+        print(found.name, found.address, found.netmask, found.scan_range(LocalNetwork.max_scan_addresses))
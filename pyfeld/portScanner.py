@@ -0,0 +1,114 @@
+from __future__ import unicode_literals
+
+import errno
+import ipaddress
+import selectors
+import socket
+import time
+
+
+class PortScanner:
+    """non blocking tcp connect scan, open addresses are handed out as soon as the connect completes
+
+    for ip in PortScanner.scan("192.168.1.0/24"):
+        if check(ip):
+            break
+    """
+
+    port = 47365
+    max_parallel = 256
+    connect_timeout = 0.5
+    # guessed home network ranges when the local one gives nothing
+    fallback_ranges = ('192.168.0.0/24', '192.168.1.0/24', '192.168.178.0/24', '192.168.2.0/24',
+                       '172.31.0.0/26', '10.0.0.0/24', '10.1.1.0/24', '10.90.90.0/24')
+
+    @staticmethod
+    def hosts(ranges):
+        """addresses of one or more CIDR ranges (space or comma separated), each address only once
+
+        the ranges are interleaved so every subnet is scanned from the start
+        """
+        if isinstance(ranges, str):
+            ranges = ranges.replace(',', ' ').split()
+        iterators = []
+        for cidr in ranges:
+            try:
+                network = ipaddress.ip_network(cidr, strict=False)
+            except ValueError:
+                continue
+            iterators.append(network.hosts() if network.num_addresses > 1 else iter([network.network_address]))
+        seen = set()
+        while iterators:
+            for iterator in list(iterators):
+                address = next(iterator, None)
+                if address is None:
+                    iterators.remove(iterator)
+                    continue
+                ip = str(address)
+                if ip not in seen:
+                    seen.add(ip)
+                    yield ip
+
+    @staticmethod
+    def __start(selector, ip, port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        result = sock.connect_ex((ip, port))
+        if result not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN):
+            sock.close()
+            return False
+        selector.register(sock, selectors.EVENT_WRITE, (ip, time.monotonic()))
+        return True
+
+    @staticmethod
+    def __finish(selector, sock):
+        selector.unregister(sock)
+        sock.close()
+
+    @staticmethod
+    def scan(ranges, port=None, max_parallel=None, timeout=None, stop=None):
+        """generator over addresses accepting connections on port, stop iterating or set the stop event to end
+        the scan"""
+        if port is None:
+            port = PortScanner.port
+        if max_parallel is None:
+            max_parallel = PortScanner.max_parallel
+        if timeout is None:
+            timeout = PortScanner.connect_timeout
+        pending = PortScanner.hosts(ranges)
+        selector = selectors.DefaultSelector()
+        exhausted = False
+        try:
+            while stop is None or not stop.is_set():
+                while not exhausted and len(selector.get_map()) < max_parallel:
+                    ip = next(pending, None)
+                    if ip is None:
+                        exhausted = True
+                    else:
+                        PortScanner.__start(selector, ip, port)
+                if len(selector.get_map()) == 0:
+                    return
+                now = time.monotonic()
+                oldest = min(key.data[1] for key in selector.get_map().values())
+                for (key, events) in selector.select(max(0.0, oldest + timeout - now)):
+                    ip = key.data[0]
+                    error = key.fileobj.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    PortScanner.__finish(selector, key.fileobj)
+                    if error == 0:
+                        yield ip
+                now = time.monotonic()
+                for key in list(selector.get_map().values()):
+                    if now - key.data[1] >= timeout:
+                        PortScanner.__finish(selector, key.fileobj)
+        finally:
+            for key in list(selector.get_map().values()):
+                PortScanner.__finish(selector, key.fileobj)
+            selector.close()
+
+
+if __name__ == "__main__":
+    import sys
+    started = time.monotonic()
+    for found in PortScanner.scan(sys.argv[1:] or PortScanner.fallback_ranges):
+        print(found)
+    print("scan took {0:.2f}s".format(time.monotonic() - started))
@@ -0,0 +1,128 @@
+from __future__ import unicode_literals
+
+import json
+import os
+
+from pyfeld.errorPrint import err_print
+from pyfeld.settings import Settings
+
+
+class QuickIndex:
+    """lookup tables derived from data.json, kept in ~/.pyfeld/quickindex.json
+
+    rooms:      room name -> [room udn, zone index, zone host]
+    entities:   udn -> [kind, zone index or None, name]
+    unassigned: names of the rooms in no zone, in data.json order
+
+    the index stores the size and mtime of the data.json it was built from, a stale or
+    missing index is rebuilt from the already parsed data.json by from_values
+    """
+
+    version = 1
+    file_name = "quickindex.json"
+
+    def __init__(self, content):
+        self.rooms = content['rooms']
+        self.entities = content['entities']
+        self.unassigned = content['unassigned']
+        self.unassigned_set = set(self.unassigned)
+        self.source = content.get('source')
+
+    @staticmethod
+    def path():
+        return Settings.home_directory() + "/" + QuickIndex.file_name
+
+    @staticmethod
+    def source_of(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return [stat.st_size, stat.st_mtime_ns]
+
+    @staticmethod
+    def build(values):
+        """index content for the dict saved to data.json"""
+        rooms = dict()
+        entities = dict()
+        unassigned = list()
+        for (index, zone) in enumerate(values.get('zones', [])):
+            # save_quick_access stores the missing udn of the unassigned rooms as 'None'
+            is_unassigned = zone.get('udn') in (None, 'None')
+            if not is_unassigned:
+                entities[zone['udn']] = ['zone', index, zone.get('name')]
+            for room in zone.get('rooms') or []:
+                name = room.get('name')
+                # the first room of a name wins, like the linear search did
+                if name not in rooms:
+                    rooms[name] = [room.get('udn'), index, zone.get('host')]
+                if is_unassigned and name not in unassigned:
+                    unassigned.append(name)
+                if room.get('udn') is not None:
+                    entities.setdefault(room['udn'], ['room', index, name])
+                if room.get('renderer_udn') is not None:
+                    entities.setdefault(room['renderer_udn'], ['renderer', index, name])
+        for device in values.get('devices', []):
+            if device.get('udn') is not None:
+                entities.setdefault(device['udn'], ['device', None, device.get('type')])
+        for server in values.get('mediaserver', []):
+            if server.get('udn') is not None:
+                entities.setdefault(server['udn'], ['mediaserver', None, server.get('type')])
+        return {'version': QuickIndex.version, 'rooms': rooms, 'entities': entities, 'unassigned': unassigned}
+
+    @staticmethod
+    def from_values(values, source=None):
+        content = QuickIndex.build(values)
+        content['source'] = source
+        return QuickIndex(content)
+
+    @staticmethod
+    def save(values, data_path):
+        """write the index for values, which were just written to data_path"""
+        content = QuickIndex.build(values)
+        content['source'] = QuickIndex.source_of(data_path)
+        path = QuickIndex.path()
+        try:
+            with open(path + ".tmp", 'w') as f:
+                json.dump(content, f, ensure_ascii=True, separators=(',', ':'))
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            err_print("QuickIndex: can not save index: {0}".format(e))
+
+    @staticmethod
+    def load(data_path):
+        """index matching data_path as it is now on disk, None when missing, outdated or of another version"""
+        try:
+            with open(QuickIndex.path(), 'r') as f:
+                content = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            err_print("QuickIndex: ignoring unreadable index: {0}".format(e))
+            return None
+        if content.get('version') != QuickIndex.version:
+            return None
+        if content.get('source') != QuickIndex.source_of(data_path):
+            return None
+        return QuickIndex(content)
+
+    def room(self, name):
+        return self.rooms.get(name)
+
+    def room_udn(self, name):
+        room = self.rooms.get(name)
+        return None if room is None else room[0]
+
+    def room_zone_index(self, name):
+        room = self.rooms.get(name)
+        return -1 if room is None else room[1]
+
+    def room_host(self, name):
+        room = self.rooms.get(name)
+        return None if room is None else room[2]
+
+    def entity(self, udn):
+        return self.entities.get(udn)
+
+    def is_unassigned(self, name):
+        return name in self.unassigned_set
@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
+import functools
 import hashlib
 import threading
 from time import sleep
 
+from pyfeld.asyncUpnpCommand import AsyncUpnpCommand
+from pyfeld.fadeEngine import FadeEngine, FadeCurve
 from pyfeld.stateVariables import StateVariables
 from pyfeld.upnpCommand import UpnpCommand
 import urllib3
@@ -17,6 +20,7 @@ class RaumfeldZone:
         self.media = None
         self.soap_host = None
         self.upnpcmd = None
+        self.async_upnpcmd = None
         self.volume = "0"
 
         self.state_variables = StateVariables(udn)
@@ -25,7 +29,6 @@ class RaumfeldZone:
 
         self.rooms = []
         #i think better to use states(fading, looping, magic, intermezzo
-        self.is_fading = False
         self.is_looping = False
         self.is_magic = False
         self.is_sleeping = False
@@ -76,7 +79,7 @@ class RaumfeldZone:
     def update_volumes(self):
         if self.upnpcmd is None:
             return
-        result = self.upnpcmd.get_volume()
+        result = self.upnpcmd.get_volume_info()
         if 'CurrentVolume' in result:
             self.volume = result['CurrentVolume']
         for r in self.rooms:
@@ -86,34 +89,39 @@ class RaumfeldZone:
                 r.set_volume(result['CurrentVolume'])
 
     def set_volume(self, value):
-        self.upnpcmd.set_volume(value)
+        return self.upnpcmd.set_volume(value)
 
     def set_soap_host(self, host):
         if host is None:
             self.soap_host = None
             self.upnpcmd = None
+            self.async_upnpcmd = None
             return
         urlsplit = urllib3.util.parse_url(host)
         self.soap_host = urlsplit.scheme + "://"+urlsplit.netloc
         self.upnpcmd = UpnpCommand(self.soap_host)
+        self.async_upnpcmd = AsyncUpnpCommand(self.soap_host)
 
     def play(self):
-        self.upnpcmd.play()
+        return self.upnpcmd.play()
 
     def stop(self):
-        self.upnpcmd.stop()
+        return self.upnpcmd.stop()
 
     def previous(self):
-        self.upnpcmd.previous()
+        return self.upnpcmd.previous()
 
     def next(self):
-        self.upnpcmd.next()
+        return self.upnpcmd.next()
 
     def seek(self, value):
-        self.upnpcmd.seek(value)
+        return self.upnpcmd.seek(value)
 
     def update_position_info(self):
-        self.position = self.upnpcmd.get_position_info()
+        self.set_position(self.upnpcmd.get_position_info())
+
+    def set_position(self, position):
+        self.position = position
         if 'TrackDuration' in self.position:
             components = self.position['TrackDuration'].split(':')
             self.position['TrackDurationInfo'] = {
@@ -146,7 +154,10 @@ class RaumfeldZone:
 
     def update_media(self):
         self.update_position_info()
-        self.media = self.upnpcmd.get_media_info()
+        self.set_media_info(self.upnpcmd.get_media_info())
+
+    def set_media_info(self, media):
+        self.media = media
         if self.media is None:
             return
         try:
@@ -168,9 +179,19 @@ class RaumfeldZone:
         return self.upnpcmd.set_transport_uri(media)
 
     def get_zone_stuff(self):
-        self.update_volumes()
-        self.transport = self.upnpcmd.get_transport_setting()
-        self.update_media()
+        room_udns = [r.get_udn() for r in self.rooms]
+        self.set_snapshot(self.upnpcmd.get_zone_snapshot(room_udns))
+
+    def set_snapshot(self, snapshot):
+        if 'CurrentVolume' in snapshot.volume:
+            self.volume = snapshot.volume['CurrentVolume']
+        for r in self.rooms:
+            room_volume = snapshot.room_volumes.get(r.get_udn())
+            if room_volume is not None and 'CurrentVolume' in room_volume:
+                r.set_volume(room_volume['CurrentVolume'])
+        self.transport = snapshot.transport
+        self.set_position(snapshot.position)
+        self.set_media_info(snapshot.media)
 
     def get_volume(self):
         return self.volume
@@ -200,54 +221,39 @@ class RaumfeldZone:
     def seek_to_position_in_seconds(self, seconds):
         m, s = divmod(seconds, 60)
         h, m = divmod(m, 60)
-        self.seek("%d:%02d:%02d" % (h, m, s))
+        return self.seek("%d:%02d:%02d" % (h, m, s))
 
     def seek_backward(self, seconds):
         position = self.get_position_in_seconds()
         position -= seconds
         if position < 0:
             position = 0
-        self.seek_to_position_in_seconds(position)
+        return self.seek_to_position_in_seconds(position)
 
     def seek_forward(self, seconds):
         position = self.get_position_in_seconds()
         position += seconds
-        self.seek_to_position_in_seconds(position)
-
-    def run_fade(self, from_value, to_value, time_in_seconds):
-        self.is_fading = True
-        start_time = datetime.now()
-        last_value_set = int(from_value)
-        self.set_volume(from_value)
-        if time_in_seconds == 0:
-            return
-        while True:
-            sleep(1)
-            if self.terminate_fade:
-                print("premature stop of fade")
-                break
-            delta = datetime.now() - start_time
-            if delta.seconds > int(time_in_seconds):
-                print("time reached for end of fade")
-                break
-            new_value = int(from_value) + (int(to_value)-int(from_value))*delta.seconds/int(time_in_seconds)
-            if new_value != last_value_set:
-                last_value_set = int(new_value)
-                self.set_volume(last_value_set)
-        print("fade thread ending")
-
-        self.set_volume(to_value)
-        if to_value == 0:
-            self.stop()
-        self.is_fading = False
-
-    def set_fade(self, from_value, to_value, time_in_seconds):
-        self.terminate_fade = True
-        while self.is_fading:
-            sleep(1)
-        self.terminate_fade = False
-        fade = threading.Thread(target=self.run_fade, args=(from_value, to_value, time_in_seconds))
-        fade.start()
+        return self.seek_to_position_in_seconds(position)
+
+    @property
+    def is_fading(self):
+        return FadeEngine.is_fading(self.udn)
+
+    def fade_targets(self, rooms=False):
+        """the zone volume, or every room volume of the zone"""
+        if rooms:
+            return [(r.get_name(), functools.partial(self.upnpcmd.set_room_volume, r.get_udn())) for r in self.rooms]
+        return [(self.get_friendly_name(), self.upnpcmd.set_volume)]
+
+    def run_fade(self, from_value, to_value, time_in_seconds, curve=FadeCurve.linear, rooms=False):
+        """fades and returns when done, False when another fade took over"""
+        return self.set_fade(from_value, to_value, time_in_seconds, curve, rooms).wait()
+
+    def set_fade(self, from_value, to_value, time_in_seconds, curve=FadeCurve.linear, rooms=False):
+        """starts a fade in the background, a running fade of this zone is cancelled, fading to 0 stops the zone"""
+        on_done = self.stop if int(to_value) == 0 else None
+        return FadeEngine.start(self.udn, self.fade_targets(rooms), from_value, to_value, time_in_seconds,
+                                curve, on_done)
 
     def run_loop(self, from_value, to_value):
         self.is_looping = True
@@ -1,17 +1,18 @@
 #!/usr/bin/env python3
 from __future__ import unicode_literals
 
+import io
 import json
+import os
 import sys
-import urllib
-from requests.utils import quote
+import threading
+from urllib.parse import quote
 
-from time import sleep
 from pyfeld.settings import Settings
-from pyfeld.upnpCommand import UpnpCommand
-from pyfeld.getRaumfeld import RaumfeldDeviceSettings
-from pyfeld.zonesHandler import ZonesHandler
-from pyfeld.didlInfo import DidlInfo
+from pyfeld.daemon import DaemonClient, ThreadOutput
+from pyfeld.quickIndex import QuickIndex
+# everything touching the network (requests, urllib3, asyncio, minidom) is imported by the commands
+# needing it, commands answered from data.json only pay for the modules above
 '''
 from settings import Settings
 from upnpCommand import UpnpCommand
@@ -21,25 +22,61 @@ from didlInfo import DidlInfo
 '''
 
 
-quick_access = dict()
-raumfeld_host_device = None
+# data.json and its QuickIndex, replaced as a pair when data.json changed, a command works on the
+# pair it started with even when the daemon or another batch line reloads meanwhile
+quick_access_snapshot = (dict(), None)
+quick_access_mtime = None
+host_devices = dict()
+upnp_commands = dict()
+quick_access_lock = threading.Lock()
 
 
 def get_raumfeld_infrastructure():
-    global quick_access, raumfeld_host_device
-    try:
-        s = open(Settings.home_directory()+"/data.json", 'r').read()
-        quick_access = json.loads(s)
-        """sanitize"""
-        for zone in quick_access['zones']:
-            if not 'rooms' in zone:
-                zone['rooms'] = None
-            if not 'udn' in zone:
-                zone['udn'] = None
-        raumfeld_host_device = RaumfeldDeviceSettings(quick_access['host'])
-    except Exception as err:
-        print("get_raumfeld_infrastructure: Exception: {0}".format(err))
-        return None
+    """(quick_access, quick_access_index) for one command"""
+    global quick_access_snapshot, quick_access_mtime
+    with quick_access_lock:
+        try:
+            path = Settings.home_directory()+"/data.json"
+            mtime = os.stat(path).st_mtime
+            if mtime == quick_access_mtime and len(quick_access_snapshot[0]):
+                # a resident daemon or a batch reads data.json again only after it changed
+                return quick_access_snapshot
+            s = open(path, 'r').read()
+            values = json.loads(s)
+            """sanitize"""
+            for zone in values['zones']:
+                if not 'rooms' in zone:
+                    zone['rooms'] = None
+                if not 'udn' in zone:
+                    zone['udn'] = None
+            index = QuickIndex.load(path)
+            if index is None:
+                # written by an older pyfeld or data.json was edited by hand
+                index = QuickIndex.from_values(values)
+            quick_access_snapshot = (values, index)
+            upnp_commands.clear()
+            quick_access_mtime = mtime
+        except Exception as err:
+            print("get_raumfeld_infrastructure: Exception: {0}".format(err))
+        return quick_access_snapshot
+
+
+def get_upnp_command(location):
+    """one UpnpCommand per device, shared by the commands of a batch or daemon"""
+    uc = upnp_commands.get(location)
+    if uc is None:
+        from pyfeld.upnpCommand import UpnpCommand
+        uc = upnp_commands.setdefault(location, UpnpCommand(location))
+    return uc
+
+
+def get_host_device(quick_access):
+    host = quick_access['host']
+    device = host_devices.get(host)
+    if device is None:
+        from pyfeld.getRaumfeld import RaumfeldDeviceSettings
+        device = host_devices.setdefault(host, RaumfeldDeviceSettings(host))
+    return device
 
 
 '''
@@ -47,26 +84,12 @@ most stuff is already in the zone handler, this needs some tidy up
 '''
 
 
-def get_room_udn(room_name):
-    global quick_access
-    for zone in quick_access['zones']:
-        if zone['rooms'] is not None:
-            for room in zone['rooms']:
-                if room['name'] == room_name:
-                    return room['udn']
-    return None
+def get_room_udn(quick_access_index, room_name):
+    return quick_access_index.room_udn(room_name)
 
 
-def get_room_zone_index(room_name):
-    global quick_access
-    index = 0
-    for zone in quick_access['zones']:
-        if zone['rooms'] is not None:
-            for room in zone['rooms']:
-                if room['name'] == room_name:
-                    return index
-        index += 1
-    return -1
+def get_room_zone_index(quick_access_index, room_name):
+    return quick_access_index.room_zone_index(room_name)
 
 
 def usage(argv):
@@ -76,9 +99,16 @@ def usage(argv):
     print("  -j,--json               use json as output format, default is plain text lines")
     print("  -d,--discover           Discover again (will be fast if host didn't change)")
     print("  -z,--zone #             Specify zone index (use info to get a list), default 0 = first")
-    print("  -r,--zonewithroom name  Specify zone index by using room name")
+    print("  -r,--zonewithroom name  Specify zone index by using room name, repeat to address several zones or rooms")
+    print("  -a,--allzones           Send play, stop, next, prev, seek, (get/room)volume and fades to all zones at once")
     print("  -m,--mediaserver #      Specify media server, default 0 = first")
     print("  -v,--verbose            Increase verbosity (use twice for more)")
+    print("  --rawsocket             Use the raw socket SOAP transport instead of requests")
+    print("  --timeout seconds       Give up on a device call after seconds, default 5")
+    print("  --local                 Run in this process even if a pyfeld-daemon is running")
+    print("  --batch file|-          Run the commands of file (one per line, may start with options like -r room)")
+    print("                          in one process, one line of output per command, JSON lines with --json")
+    print("  --parallel #            Run up to # independent batch commands at the same time, default 1")
 
     print("COMMANDS: (some commands return xml)")
     print("  browse path              Browse for media append /* for recursive")
@@ -87,6 +117,7 @@ def usage(argv):
     print("  currentsong              show current song info")
     print("  volume #                 Set volume of zone")
     print("  getvolume                Get volume of zone")
+    print("  roomvolume #             Set volume of the rooms given with -r, all rooms of the zone(s) otherwise")
     print("  position                 Get position info of zone")
     print("  seek #                   Seek to a specific position")
     print("  standby state {room(s)}  Set a room into standby state=on/off/auto")
@@ -95,10 +126,12 @@ def usage(argv):
     print("  unassignedrooms          Show list of unassigned rooms")
     print("  zoneinfo                 Show info on zone")
     print("  zones                    Show list of zones, unassigned room is skipped")
+    print("  status                   Show volume and position of all zones (queried concurrently)")
     print("  info                     Show list of zones and rooms")
     print("#MACRO OPERATIONS")
-    print("  wait condition           wait for condition (expression) [volume, position, duration, title, artist] i.e. volume < 5 or position==120 ")
-    print("  fade time vols vole      fade volume from vols to vole in time seconds ")
+    print("  wait condition           wait for condition (expression) [volume, position, duration, title, artist, track] i.e. volume < 5 or position==120 ")
+    print("  fade time vols vole [c]  fade volume from vols to vole in time seconds, curve c is linear, log or scurve")
+    print("  roomfade time vols vole [c]  same for the volume of each room (-r rooms or all rooms of the zone)")
     print("#ZONE MANAGEMENT (will automatically discover after operating)")
     print("  createzone {room(s)}     create zone with list of rooms (space seperated)")
     print("  addtozone {room(s)}      add rooms to existing zone")
@@ -121,29 +154,16 @@ def build_dlna_play_single(udn, server_type, path):
     s += '&iid=' + quote(path)
     return s
 
-def is_unassigned_room(roomName):
-    global quick_access
-    for zone in quick_access['zones']:
-        if zone['rooms'] is not None:
-            if zone['name'] == 'unassigned room':
-                for room in zone['rooms']:
-                    if roomName == room['name']:
-                        return True
-    return False
-
-def get_unassigned_rooms(verbose, format):
-    global quick_access
+def is_unassigned_room(quick_access_index, roomName):
+    return quick_access_index.is_unassigned(roomName)
 
+def get_unassigned_rooms(quick_access_index, verbose, format):
     result = ""
-    for zone in quick_access['zones']:
-        if zone['rooms'] is not None:
-            if zone['name'] == 'unassigned room':
-                for room in zone['rooms']:
-                    result += room['name'] + '\n'
+    for room_name in quick_access_index.unassigned:
+        result += room_name + '\n'
     return result
 
-def get_rooms(verbose, format):
-    global quick_access
+def get_rooms(quick_access, verbose, format):
     result = ""
     room_list = []
     for zone in quick_access['zones']:
@@ -171,6 +191,7 @@ def get_rooms(verbose, format):
 
 
 def get_didl_extract(didl_result, format="plain"):
+    from pyfeld.didlInfo import DidlInfo
     didlinfo = DidlInfo(didl_result, True)
     items = didlinfo.get_items()
     if format == 'json':
@@ -203,10 +224,8 @@ def get_specific_zoneinfo(uc):
     return result
 
 
-def get_info(verbose, format):
-    global quick_access
+def get_info(quick_access, verbose, format):
     if format == 'json':
-        quick_access
         return json.dumps(quick_access, sort_keys=True, indent=2) + "\n"
     else:
         i = 0
@@ -237,7 +256,7 @@ def get_info(verbose, format):
     return result
 
 
-def get_zone_info(format):
+def get_zone_info(quick_access, format):
     result = ""
     if format == 'json':
         result = json.dumps(quick_access['zones'], sort_keys=True, indent=2) + "\n"
@@ -250,163 +269,227 @@ def get_zone_info(format):
     return result
 
 
-def timecode_to_seconds(tc):
-    components = tc.split(':')
-    return int(components[0]) * 3600 + int(components[1]) * 60 + int(components[2])
+async def get_zone_status(zone):
+    from pyfeld.asyncUpnpCommand import AsyncUpnpCommand
+    uc = AsyncUpnpCommand(zone['host'])
+    (volume, position) = await AsyncUpnpCommand.gather(uc.get_volume(), uc.get_position_info())
+    status = dict()
+    status['name'] = zone['name']
+    status['volume'] = volume if not isinstance(volume, Exception) else ""
+    if isinstance(position, Exception):
+        position = dict()
+    status['position'] = position.get('AbsTime', "")
+    status['duration'] = position.get('TrackDuration', "")
+    return status
 
 
-#unsused variables are used in the evil eval code
-def wait_operation(uc, condition):
-    while True:
-        result = uc.get_volume()
-        volume = int(result['CurrentVolume'])
-        results = uc.get_position_info()
+async def get_zones_status_async(quick_access):
+    import asyncio
+    coroutines = []
+    for zone in quick_access['zones']:
+        if zone['udn'] is not None and zone['udn'] != 'None':
+            coroutines.append(get_zone_status(zone))
+    return await asyncio.gather(*coroutines)
 
-        try:
-            didlinfo = DidlInfo(results['TrackMetaData'])
-            items = didlinfo.get_items()
-            #print(items)
-            title = items['title']
-            artist = items['artist']
-        except:
-            pass
 
-        track = -1
-        if 'Track' in results:
-            track = int(results['Track'])
-        duration = -1
-        if 'TrackDuration' in results:
-            duration = timecode_to_seconds(results['TrackDuration'])
-        position = -1
-        if 'AbsTime' in results:
-            position = timecode_to_seconds(results['AbsTime'])
-        #print(volume, duration, position)
-        eval_result = eval(condition)
-        if eval_result:
-            break
-        sleep(1)
+def get_zones_status(quick_access, format):
+    from pyfeld.asyncUpnpCommand import AsyncUpnpCommand
+    status_list = AsyncUpnpCommand.run(get_zones_status_async(quick_access))
+    if format == 'json':
+        return json.dumps(status_list, sort_keys=True, indent=2) + "\n"
+    result = ""
+    for status in status_list:
+        result += "{0}\t{1}\t{2}/{3}\n".format(status['name'], status['volume'],
+                                              status['position'], status['duration'])
+    return result
+
+
+def get_play_transport_data(quick_access, uc_media, mediaIndex, path):
+    udn = quick_access['mediaserver'][mediaIndex]['udn']
+    transport_data = dict()
+    browseresult = uc_media.browsechildren(path)
+    if browseresult is None:
+        browseresult = uc_media.browse(path)
+        transport_data['CurrentURI'] = build_dlna_play_single(udn, "urn:upnp-org:serviceId:ContentDirectory", path)
+    else:
+        transport_data['CurrentURI'] = build_dlna_play_container(udn, "urn:upnp-org:serviceId:ContentDirectory",
+                                                                 path)
+    #print(transport_data['CurrentURI'])
+    transport_data['CurrentURIMetaData'] = '<DIDL-Lite xmlns="urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/" xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:dlna="urn:schemas-dlna-org:metadata-1-0/" xmlns:upnp="urn:schemas-upnp-org:metadata-1-0/upnp/" xmlns:raumfeld="urn:schemas-raumfeld-com:meta-data/raumfeld"><container></container></DIDL-Lite>'
+    return transport_data
+
+
+def action_result(result):
+    if result is None:
+        return "error"
+    return "ok"
+
+
+def wait_operation(uc, condition):
+    from pyfeld.condition import Condition, ConditionError
+    from pyfeld.zoneState import ZoneWatcher
+    try:
+        compiled = Condition(condition)
+    except ConditionError as e:
+        print("error: {0}".format(e))
+        sys.exit(2)
+    watcher = ZoneWatcher(uc)
+    try:
+        watcher.start()
+        watcher.wait(compiled)
+    finally:
+        watcher.stop()
     return condition
 
 
-def fade_operation(uc, time, volume_start, volume_end):
-    t = 0
-    while t < time:
-        volume_now = volume_start+(volume_end-volume_start)*t/time
-        uc.set_volume(volume_now)
-        sleep(1)
-        t += 1
-    uc.set_volume(volume_end)
-    return "done"
+def fade_operation(quick_access, operation, argv, argpos, zone_indexes, room_names):
+    """fades every target zone, or its rooms for roomfade, one fade per zone replacing a running one"""
+    import functools
+    from pyfeld.fadeEngine import FadeEngine, FadeCurve
+    (duration, volume_start, volume_end) = (float(argv[argpos]), int(argv[argpos+1]), int(argv[argpos+2]))
+    curve = argv[argpos+3] if len(argv) > argpos+3 else FadeCurve.linear
+    fades = []
+    for index in zone_indexes:
+        zone = quick_access['zones'][index]
+        uc = get_upnp_command(zone['host'])
+        if operation == 'roomfade':
+            targets = [(room['name'], functools.partial(uc.set_room_volume, room['udn']))
+                       for room in zone['rooms'] or [] if len(room_names) == 0 or room['name'] in room_names]
+        else:
+            targets = [(zone['name'], uc.set_volume)]
+        try:
+            fades.append(FadeEngine.start(zone['udn'], targets, volume_start, volume_end, duration, curve))
+        except ValueError as e:
+            print("error: {0}".format(e))
+            sys.exit(2)
+    finished = [fade.wait() for fade in fades]
+    return "done" if all(finished) else "cancelled"
 
 
 def discover():
+    from pyfeld.zonesHandler import ZonesHandler
     zones_handler = ZonesHandler()
-    if not zones_handler.reprocess():
-        local_ip = RaumfeldDeviceSettings.get_local_ip_address()
-        zones_handler.search_nmap_range(local_ip + "/24")
+    previous_host = get_raumfeld_infrastructure()[0].get('host')
+    if zones_handler.discover() and zones_handler.found_protocol_ip != previous_host:
         zones_handler.publish_state()
-    get_raumfeld_infrastructure()
+    return get_raumfeld_infrastructure()
 
 
-def run_main():
-    global quick_access
-    argv = list()
-    for arg in sys.argv:
-        argv.append(arg)
-    verbose = 0
-    if len(argv) < 2:
-        usage(argv)
-        sys.exit(2)
-    zoneIndex = 0
-    mediaIndex = 0
-    room = ""
-    format = "plain"
-    argpos = 1
-    get_raumfeld_infrastructure()
+cached_operations = ('rooms', 'unassignedrooms', 'zones', 'info')
 
-    while argv[argpos].startswith('-'):
-        if argv[argpos].startswith('--'):
-            option = argv[argpos][2:]
-        else:
-            option = argv[argpos]
-        argpos += 1
-        if option == 'verbose' or option == '-v':
-            verbose += 1
-        elif option == 'help' or option == '-h':
-            usage(argv)
-            sys.exit(2)
-        elif option == 'json' or option == '-j':
-            format = "json"
-        elif option == 'discover' or option == '-d':
-            discover()
-            if argpos == len(argv):
-                print("done")
-                sys.exit(0)
-        elif option == 'zone' or option == '-z':
-            zoneIndex = int(argv[argpos])
-            argpos += 1
-        elif option == 'zonewithroom' or option == '-r':
-            roomName = argv[argpos]
-            zoneIndex = get_room_zone_index(roomName)
-            if zoneIndex == -1:
-                print("ERROR: room with name '{0}' not found".format(roomName))
-                print("Available rooms are to be found here:\n" + get_info(verbose))
-                exit(-1)
-            if is_unassigned_room(roomName):
-                print('error: room is unassigned: ' + roomName)
-                exit(-1)
-            argpos += 1
-        elif option == 'mediaserver' or option == '-m':
-            mediaIndex = int(argv[argpos])
-            argpos += 1
+
+def cached_command(quick_access, quick_access_index, operation, verbose, format):
+    """commands answered from data.json alone"""
+    if operation == 'rooms':
+        result = get_rooms(quick_access, verbose, format)
+    elif operation == 'unassignedrooms':
+        result = get_unassigned_rooms(quick_access_index, verbose, format)
+    elif operation == 'zones':
+        result = get_zone_info(quick_access, format)
+    else:
+        result = get_info(quick_access, verbose, format)
+    return result[:-1]
+
+
+fan_out_operations = ('play', 'stop', 'next', 'prev', 'seek', 'volume', 'setvolume', 'getvolume', 'roomvolume')
+
+
+def get_target_zones(quick_access, quick_access_index, all_zones, room_names, zoneIndex):
+    if all_zones:
+        # the unassigned rooms have no zone to send actions to
+        return [index for (index, zone) in enumerate(quick_access['zones'])
+                if zone['udn'] not in (None, 'None') and zone.get('host')]
+    if len(room_names):
+        return list(dict.fromkeys(get_room_zone_index(quick_access_index, room_name) for room_name in room_names))
+    return [zoneIndex]
+
+
+def fan_out_command(quick_access, quick_access_index, operation, argv, argpos, zone_indexes, room_names, mediaIndex,
+                    format):
+    """sends the action to all target zones or rooms at once, (output, True when every target answered)"""
+    from pyfeld.upnpCommand import UpnpCommand
+    calls = []
+    if operation == 'roomvolume':
+        if len(room_names) == 0:
+            room_names = [room['name'] for index in zone_indexes for room in quick_access['zones'][index]['rooms'] or []]
+        for room_name in room_names:
+            (udn, index, host) = quick_access_index.room(room_name)
+            calls.append((room_name, get_upnp_command(host).set_room_volume, (udn, argv[argpos])))
+    else:
+        transport_data = None
+        if operation == 'play':
+            uc_media = get_upnp_command(quick_access['mediaserver'][mediaIndex]['location'])
+            transport_data = get_play_transport_data(quick_access, uc_media, mediaIndex, argv[argpos])
+        for index in zone_indexes:
+            zone = quick_access['zones'][index]
+            uc = get_upnp_command(zone['host'])
+            actions = {'play': (uc.set_transport_uri, (transport_data,)),
+                       'stop': (uc.stop, ()),
+                       'next': (uc.next, ()),
+                       'prev': (uc.previous, ()),
+                       'seek': (uc.seek, tuple(argv[argpos:argpos + 1])),
+                       'volume': (uc.set_volume, tuple(argv[argpos:argpos + 1])),
+                       'setvolume': (uc.set_volume, tuple(argv[argpos:argpos + 1])),
+                       'getvolume': (uc.get_volume_info, ())}
+            (function, args) = actions[operation]
+            calls.append((zone['name'], function, args))
+    fan_out = UpnpCommand.fan_out(calls)
+    if format == 'json':
+        return json.dumps(fan_out.to_dict(), sort_keys=True, indent=2), len(fan_out.failed) == 0
+    result = ""
+    for target in fan_out.targets:
+        if not target.ok:
+            value = "error " + target.to_dict()['error']
+        elif operation == 'getvolume':
+            value = target.result.get('CurrentVolume', '')
         else:
-            print("unknown option --{0}".format(option))
-            usage(argv)
-            sys.exit(2)
+            value = "ok"
+        result += "{0}\t{1}\t{2:.3f}s\n".format(target.target, value, target.latency)
+    result += "latency\t{0:.3f}s".format(fan_out.latency)
+    return result, len(fan_out.failed) == 0
 
-    uc = UpnpCommand(quick_access['zones'][zoneIndex]['host'])
-    uc_media = UpnpCommand(quick_access['mediaserver'][mediaIndex]['location'])
-    operation = argv[argpos]
-    argpos += 1
+
+def device_command(quick_access, quick_access_index, operation, argv, argpos, zoneIndex, mediaIndex, verbose, format):
+    """runs the command on the zone, (output, False when a device did not answer)"""
+    uc = get_upnp_command(quick_access['zones'][zoneIndex]['host'])
+    uc_media = get_upnp_command(quick_access['mediaserver'][mediaIndex]['location'])
     result = None
+    ok = True
     if operation == 'play':
-        udn = quick_access['mediaserver'][mediaIndex]['udn']
-        transport_data = dict()
-        browseresult = uc_media.browsechildren(argv[argpos])
-        if browseresult is None:
-            browseresult = uc_media.browse(argv[argpos])
-            transport_data['CurrentURI'] = build_dlna_play_single(udn, "urn:upnp-org:serviceId:ContentDirectory", argv[argpos])
-        else:
-            transport_data['CurrentURI'] = build_dlna_play_container(udn, "urn:upnp-org:serviceId:ContentDirectory",
-                                                                     argv[argpos])
-        #print(transport_data['CurrentURI'])
-        transport_data['CurrentURIMetaData'] = '<DIDL-Lite xmlns="urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/" xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:dlna="urn:schemas-dlna-org:metadata-1-0/" xmlns:upnp="urn:schemas-upnp-org:metadata-1-0/upnp/" xmlns:raumfeld="urn:schemas-raumfeld-com:meta-data/raumfeld"><container></container></DIDL-Lite>'
-        uc.set_transport_uri(transport_data)
-        result = 'ok'
+        result = action_result(uc.set_transport_uri(get_play_transport_data(quick_access, uc_media, mediaIndex,
+                                                                            argv[argpos])))
     elif operation == 'stop':
-        result = uc.stop()
+        result = action_result(uc.stop())
     elif operation == 'next':
-        result = uc.next()
+        result = action_result(uc.next())
     elif operation == 'prev':
-        result = uc.previous()
+        result = action_result(uc.previous())
     elif operation == 'volume' or operation == 'setvolume':
-        result = uc.set_volume(argv[argpos])
+        result = action_result(uc.set_volume(argv[argpos]))
     elif operation == 'getvolume':
-        result = uc.get_volume(format)
+        volume = uc.get_volume_info()
+        if 'CurrentVolume' not in volume:
+            result = "error"
+        elif format == 'json':
+            result = '{ "CurrentVolume": "' + volume['CurrentVolume'] + '"}'
+        else:
+            result = volume['CurrentVolume']
     elif operation == 'standby':
         state = argv[argpos]
         argpos += 1
         while argpos < len(argv):
-            udn = get_room_udn(argv[argpos])
+            udn = get_room_udn(quick_access_index, argv[argpos])
             if udn is None:
                 print("unknown room "+argv[argpos])
-            else:
-                raumfeld_host_device.set_room_standby(str(udn), state)
+                ok = False
+            elif get_host_device(quick_access).set_room_standby(str(udn), state) is None:
+                ok = False
             argpos += 1
     elif operation == 'position':
         results = uc.get_position_info()
+        ok = len(results) != 0
         if format == 'json':
-            return json.dumps(results,  sort_keys=True, indent=2) + '\n'
+            result = json.dumps(results,  sort_keys=True, indent=2)
         else:
             result = ""
             if 'TrackDuration' in results:
@@ -417,37 +500,37 @@ def run_main():
             result += '\n'
     elif operation == 'seek':
         #check argv[argpos] if contains :
-        result = uc.seek(argv[argpos])
+        result = action_result(uc.seek(argv[argpos]))
     elif operation == 'wait':
         result = wait_operation(uc, argv[argpos])
-    elif operation == 'fade':
-        result = fade_operation(uc, int(argv[argpos]), int(argv[argpos+1]), int(argv[argpos+2]))
     elif operation == 'createzone':
         rooms = set()
         result = "zone creation adding rooms:\n"
         while argpos < len(argv):
-            udn = get_room_udn(argv[argpos])
+            udn = get_room_udn(quick_access_index, argv[argpos])
             result += "{0}'\n".format(str(udn))
             rooms.add(str(udn))
             argpos += 1
-        raumfeld_host_device.create_zone_with_rooms(rooms)
+        ok = get_host_device(quick_access).create_zone_with_rooms(rooms) is not None
         discover()
     elif operation == 'addtozone':
         zone_udn = quick_access['zones'][zoneIndex]['udn']
         rooms = set()
         result = "zone creation adding rooms:\n"
         while argpos < len(argv):
-            udn = get_room_udn(argv[argpos])
+            udn = get_room_udn(quick_access_index, argv[argpos])
             result += "{0}'\n".format(str(udn))
             rooms.add(str(udn))
             argpos += 1
-        raumfeld_host_device.add_rooms_to_zone(zone_udn, rooms)
+        ok = get_host_device(quick_access).add_rooms_to_zone(zone_udn, rooms) is not None
         discover()
     elif operation == 'drop':
         result = "drop rooms from zone:\n"
         while argpos < len(argv):
-            udn = get_room_udn(argv[argpos])
-            result += str(raumfeld_host_device.drop_room(str(udn)))
+            udn = get_room_udn(quick_access_index, argv[argpos])
+            dropped = get_host_device(quick_access).drop_room(str(udn))
+            ok = ok and dropped is not None
+            result += str(dropped)
             argpos += 1
         discover()
     elif operation == 'browse':
@@ -460,26 +543,272 @@ def run_main():
         result = get_didl_extract(results['Result'], format)
     elif operation == 'search':
         result = uc_media.search(argv[argpos], argv[argpos+1], format)
-    elif operation == 'rooms':
-        result = get_rooms(verbose, format)
-        result = result[:-1]
-    elif operation == 'unassignedrooms':
-        result = get_unassigned_rooms(verbose, format)
-        result = result[:-1]
-    elif operation == 'zones':
-        result = get_zone_info(format)
+    elif operation == 'status':
+        result = get_zones_status(quick_access, format)
         result = result[:-1]
     elif operation == 'zoneinfo':
-        result = get_specific_zoneinfo(uc, format)
-        result = result[:-1]
-    elif operation == 'info':
-        result = get_info(verbose, format)
+        result = get_specific_zoneinfo(uc)
         result = result[:-1]
     else:
         usage(argv)
+        sys.exit(2)
+
+    return result, ok and result != "error"
+
+
+def read_batch(source):
+    """list of (line, args) of a batch file, - reads stdin, empty lines and # comments are skipped"""
+    import shlex
+    if source == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source, 'r') as f:
+            lines = f.read().splitlines()
+    commands = []
+    for line in lines:
+        line = line.strip()
+        if len(line) == 0 or line.startswith('#'):
+            continue
+        args = shlex.split(line)
+        # lines copied from shell scripts
+        if args[0] == 'pyfeld':
+            args = args[1:]
+        commands.append((line, args))
+    return commands
+
+
+# options taking a value, a line's own selection replaces the batch's one
+value_options = ('-z', '--zone', '-r', '--zonewithroom', '-m', '--mediaserver', '--timeout', '--parallel', '--batch')
+zone_selectors = ('-z', '--zone', '-r', '--zonewithroom', '-a', '--allzones')
+media_selectors = ('-m', '--mediaserver')
+
+
+def get_line_options(args):
+    """the options a batch line starts with"""
+    options = []
+    argpos = 0
+    while argpos < len(args) and args[argpos].startswith('-'):
+        options.append(args[argpos])
+        argpos += 2 if args[argpos] in value_options else 1
+    return options
+
+
+def get_batch_line(line_options, zone_options, media_options, args):
+    """command line of one batch line, the zone and media server of the batch apply when the line names none"""
+    options = get_line_options(args)
+    result = list(line_options)
+    if not any(option in zone_selectors for option in options):
+        result += zone_options
+    if not any(option in media_selectors for option in options):
+        result += media_options
+    return result + args
+
+
+def run_batch_command(args):
+    output = io.StringIO()
+    sys.stdout.capture(output)
+    sys.stderr.capture(output)
+    try:
+        code = execute(['pyfeld'] + args)
+    except Exception as e:
+        output.write("error: {0}\n".format(e))
+        code = 1
+    finally:
+        sys.stdout.capture(None)
+        sys.stderr.capture(None)
+    return code, output.getvalue()
+
+
+def run_batch(source, line_options, zone_options, media_options, workers, format):
+    """runs every command of source sharing topology and connections, returns the number of failed commands"""
+    from concurrent.futures import ThreadPoolExecutor
+    try:
+        commands = read_batch(source)
+    except (OSError, ValueError) as e:
+        print("error: can not read batch {0}: {1}".format(source, e))
+        return 1
+    # the commands print, their output is collected per worker thread
+    installed = not isinstance(sys.stdout, ThreadOutput)
+    if installed:
+        sys.stdout = ThreadOutput(sys.stdout)
+        sys.stderr = ThreadOutput(sys.stderr)
+    failed = 0
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = [executor.submit(run_batch_command,
+                                       get_batch_line(line_options, zone_options, media_options, args))
+                       for (line, args) in commands]
+            for ((line, args), future) in zip(commands, futures):
+                (code, output) = future.result()
+                if code != 0:
+                    failed += 1
+                output = output.rstrip('\n')
+                if format == 'json':
+                    sys.stdout.write(json.dumps({'command': line, 'code': code, 'output': output}) + '\n')
+                else:
+                    sys.stdout.write(output.replace('\n', '\t') + '\n')
+                sys.stdout.flush()
+    finally:
+        if installed:
+            sys.stdout = sys.stdout.stream
+            sys.stderr = sys.stderr.stream
+    return failed
+
+
+def run_main():
+    if '--batch' in sys.argv[1:]:
+        position = sys.argv.index('--batch') + 1
+        if position == len(sys.argv) or sys.argv[position] == '-':
+            # stdin is not forwarded to the daemon, a missing file is reported by run_command
+            sys.exit(execute(sys.argv))
+        # the daemon runs in another directory
+        sys.argv[position] = os.path.abspath(sys.argv[position])
+    if '--local' not in sys.argv[1:]:
+        # None only when no daemon took the command, it must not run twice
+        forwarded = DaemonClient.run(sys.argv[1:])
+        if forwarded is not None:
+            (code, output) = forwarded
+            sys.stdout.write(output)
+            sys.exit(code)
+    sys.exit(execute(sys.argv))
+
+
+def execute(argv):
+    """runs one pyfeld command line, output goes to stdout, returns the exit code
+
+    the command runs in its own context, --timeout and --rawsocket end with it and do not reach
+    other commands of the daemon or the batch
+    """
+    import contextvars
+    try:
+        contextvars.copy_context().run(run_command, list(argv))
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        return e.code if isinstance(e.code, int) else 1
+    return 0
+
+
+def run_command(argv):
+    verbose = 0
+    if len(argv) < 2:
+        usage(argv)
+        sys.exit(2)
+    zoneIndex = 0
+    mediaIndex = 0
+    room = ""
+    format = "plain"
+    argpos = 1
+    room_names = []
+    all_zones = False
+    # options handed on to every command of a batch, the zone and media server only to lines naming none
+    line_options = []
+    zone_options = []
+    media_options = []
+    batch_workers = 1
+    batch_source = None
+    (quick_access, quick_access_index) = get_raumfeld_infrastructure()
+
+    while argpos < len(argv) and argv[argpos].startswith('-'):
+        if argv[argpos].startswith('--'):
+            option = argv[argpos][2:]
+        else:
+            option = argv[argpos]
+        argpos += 1
+        if option == 'verbose' or option == '-v':
+            verbose += 1
+            line_options.append('-v')
+        elif option == 'help' or option == '-h':
+            usage(argv)
+            sys.exit(2)
+        elif option == 'json' or option == '-j':
+            format = "json"
+            line_options.append('--json')
+        elif option == 'rawsocket':
+            from pyfeld.upnpCommand import UpnpCommand
+            UpnpCommand.set_raw_socket(True)
+            line_options.append('--rawsocket')
+        elif option == 'local':
+            pass
+        elif option == 'parallel':
+            batch_workers = int(argv[argpos])
+            argpos += 1
+        elif option == 'batch':
+            if argpos == len(argv):
+                print("error: --batch needs a file or - to read the commands from")
+                sys.exit(2)
+            # run once all options are known, --parallel or --json may come after it
+            batch_source = argv[argpos]
+            argpos += 1
+        elif option == 'timeout':
+            from pyfeld.callPolicy import Deadline
+            Deadline.set_call_timeout(argv[argpos])
+            line_options.extend(['--timeout', argv[argpos]])
+            argpos += 1
+        elif option == 'discover' or option == '-d':
+            (quick_access, quick_access_index) = discover()
+            if argpos == len(argv):
+                print("done")
+                sys.exit(0)
+        elif option == 'zone' or option == '-z':
+            zoneIndex = int(argv[argpos])
+            zone_options.extend(['-z', argv[argpos]])
+            argpos += 1
+        elif option == 'zonewithroom' or option == '-r':
+            roomName = argv[argpos]
+            zoneIndex = get_room_zone_index(quick_access_index, roomName)
+            if zoneIndex == -1:
+                print("ERROR: room with name '{0}' not found".format(roomName))
+                print("Available rooms are to be found here:\n" + get_info(quick_access, verbose, format))
+                exit(-1)
+            if is_unassigned_room(quick_access_index, roomName):
+                print('error: room is unassigned: ' + roomName)
+                exit(-1)
+            zone_options.extend(['-r', roomName])
+            room_names.append(roomName)
+            argpos += 1
+        elif option == 'allzones' or option == '-a':
+            all_zones = True
+            zone_options.append('--allzones')
+        elif option == 'mediaserver' or option == '-m':
+            mediaIndex = int(argv[argpos])
+            media_options.extend(['-m', argv[argpos]])
+            argpos += 1
+        else:
+            print("unknown option --{0}".format(option))
+            usage(argv)
+            sys.exit(2)
 
-    sys.stdout.write(result)
+    if batch_source is not None:
+        if argpos < len(argv):
+            print("error: --batch takes no command, put the commands into the batch")
+            sys.exit(2)
+        failed = run_batch(batch_source, line_options, zone_options, media_options, batch_workers, format)
+        sys.exit(1 if failed else 0)
+    if argpos == len(argv):
+        usage(argv)
+        sys.exit(2)
+    operation = argv[argpos]
+    argpos += 1
+    # False when a device did not answer, the command exits with 1 after printing what it got
+    ok = True
+    if operation in cached_operations:
+        result = cached_command(quick_access, quick_access_index, operation, verbose, format)
+    elif operation in ('fade', 'roomfade'):
+        zone_indexes = get_target_zones(quick_access, quick_access_index, all_zones, room_names, zoneIndex)
+        result = fade_operation(quick_access, operation, argv, argpos, zone_indexes, room_names)
+    elif operation in fan_out_operations and (all_zones or len(room_names) > 1 or operation == 'roomvolume'):
+        zone_indexes = get_target_zones(quick_access, quick_access_index, all_zones, room_names, zoneIndex)
+        (result, ok) = fan_out_command(quick_access, quick_access_index, operation, argv, argpos, zone_indexes,
+                                       room_names, mediaIndex, format)
+    else:
+        (result, ok) = device_command(quick_access, quick_access_index, operation, argv, argpos, zoneIndex,
+                                      mediaIndex, verbose, format)
+    if result is not None:
+        sys.stdout.write(result)
     sys.stdout.write('\n')
+    if not ok:
+        sys.exit(1)
 
 if __name__ == "__main__":
     run_main()
@@ -33,10 +33,10 @@ class Room:
     def get_volume(self):
         return self.volume
 
-    def set_upnp_service(self, location):
+    def set_upnp_service(self, location, descriptions=None):
         self.upnp_service = UpnpService()
         if location is not None:
-            self.upnp_service.set_location(location)
+            self.upnp_service.set_location(location, descriptions)
 
     def set_event_update(self, udn, items_dict):
         assert(udn == self.udn)
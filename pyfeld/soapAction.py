@@ -0,0 +1,91 @@
+from __future__ import unicode_literals
+
+import threading
+from types import MappingProxyType
+from xml.sax.saxutils import escape
+
+
+class SoapAction:
+    """pre-encoded envelope and headers of one (service, action) pair, only the arguments are spliced in per call"""
+
+    max_cached_bodies = 128
+    user_agent = 'xrf/1.0'
+
+    __lock = threading.Lock()
+    __actions = dict()
+
+    def __init__(self, service_type, action):
+        self.service_type = service_type
+        self.action = action
+        self.prefix = ('<?xml version="1.0"?>'
+                       '<SOAP-ENV:Envelope xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" '
+                       'SOAP-ENV:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">'
+                       '<SOAP-ENV:Body>'
+                       '<m:' + action + ' xmlns:m="' + service_type + '">').encode('utf-8')
+        self.suffix = ('</m:' + action + '>'
+                       '</SOAP-ENV:Body>'
+                       '</SOAP-ENV:Envelope>').encode('utf-8')
+        self.soap_action = '"' + service_type + '#' + action + '"'
+        # reads may be retried, anything changing device state is sent once
+        self.idempotent = action.startswith('Get') or action in ('Browse', 'Search')
+        self.headers = MappingProxyType({'User-Agent': SoapAction.user_agent,
+                                         'Content-Type': 'text/xml; charset="utf-8"',
+                                         'SOAPAction': self.soap_action})
+        self.__header_bytes = ''.join(key + ': ' + value + '\r\n'
+                                      for key, value in self.headers.items()).encode('utf-8')
+        self.__bodies = dict()
+        self.__request_heads = dict()
+
+    @staticmethod
+    def get(service_type, action):
+        key = (service_type, action)
+        soap_action = SoapAction.__actions.get(key)
+        if soap_action is None:
+            with SoapAction.__lock:
+                soap_action = SoapAction.__actions.get(key)
+                if soap_action is None:
+                    soap_action = SoapAction(service_type, action)
+                    SoapAction.__actions[key] = soap_action
+        return soap_action
+
+    @staticmethod
+    def for_service(control_name, action):
+        return SoapAction.get('urn:schemas-upnp-org:service:' + control_name + ':1', action)
+
+    @staticmethod
+    def encode_arguments(arguments):
+        if isinstance(arguments, bytes):
+            return arguments
+        if isinstance(arguments, str):
+            # legacy callers hand in ready made xml
+            return arguments.encode('utf-8')
+        encoded = ''
+        for (name, value) in arguments:
+            encoded += '<' + name + '>' + escape(str(value)) + '</' + name + '>'
+        return encoded.encode('utf-8')
+
+    def body(self, arguments):
+        """arguments is a tuple of (name, value) pairs, or already encoded xml"""
+        if isinstance(arguments, list):
+            arguments = tuple(arguments)
+        body = self.__bodies.get(arguments)
+        if body is None:
+            body = self.prefix + SoapAction.encode_arguments(arguments) + self.suffix
+            if len(self.__bodies) < SoapAction.max_cached_bodies:
+                self.__bodies[arguments] = body
+        return body
+
+    def request_head(self, control_path, host_name, content_length):
+        """raw HTTP/1.1 request head for socket based transports"""
+        key = (control_path, host_name)
+        head = self.__request_heads.get(key)
+        if head is None:
+            head = ('POST ' + control_path + ' HTTP/1.1\r\n'
+                    'Host: ' + host_name + '\r\n').encode('utf-8') + self.__header_bytes
+            if len(self.__request_heads) < SoapAction.max_cached_bodies:
+                self.__request_heads[key] = head
+        return head + b'Content-Length: ' + str(content_length).encode('ascii') + b'\r\n\r\n'
+
+    def request(self, control_path, host_name, arguments):
+        body = self.body(arguments)
+        return self.request_head(control_path, host_name, len(body)) + body
@@ -0,0 +1,240 @@
+from __future__ import unicode_literals
+
+from xml.parsers import expat
+
+
+def timecode_to_seconds(tc):
+    try:
+        components = tc.split(':')
+        return int(components[0]) * 3600 + int(components[1]) * 60 + int(float(components[2]))
+    except Exception:
+        return -1
+
+
+class SoapResult(dict):
+    """out-arguments of one action response, still usable as the plain dict older callers expect"""
+
+    keys_wanted = None
+
+    def __init__(self, *args, **kwargs):
+        super(SoapResult, self).__init__(*args, **kwargs)
+        self.error = None
+
+    def get_int(self, key, default=-1):
+        try:
+            return int(self[key])
+        except Exception:
+            return default
+
+
+class VolumeInfo(SoapResult):
+    keys_wanted = ('CurrentVolume',)
+
+    @property
+    def volume(self):
+        return self.get_int('CurrentVolume')
+
+
+class PositionInfo(SoapResult):
+    keys_wanted = ('Track', 'TrackDuration', 'TrackMetaData', 'TrackURI',
+                   'RelTime', 'AbsTime', 'RelCount', 'AbsCount')
+
+    @property
+    def track(self):
+        return self.get_int('Track')
+
+    @property
+    def duration(self):
+        return timecode_to_seconds(self.get('TrackDuration', ''))
+
+    @property
+    def position(self):
+        return timecode_to_seconds(self.get('AbsTime', ''))
+
+    @property
+    def relative_position(self):
+        return timecode_to_seconds(self.get('RelTime', ''))
+
+
+class TransportSettings(SoapResult):
+    keys_wanted = ('PlayMode',)
+
+    @property
+    def play_mode(self):
+        return self.get('PlayMode')
+
+
+class MediaInfo(SoapResult):
+    keys_wanted = ('PlayMedium', 'NrTracks', 'CurrentURI', 'CurrentURIMetaData')
+
+    @property
+    def tracks(self):
+        return self.get_int('NrTracks')
+
+
+class BrowseResult(SoapResult):
+    keys_wanted = ('Result', 'TotalMatches', 'NumberReturned')
+
+    @property
+    def total_matches(self):
+        return self.get_int('TotalMatches')
+
+    @property
+    def number_returned(self):
+        return self.get_int('NumberReturned')
+
+
+class SearchCapabilities(SoapResult):
+    keys_wanted = ('SearchCaps',)
+
+
+class SoapResponseParser:
+    """single pass expat decoder, feed it the response body as it arrives"""
+
+    def __init__(self, result_class=SoapResult):
+        self.result = result_class()
+        self.keys_wanted = result_class.keys_wanted
+        self.depth = 0
+        self.body_depth = -1
+        self.in_fault = False
+        self.current_key = None
+        self.key_depth = 0
+        self.chunks = []
+        self.parser = expat.ParserCreate()
+        self.parser.buffer_text = True
+        self.parser.StartElementHandler = self.__start_element
+        self.parser.EndElementHandler = self.__end_element
+        self.parser.CharacterDataHandler = self.__character_data
+
+    @staticmethod
+    def parse(content, result_class=SoapResult):
+        parser = SoapResponseParser(result_class)
+        parser.feed(content)
+        return parser.close()
+
+    def feed(self, data):
+        self.parser.Parse(data, False)
+
+    def close(self):
+        self.parser.Parse(b"", True)
+        return self.result
+
+    @staticmethod
+    def __local_name(name):
+        return name.rsplit(':', 1)[-1]
+
+    def __start_element(self, name, attributes):
+        self.depth += 1
+        local_name = SoapResponseParser.__local_name(name)
+        if self.body_depth < 0:
+            if local_name == 'Body':
+                self.body_depth = self.depth
+            return
+        if self.depth == self.body_depth + 1 and local_name == 'Fault':
+            self.in_fault = True
+        if self.in_fault:
+            if local_name in ('errorCode', 'errorDescription', 'faultstring'):
+                self.__start_key(local_name)
+        elif self.depth == self.body_depth + 2:
+            if self.keys_wanted is None or local_name in self.keys_wanted:
+                self.__start_key(local_name)
+
+    def __start_key(self, key):
+        self.current_key = key
+        self.key_depth = self.depth
+        self.chunks = []
+
+    def __end_element(self, name):
+        if self.current_key is not None and self.depth == self.key_depth:
+            value = ''.join(self.chunks)
+            if self.in_fault:
+                if self.result.error is None or self.current_key == 'errorDescription':
+                    self.result.error = value
+            elif value and self.current_key not in self.result:
+                # empty out-arguments are left out, like the minidom based extraction did
+                self.result[self.current_key] = value
+            self.current_key = None
+            self.chunks = []
+        self.depth -= 1
+
+    def __character_data(self, data):
+        if self.current_key is not None:
+            self.chunks.append(data)
+
+
+class ZoneSnapshot:
+    """volume, position, transport and media of one zone, read in one go"""
+
+    def __init__(self, volume=None, position=None, transport=None, media=None, room_volumes=None):
+        self.volume = volume if volume is not None else VolumeInfo()
+        self.position = position if position is not None else PositionInfo()
+        self.transport = transport if transport is not None else TransportSettings()
+        self.media = media if media is not None else MediaInfo()
+        self.room_volumes = room_volumes if room_volumes is not None else dict()
+        self.latency = 0.0
+
+    def to_dict(self):
+        result = dict()
+        result['volume'] = self.volume.get('CurrentVolume')
+        result['position'] = dict(self.position)
+        result['transport'] = dict(self.transport)
+        result['media'] = dict(self.media)
+        result['rooms'] = dict((udn, volume.get('CurrentVolume')) for udn, volume in self.room_volumes.items())
+        return result
+
+
+class TargetResult:
+    """outcome of one call of a fan out, result None means the device did not answer
+
+    a typed answer (keys_wanted set) holding none of its values counts as no answer too, the
+    getters hand out an empty result when the call failed
+    """
+
+    def __init__(self, target, result=None, error=None, latency=0.0):
+        self.target = target
+        self.result = result
+        self.error = error
+        self.latency = latency
+
+    @property
+    def ok(self):
+        if self.error is not None or self.result is None:
+            return False
+        if isinstance(self.result, SoapResult):
+            if self.result.error is not None:
+                return False
+            if self.result.keys_wanted is not None and len(self.result) == 0:
+                return False
+        return True
+
+    def to_dict(self):
+        result = dict()
+        result['target'] = self.target
+        result['ok'] = self.ok
+        result['latency'] = round(self.latency, 4)
+        if self.error is not None:
+            result['error'] = self.error
+        elif not self.ok:
+            result['error'] = getattr(self.result, 'error', None) or "no answer"
+        elif isinstance(self.result, dict):
+            result['result'] = dict(self.result)
+        return result
+
+
+class FanOutResult:
+    """results of one action sent to many zones or rooms at once, latency is the one of the whole batch"""
+
+    def __init__(self, targets=None, latency=0.0):
+        self.targets = targets if targets is not None else []
+        self.latency = latency
+
+    @property
+    def failed(self):
+        return [target for target in self.targets if not target.ok]
+
+    def to_dict(self):
+        result = dict()
+        result['targets'] = [target.to_dict() for target in self.targets]
+        result['latency'] = round(self.latency, 4)
+        result['failed'] = len(self.failed)
+        return result
@@ -0,0 +1,250 @@
+from __future__ import unicode_literals
+
+import selectors
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+from pyfeld.errorPrint import err_print
+
+
+class SsdpResponse:
+    def __init__(self, headers, address):
+        self.headers = headers
+        self.address = address
+        self.location = headers.get('location', '')
+        self.st = headers.get('st', headers.get('nt', ''))
+        self.usn = headers.get('usn', '')
+        self.config_id = headers.get('configid.upnp.org')
+        self.boot_id = headers.get('bootid.upnp.org')
+        self.nts = headers.get('nts')
+        self.udn = self.usn.split('::')[0]
+        try:
+            self.host = urlparse(self.location).hostname or address[0]
+        except ValueError:
+            self.host = address[0]
+
+
+class SsdpSearch:
+    """multicast M-SEARCH client, answers are handed out as they arrive
+
+    for response in SsdpSearch.search():
+        if check(response.host):
+            break
+    """
+
+    multicast_group = ('239.255.255.250', 1900)
+    config_device = 'urn:schemas-raumfeld-com:device:ConfigDevice:1'
+    raumfeld_device = 'urn:schemas-raumfeld-com:device:RaumfeldDevice:1'
+    media_server = 'urn:schemas-upnp-org:device:MediaServer:1'
+    # the config device is only served by the raumfeld host
+    default_targets = (config_device,)
+    timeout = 3.0
+    mx = 1
+    resend_interval = 0.5
+    # how often a search given a stop event looks at it
+    stop_check = 0.1
+    ttl = 2
+
+    @staticmethod
+    def build_request(target, mx=None):
+        if mx is None:
+            mx = SsdpSearch.mx
+        return ('M-SEARCH * HTTP/1.1\r\n'
+                'HOST: {0}:{1}\r\n'
+                'MAN: "ssdp:discover"\r\n'
+                'MX: {2}\r\n'
+                'ST: {3}\r\n'
+                '\r\n').format(SsdpSearch.multicast_group[0], SsdpSearch.multicast_group[1],
+                               mx, target).encode('utf-8')
+
+    @staticmethod
+    def parse_headers(data):
+        try:
+            lines = data.decode('utf-8', 'replace').split('\r\n')
+        except Exception:
+            return None, None
+        headers = dict()
+        for line in lines[1:]:
+            if ':' in line:
+                (key, value) = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+        return lines[0], headers
+
+    @staticmethod
+    def parse_response(data, address):
+        (start_line, headers) = SsdpSearch.parse_headers(data)
+        if start_line is None or not start_line.upper().startswith('HTTP/1.1 200'):
+            return None
+        if 'location' not in headers:
+            return None
+        return SsdpResponse(headers, address)
+
+    @staticmethod
+    def __open_socket(interface_address):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        try:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, SsdpSearch.ttl)
+            if interface_address is None:
+                sock.bind(('', 0))
+            else:
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface_address))
+                sock.bind((interface_address, 0))
+            sock.setblocking(False)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    @staticmethod
+    def search(targets=None, timeout=None, interfaces=None, stop=None):
+        """generator over unique answers (by USN) until timeout seconds passed, the caller stops iterating or
+        the stop event is set
+
+        interfaces is a list of local addresses to search from, all at once, None uses the default route
+        """
+        if targets is None:
+            targets = SsdpSearch.default_targets
+        elif isinstance(targets, str):
+            targets = (targets,)
+        if timeout is None:
+            timeout = SsdpSearch.timeout
+        requests = [SsdpSearch.build_request(target) for target in targets]
+        selector = selectors.DefaultSelector()
+        try:
+            for interface_address in interfaces or [None]:
+                try:
+                    selector.register(SsdpSearch.__open_socket(interface_address), selectors.EVENT_READ)
+                except OSError as e:
+                    err_print("ssdp: can not search from {0}: {1}".format(interface_address, e))
+            sockets = [key.fileobj for key in selector.get_map().values()]
+            seen = set()
+            deadline = time.monotonic() + timeout
+            next_send = time.monotonic()
+            while len(sockets):
+                now = time.monotonic()
+                if now >= deadline or (stop is not None and stop.is_set()):
+                    return
+                if now >= next_send:
+                    # udp gets lost, repeat the search until someone answers
+                    for sock in sockets:
+                        for request in requests:
+                            try:
+                                sock.sendto(request, SsdpSearch.multicast_group)
+                            except OSError:
+                                pass
+                    next_send = now + SsdpSearch.resend_interval if not seen else deadline
+                wait = min(deadline, next_send) - now
+                if stop is not None:
+                    wait = min(wait, SsdpSearch.stop_check)
+                for (selector_key, events) in selector.select(max(0.01, wait)):
+                    try:
+                        (data, address) = selector_key.fileobj.recvfrom(8192)
+                    except OSError:
+                        continue
+                    response = SsdpSearch.parse_response(data, address)
+                    if response is None:
+                        continue
+                    answer_id = response.usn or response.location
+                    if answer_id in seen:
+                        continue
+                    seen.add(answer_id)
+                    yield response
+        finally:
+            for key in list(selector.get_map().values()):
+                key.fileobj.close()
+            selector.close()
+
+
+class SsdpListener:
+    """background listener for ssdp:alive / ssdp:byebye announcements
+
+    callback(response) is called on the listener thread for every NOTIFY, response.nts tells which one
+    """
+
+    alive = 'ssdp:alive'
+    byebye = 'ssdp:byebye'
+    poll_interval = 0.5
+
+    def __init__(self, callback, interfaces=None):
+        self.callback = callback
+        self.interfaces = interfaces
+        self.sock = None
+        self.thread = None
+        self.running = False
+
+    @staticmethod
+    def parse_notify(data, address):
+        (start_line, headers) = SsdpSearch.parse_headers(data)
+        if start_line is None or not start_line.upper().startswith('NOTIFY'):
+            return None
+        if headers.get('nts') not in (SsdpListener.alive, SsdpListener.byebye) or 'usn' not in headers:
+            return None
+        return SsdpResponse(headers, address)
+
+    def __open_socket(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if hasattr(socket, 'SO_REUSEPORT'):
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind(('', SsdpSearch.multicast_group[1]))
+            group = socket.inet_aton(SsdpSearch.multicast_group[0])
+            joined = 0
+            for interface_address in self.interfaces or ['0.0.0.0']:
+                try:
+                    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                                    group + socket.inet_aton(interface_address))
+                    joined += 1
+                except OSError as e:
+                    err_print("ssdp: can not listen on {0}: {1}".format(interface_address, e))
+            if joined == 0:
+                raise OSError("ssdp: no interface joined the multicast group")
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def start(self):
+        if self.running:
+            return
+        self.sock = self.__open_socket()
+        self.running = True
+        self.thread = threading.Thread(target=self.__run, name="pyfeld-ssdp-listener")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+
+    def __run(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self.sock, selectors.EVENT_READ)
+        try:
+            while self.running:
+                if not selector.select(SsdpListener.poll_interval):
+                    continue
+                try:
+                    (data, address) = self.sock.recvfrom(8192)
+                except OSError:
+                    continue
+                response = SsdpListener.parse_notify(data, address)
+                if response is None:
+                    continue
+                try:
+                    self.callback(response)
+                except Exception as e:
+                    err_print("ssdp: notify handler failed: {0}".format(e))
+        finally:
+            selector.close()
+            self.sock.close()
+            self.sock = None
+
+
+if __name__ == "__main__":
+    for found in SsdpSearch.search((SsdpSearch.config_device, SsdpSearch.raumfeld_device)):
+        print(found.host, found.st, found.location)
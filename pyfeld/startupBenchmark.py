@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+from __future__ import unicode_literals
+
+import subprocess
+import sys
+import time
+
+
+class StartupBenchmark:
+    """measures start up time and import cost of pyfeld commands, each run in a fresh interpreter
+
+    python3 -m pyfeld.startupBenchmark [runs] [command ...]
+    """
+
+    runs = 5
+    # answered from data.json, these should stay in the tens of milliseconds
+    commands = ('rooms', 'zones', 'info', 'unassignedrooms', '--help')
+    top_imports = 8
+
+    @staticmethod
+    def __run(args):
+        started = time.monotonic()
+        process = subprocess.run([sys.executable, '-X', 'importtime'] + args,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        elapsed = time.monotonic() - started
+        return elapsed, process.stderr.decode('utf-8', 'replace')
+
+    @staticmethod
+    def parse_importtime(output):
+        """dict of top level module name to cumulative import time in microseconds"""
+        modules = dict()
+        for line in output.splitlines():
+            if not line.startswith('import time:') or line.count('|') != 2:
+                continue
+            (own, cumulative, name) = line[len('import time:'):].split('|')
+            # only modules imported directly, nested ones are part of their parent's cumulative time
+            if name.startswith('  ') or not cumulative.strip().isdigit():
+                continue
+            modules[name.strip()] = int(cumulative)
+        return modules
+
+    @staticmethod
+    def measure(args, runs=None):
+        """(best wall time in seconds, import costs of the best run)"""
+        if runs is None:
+            runs = StartupBenchmark.runs
+        best = None
+        for i in range(runs):
+            (elapsed, output) = StartupBenchmark.__run(args)
+            if best is None or elapsed < best[0]:
+                best = (elapsed, StartupBenchmark.parse_importtime(output))
+        return best
+
+    @staticmethod
+    def report(commands=None, runs=None):
+        if commands is None:
+            commands = StartupBenchmark.commands
+        (baseline, baseline_imports) = StartupBenchmark.measure(['-c', 'pass'], runs)
+        result = "interpreter baseline {0:.1f}ms\n".format(baseline * 1000)
+        for command in commands:
+            (elapsed, imports) = StartupBenchmark.measure(['-m', 'pyfeld.rfcmd', '--local', command], runs)
+            result += "{0:<20} {1:7.1f}ms  +{2:.1f}ms over baseline\n".format(command, elapsed * 1000,
+                                                                               (elapsed - baseline) * 1000)
+            costs = [(cost, name) for (name, cost) in imports.items() if name not in baseline_imports]
+            for (cost, name) in sorted(costs, reverse=True)[:StartupBenchmark.top_imports]:
+                result += "    {0:7.1f}ms  {1}\n".format(cost / 1000, name)
+        return result
+
+
+def run_main():
+    args = sys.argv[1:]
+    runs = None
+    if len(args) and args[0].isdigit():
+        runs = int(args[0])
+        args = args[1:]
+    sys.stdout.write(StartupBenchmark.report(args or None, runs))
+
+
+if __name__ == "__main__":
+    run_main()
@@ -0,0 +1,150 @@
+from __future__ import unicode_literals
+
+from xml.parsers import expat
+
+
+class DeviceInfo:
+    def __init__(self, udn, location, device_type, name=''):
+        self.udn = udn
+        self.location = location
+        self.type = device_type
+        self.name = name
+
+
+class RoomInfo:
+    def __init__(self, udn, name):
+        self.udn = udn
+        self.name = name
+        self.renderer_udns = []
+
+    @property
+    def renderer_udn(self):
+        if len(self.renderer_udns) == 0:
+            return None
+        return self.renderer_udns[0]
+
+
+class ZoneInfo:
+    """zone of getZones, the unassigned rooms are collected in a ZoneInfo with udn None"""
+
+    def __init__(self, udn):
+        self.udn = udn
+        self.rooms = []
+
+
+class Topology:
+    """getZones and listDevices parsed once into udn indexes
+
+    topology = Topology.parse(get_zones_xml, list_devices_xml)
+    location = topology.location(zone.udn)
+    """
+
+    def __init__(self):
+        self.devices = dict()
+        self.locations = dict()
+        self.zones = []
+        self.unassigned = None
+        self.descriptions = None
+        self.update_id = None
+
+    @staticmethod
+    def parse(zones_data, devices_data):
+        topology = Topology()
+        topology.feed_devices(devices_data)
+        topology.feed_zones(zones_data)
+        return topology
+
+    @staticmethod
+    def __parser():
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+        return parser
+
+    @staticmethod
+    def __parse(parser, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        parser.Parse(data, True)
+
+    def feed_devices(self, data):
+        parser = Topology.__parser()
+        current = []
+        text = []
+
+        def start_element(name, attributes):
+            if name == 'device':
+                current.append(DeviceInfo(attributes.get('udn'), attributes.get('location'), attributes.get('type')))
+                del text[:]
+
+        def end_element(name):
+            if name == 'device' and current:
+                device = current.pop()
+                device.name = ''.join(text).strip()
+                self.add_device(device)
+
+        def character_data(data):
+            if current:
+                text.append(data)
+
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+        parser.CharacterDataHandler = character_data
+        Topology.__parse(parser, data)
+
+    def feed_zones(self, data):
+        parser = Topology.__parser()
+        zones = []
+        rooms = []
+
+        def start_element(name, attributes):
+            if name == 'zone':
+                zones.append(ZoneInfo(attributes.get('udn')))
+            elif name == 'unassignedRooms':
+                zones.append(ZoneInfo(None))
+            elif name == 'room' and zones:
+                rooms.append(RoomInfo(attributes.get('udn'), attributes.get('name')))
+            elif name == 'renderer' and rooms:
+                rooms[-1].renderer_udns.append(attributes.get('udn'))
+
+        def end_element(name):
+            if name == 'room' and rooms:
+                zones[-1].rooms.append(rooms.pop())
+            elif name == 'zone' and zones:
+                self.zones.append(zones.pop())
+            elif name == 'unassignedRooms' and zones:
+                self.unassigned = zones.pop()
+
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+        Topology.__parse(parser, data)
+
+    def add_device(self, device):
+        if device.udn is None:
+            return
+        self.devices[device.udn] = device
+        if device.location:
+            self.locations[device.udn] = device.location
+
+    def location(self, udn):
+        if udn is None:
+            return None
+        return self.locations.get(udn)
+
+    def all_zones(self):
+        return self.zones if self.unassigned is None else self.zones + [self.unassigned]
+
+    def room_locations(self, zones=None):
+        for zone in self.all_zones() if zones is None else zones:
+            yield self.location(zone.udn)
+            for room in zone.rooms:
+                yield self.location(room.renderer_udn)
+
+    def zone_key(self, zone):
+        """everything a built RaumfeldZone depends on, equal keys mean the zone object can be kept"""
+        rooms = sorted((room.udn or '', room.renderer_udn or '', room.name or '', self.location(room.renderer_udn) or '')
+                       for room in zone.rooms)
+        return zone.udn, self.location(zone.udn), tuple(rooms)
+
+    def devices_of_type(self, device_type, name=None):
+        return [device for device in self.devices.values()
+                if device.type == device_type and (name is None or device.name == name)]
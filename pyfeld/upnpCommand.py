@@ -2,209 +2,272 @@
 from __future__ import unicode_literals
 
 import json
-import requests
 import sys
-import cgi 
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from xml.dom import minidom
-
-from pyfeld.xmlHelper import XmlHelper
+from xml.parsers import expat
+
+from pyfeld.callPolicy import CallPolicy
+from pyfeld.connectionPool import ConnectionPool
+from pyfeld.soapAction import SoapAction
+from pyfeld.upnpsoap import UpnpSoap
+from pyfeld.soapResponse import SoapResponseParser, SoapResult, VolumeInfo, PositionInfo, \
+    TransportSettings, MediaInfo, BrowseResult, SearchCapabilities, ZoneSnapshot, TargetResult, FanOutResult
 from pyfeld.didlInfo import DidlInfo
 
 
 class UpnpCommand:
+    chunk_size = 16384
+    # raw socket transport from UpnpSoap instead of requests sessions, for the whole process
+    use_raw_socket = False
+    # the same for the context one command runs in (--rawsocket), None follows use_raw_socket
+    __raw_socket = contextvars.ContextVar('pyfeld_raw_socket', default=None)
+    snapshot_workers = 16
+    fan_out_workers = 16
+
+    __executor = None
+    __fan_out_executor = None
+    __executor_lock = threading.Lock()
 
     def __init__(self, host):
         self.host = host
         self.verbose = False
+        if host.startswith("http://"):
+            self.base_url = host
+            self.host_name = host[7:]
+        else:
+            self.base_url = "http://" + host
+            self.host_name = host
 
-    def host_send(self, action, control_path, control_name, action_args):
+    @staticmethod
+    def set_raw_socket(enabled):
+        """transport for the rest of the current context"""
+        UpnpCommand.__raw_socket.set(enabled)
 
-        if self.host.startswith("http://"):
-            control_url = self.host + control_path
-            host_name = self.host[7:]
-        else:
-            control_url = "http://" + self.host + control_path
-            host_name = self.host
-
-        body = '<?xml version="1.0"?>'
-        body += '<SOAP-ENV:Envelope xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" '
-        body += 'SOAP-ENV:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">'
-        body += '<SOAP-ENV:Body>'
-        body += '	<m:'+action+' xmlns:m="urn:schemas-upnp-org:service:'+control_name+':1">'
-        body += action_args
-        body += '	</m:'+action+'>'
-        body += '</SOAP-ENV:Body>'
-        body += '</SOAP-ENV:Envelope>'
+    @staticmethod
+    def uses_raw_socket():
+        enabled = UpnpCommand.__raw_socket.get()
+        return UpnpCommand.use_raw_socket if enabled is None else enabled
+
+    def host_send(self, action, control_path, control_name, action_args, result_class=SoapResult):
+        control_url = self.base_url + control_path
+        host_name = self.host_name
+
+        soap_action = SoapAction.for_service(control_name, action)
+        body = soap_action.body(action_args)
         if self.verbose:
             print(body)
-        headers = {'Host': host_name,
-                   'User-Agent': 'xrf/1.0',
-                   'Content-Type': 'text/xml; charset="utf-8"',
-                   'Content-Length': str(len(body)),
-                   'SOAPAction': '"urn:schemas-upnp-org:service:'+control_name+':1#'+action+'"'}
+        def attempt(timeout):
+            parser = SoapResponseParser(result_class)
+            if UpnpCommand.uses_raw_socket():
+                request = soap_action.request(control_path, host_name, action_args)
+                status_code = UpnpSoap.post(host_name, request, parser.feed, timeout)
+            else:
+                # the pool blocks when full, the connection has to go back even when reading or parsing fails
+                with ConnectionPool.session(host_name) as session, \
+                        session.post(control_url, data=body, headers=soap_action.headers, stream=True,
+                                     timeout=timeout) as response:
+                    for chunk in response.iter_content(chunk_size=UpnpCommand.chunk_size):
+                        if self.verbose:
+                            print(chunk)
+                        parser.feed(chunk)
+                    status_code = response.status_code
+            return status_code, parser.close()
+
         try:
-            response = requests.post(control_url, data=body, headers=headers, verify=False)
-            if response.status_code < 300:
-                if self.verbose:
-                    print(response.content)
-                result = minidom.parseString(response.content)
-                if self.verbose:
-                    print(result.toprettyxml())
+            (status_code, result) = CallPolicy.call(host_name, attempt, soap_action.idempotent)
+            if status_code < 300:
                 return result
             else:
-                print("query {0} returned status_code:{1}".format(control_url,response.status_code))
+                print("query {0} returned status_code:{1} {2}".format(control_url, status_code,
+                                                                      result.error or ""))
+        except expat.ExpatError as e:
+            print("query {0} returned an unreadable response: {1}".format(control_url, e))
         except Exception as e:
             print("host send error {0}".format(e))
         return None
 
-    def host_send_rendering(self, action, action_args):
+    def host_send_rendering(self, action, action_args, result_class=SoapResult):
         return self.host_send(action,
                               "/RenderingService/Control",
                               "RenderingControl",
-                              action_args)
+                              action_args,
+                              result_class)
 
-    def host_send_transport(self, action, action_args):
+    def host_send_transport(self, action, action_args, result_class=SoapResult):
         return self.host_send(action,
                               "/TransportService/Control",
                               "AVTransport",
-                              action_args)
+                              action_args,
+                              result_class)
 
-    def host_send_contentdirectory(self, action, action_args):
+    def host_send_contentdirectory(self, action, action_args, result_class=SoapResult):
         return self.host_send(action,
                           "/cd/Control",
                           "ContentDirectory",
-                          action_args)
+                          action_args,
+                          result_class)
 
     def play(self):
-        xmlroot = self.host_send_transport("Play",  '<InstanceID>0</InstanceID><Speed>1</Speed>')
-        return xmlroot.toprettyxml()
+        return self.host_send_transport("Play", (('InstanceID', 0), ('Speed', 1)))
 
     def stop(self):
-        xmlroot = self.host_send_transport("Stop",  '<InstanceID>0</InstanceID>')
-        return xmlroot.toprettyxml()
+        return self.host_send_transport("Stop", (('InstanceID', 0),))
 
     def seek(self, value):
-        xmlroot = self.host_send_transport("Seek",
-                                           '<InstanceID>0</InstanceID><Unit>ABS_TIME</Unit>'
-                                           '<Target>' + value + '</Target>')
-        return xmlroot.toprettyxml()
+        return self.host_send_transport("Seek", (('InstanceID', 0),
+                                                 ('Unit', 'ABS_TIME'),
+                                                 ('Target', value)))
 
     def previous(self):
-        xmlroot = self.host_send_transport("Previous", '<InstanceID>0</InstanceID>')
-        return xmlroot.toprettyxml()
+        return self.host_send_transport("Previous", (('InstanceID', 0),))
 
     def next(self):
-        xmlroot = self.host_send_transport("Next", '<InstanceID>0</InstanceID>')
-        return xmlroot.toprettyxml()
+        return self.host_send_transport("Next", (('InstanceID', 0),))
 
     def get_state_var(self):
-        xmlroot = self.host_send_rendering("GetStateVariables",
-                                           '<InstanceID>0</InstanceID><'
-                                           'StateVariableList>TransportStatus</StateVariableList>')
-        return xmlroot.toprettyxml()
+        return self.host_send_rendering("GetStateVariables", (('InstanceID', 0),
+                                                              ('StateVariableList', 'TransportStatus')),
+                                        SoapResult)
 
     def get_position_info(self):
-        xmlroot = self.host_send_transport("GetPositionInfo",  '<InstanceID>0</InstanceID>')
-        return XmlHelper.xml_extract_dict(xmlroot, ['Track',
-                                                    'TrackDuration',
-                                                    'TrackMetaData',
-                                                    'TrackURI',
-                                                    'RelTime',
-                                                    'AbsTime',
-                                                    'RelCount',
-                                                    'AbsCount'])
+        return self.host_send_transport("GetPositionInfo", (('InstanceID', 0),), PositionInfo) or PositionInfo()
 
     def get_transport_setting(self):
-        xmlroot = self.host_send_transport("GetTransportSettings",  '<InstanceID>0</InstanceID>')
-        return XmlHelper.xml_extract_dict(xmlroot, ['PlayMode'])
+        return self.host_send_transport("GetTransportSettings", (('InstanceID', 0),),
+                                        TransportSettings) or TransportSettings()
 
     def get_media_info(self):
-        xmlroot = self.host_send_transport("GetMediaInfo",  '<InstanceID>0</InstanceID>')
-        return XmlHelper.xml_extract_dict(xmlroot, ['PlayMedium', 'NrTracks', 'CurrentURI', 'CurrentURIMetaData'])
+        return self.host_send_transport("GetMediaInfo", (('InstanceID', 0),), MediaInfo) or MediaInfo()
 
     def set_transport_uri(self, data):
         print("CurrentURI:\n" + data['CurrentURI'])
         print("CurrentURIMetaData:\n" + data['CurrentURIMetaData'])
-        send_data = '<InstanceID>0</InstanceID>'
         add_uri = data['CurrentURI']
         if 'raumfeldname' in data:
             if data['raumfeldname'] == 'Station':
                 if 'TrackURI' in data:
                     add_uri = data['TrackURI']
 
-        send_data += "<CurrentURI><![CDATA[" + add_uri + "]]></CurrentURI>"
-        send_data += "<CurrentURIMetaData>" + cgi.escape(data['CurrentURIMetaData']) + "</CurrentURIMetaData>"
-        # + cgi.escape(data['CurrentURIMetaData']) +
+        send_data = (('InstanceID', 0),
+                     ('CurrentURI', add_uri),
+                     ('CurrentURIMetaData', data['CurrentURIMetaData']))
         print(data['CurrentURIMetaData'])
-        xmlroot = self.host_send_transport("SetAVTransportURI", send_data)
-        return XmlHelper.xml_extract_dict(xmlroot, ['SetAVTransportURI'])
+        return self.host_send_transport("SetAVTransportURI", send_data)
+
+    @staticmethod
+    def get_executor():
+        with UpnpCommand.__executor_lock:
+            if UpnpCommand.__executor is None:
+                UpnpCommand.__executor = ThreadPoolExecutor(max_workers=UpnpCommand.snapshot_workers)
+            return UpnpCommand.__executor
+
+    def get_zone_snapshot(self, room_udns=()):
+        """all reads of a zone issued concurrently, latency is bound by the slowest one"""
+        start = time.monotonic()
+        executor = UpnpCommand.get_executor()
+
+        def submit(function, *args):
+            # the worker threads have to see the callers deadline
+            return executor.submit(contextvars.copy_context().run, function, *args)
+
+        volume = submit(self.get_volume_info)
+        position = submit(self.get_position_info)
+        transport = submit(self.get_transport_setting)
+        media = submit(self.get_media_info)
+        rooms = [(udn, submit(self.get_room_volume, udn)) for udn in room_udns]
+        snapshot = ZoneSnapshot(volume.result(), position.result(), transport.result(), media.result(),
+                                dict((udn, future.result()) for udn, future in rooms))
+        snapshot.latency = time.monotonic() - start
+        return snapshot
+
+    @staticmethod
+    def fan_out(calls):
+        """runs (target, function, args) calls concurrently, one TargetResult per call in the order given
+
+        the calls get their own executor, a call may take a zone snapshot without starving the pool
+        """
+        start = time.monotonic()
+        with UpnpCommand.__executor_lock:
+            if UpnpCommand.__fan_out_executor is None:
+                UpnpCommand.__fan_out_executor = ThreadPoolExecutor(max_workers=UpnpCommand.fan_out_workers)
+            executor = UpnpCommand.__fan_out_executor
+
+        def timed(target, function, args):
+            call_start = time.monotonic()
+            try:
+                return TargetResult(target, function(*args), None, time.monotonic() - call_start)
+            except Exception as e:
+                return TargetResult(target, None, str(e), time.monotonic() - call_start)
+
+        futures = [executor.submit(contextvars.copy_context().run, timed, target, function, args)
+                   for (target, function, args) in calls]
+        return FanOutResult([future.result() for future in futures], time.monotonic() - start)
 
     '''Rendering service'''
 
+    def get_volume_info(self):
+        return self.host_send_rendering("GetVolume", (('InstanceID', 0), ('Channel', 'Master')),
+                                        VolumeInfo) or VolumeInfo()
+
     def get_volume(self, format = 'plain'):
-        xmlroot = self.host_send_rendering("GetVolume", '<InstanceID>0</InstanceID><Channel>Master</Channel>')
-        dict = XmlHelper.xml_extract_dict(xmlroot, ['CurrentVolume'])
+        dict = self.get_volume_info()
         if format == 'json':
             return '{ "CurrentVolume": "'+dict['CurrentVolume'] + '"}'
         else:
             return dict['CurrentVolume']
 
     def set_volume(self, value):
-        xmlroot = self.host_send_rendering("SetVolume",
-                                           '<InstanceID>0</InstanceID><Channel>Master</Channel>' +
-                                           '<DesiredVolume>' + str(value) + '</DesiredVolume>')
-        return xmlroot.toprettyxml()
+        return self.host_send_rendering("SetVolume", (('InstanceID', 0),
+                                                      ('Channel', 'Master'),
+                                                      ('DesiredVolume', value)))
 
     def get_room_volume(self, uuid):
-        xmlroot = self.host_send_rendering("GetRoomVolume", '<InstanceID>0</InstanceID>'
-                                           '<Room>' + uuid + '</Room>')
-        return XmlHelper.xml_extract_dict(xmlroot, ['CurrentVolume'])
+        return self.host_send_rendering("GetRoomVolume", (('InstanceID', 0), ('Room', uuid)),
+                                        VolumeInfo) or VolumeInfo()
 
     def set_room_volume(self, uuid, value):
-        xmlroot = self.host_send_rendering("SetVolume",
-                                           '<InstanceID>0</InstanceID><Channel>Master</Channel>' +
-                                           '<DesiredVolume>' + str(value) + '</DesiredVolume>' +
-                                           '<Room>' + uuid + '</Room>')
-        return None
+        return self.host_send_rendering("SetVolume", (('InstanceID', 0),
+                                                      ('Channel', 'Master'),
+                                                      ('DesiredVolume', value),
+                                                      ('Room', uuid)))
 
     def get_browse_capabilites(self):
-        xmlroot = self.host_send_contentdirectory("GetSearchCapabilities", '')
-        return XmlHelper.xml_extract_dict(xmlroot, ['SearchCaps'])
+        return self.host_send_contentdirectory("GetSearchCapabilities", (),
+                                               SearchCapabilities) or SearchCapabilities()
 
     def search(self, path, search_string, format="plain"):
-        browseData = "<ContainerID>" + path + "</ContainerID>" \
-                     + "<SearchCriteria>" + search_string + "</SearchCriteria>" \
-                     + "<Filter>*</Filter>" \
-                     + "<StartingIndex>0</StartingIndex>" \
-                     + "<RequestedCount>0</RequestedCount>" \
-                     + "<SortCriteria>dc:title</SortCriteria>"
-        xmlroot = self.host_send_contentdirectory("Search", browseData)
-        result = XmlHelper.xml_extract_dict(xmlroot, ['Result', 'TotalMatches', 'NumberReturned'])
+        browseData = (('ContainerID', path),
+                      ('SearchCriteria', search_string),
+                      ('Filter', '*'),
+                      ('StartingIndex', 0),
+                      ('RequestedCount', 0),
+                      ('SortCriteria', 'dc:title'))
+        result = self.host_send_contentdirectory("Search", browseData, BrowseResult) or BrowseResult()
         return self.scan_browse_result(result, 0, format)
 
 
     def browse(self, path):
-        browseData = "<ObjectID>" + path +"</ObjectID>" \
-            + "<BrowseFlag>BrowseMetadata</BrowseFlag>" \
-            + "<Filter>*</Filter>" \
-            + "<StartingIndex>0</StartingIndex>" \
-            + "<RequestedCount>0</RequestedCount>" \
-            + "<SortCriteria>dc:title</SortCriteria>"
-        xmlroot = self.host_send_contentdirectory("Browse", browseData)
-        return XmlHelper.xml_extract_dict(xmlroot, ['Result', 'TotalMatches', 'NumberReturned'])
+        browseData = (('ObjectID', path),
+                      ('BrowseFlag', 'BrowseMetadata'),
+                      ('Filter', '*'),
+                      ('StartingIndex', 0),
+                      ('RequestedCount', 0),
+                      ('SortCriteria', 'dc:title'))
+        return self.host_send_contentdirectory("Browse", browseData, BrowseResult) or BrowseResult()
 
     def browsechildren(self, path):
-        browseData = "<ObjectID>" + path + "</ObjectID>" \
-            + "<BrowseFlag>BrowseDirectChildren</BrowseFlag>" \
-            + "<Filter>*</Filter>" \
-            + "<StartingIndex>0</StartingIndex>" \
-            + "<RequestedCount>0</RequestedCount>" \
-            + "<SortCriteria>dc:title</SortCriteria>"
-        xmlroot = self.host_send_contentdirectory("Browse", browseData)
-        if xmlroot is None:
-            return None
-        return XmlHelper.xml_extract_dict(xmlroot, ['Result', 'TotalMatches', 'NumberReturned'])
+        browseData = (('ObjectID', path),
+                      ('BrowseFlag', 'BrowseDirectChildren'),
+                      ('Filter', '*'),
+                      ('StartingIndex', 0),
+                      ('RequestedCount', 0),
+                      ('SortCriteria', 'dc:title'))
+        return self.host_send_contentdirectory("Browse", browseData, BrowseResult)
 
     def get_node_element(self, node, tag):
         element = node.getElementsByTagName(tag)
@@ -310,10 +373,8 @@ def main(argv):
         result = uc.get_media_info()
         result += uc.get_position_info()
     elif operation == 'allinfo':
-        result = uc.get_volume()
-        result += uc.get_position_info()
-        result += uc.get_transport_setting()
-        result += uc.get_media_info()
+        snapshot = uc.get_zone_snapshot()
+        result = json.dumps(snapshot.to_dict(), sort_keys=True, indent=2)
     elif operation == 'cap':
         result = uc.get_browse_capabilites()
     elif operation == 'browse':
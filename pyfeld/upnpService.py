@@ -1,34 +1,81 @@
 from __future__ import unicode_literals
 
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
 import urllib3
 
 from xml.dom import minidom
 
+from pyfeld.descriptionCache import DescriptionCache
 from pyfeld.upnpsoap import UpnpSoap
 from pyfeld.xmlHelper import XmlHelper
 
 
 class Services:
+    max_parallel = 8
 
     @staticmethod
-    def get_services_from_location(location):
+    def parse_services(xml_data):
+        xml_root = minidom.parseString(xml_data)
+        services_list = list()
+        for service in xml_root.getElementsByTagName("service"):
+            service_dict = XmlHelper.xml_extract_dict(service, ['serviceType',
+                                                           'controlURL',
+                                                           'eventSubURL',
+                                                           'SCPDURL',
+                                                           'serviceId'])
+            services_list.append(service_dict)
+        return services_list
+
+    @staticmethod
+    def __fetch(location):
+        entry = DescriptionCache.get(location)
+        if entry is not None and DescriptionCache.is_fresh(entry):
+            return entry['services']
+        headers = dict()
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
         try:
-            (xml_headers, xml_data) = UpnpSoap.get(location)
-            if xml_data is not False:
-                xml_root = minidom.parseString(xml_data)
-                services_list = list()
-                for service in xml_root.getElementsByTagName("service"):
-                    service_dict = XmlHelper.xml_extract_dict(service, ['serviceType',
-                                                                   'controlURL',
-                                                                   'eventSubURL',
-                                                                   'SCPDURL',
-                                                                   'serviceId'])
-                    services_list.append(service_dict)
-                return services_list
+            response = UpnpSoap.get_response(location, headers)
+            if response is None:
+                return None
+            if response.status == 304 and entry is not None:
+                DescriptionCache.touch(location)
+                return entry['services']
+            if response.status != 200:
+                print("Error get_subscription_urls: {0} returned {1}".format(location, response.status))
+                return None
+            services_list = Services.parse_services(response.data)
+            DescriptionCache.put(location, services_list,
+                                 response.headers.get('ETag'), response.headers.get('Last-Modified'))
+            return services_list
         except Exception as e:
             print("Error get_subscription_urls:{0}".format(e))
         return None
 
+    @staticmethod
+    def get_services_from_location(location):
+        services_list = Services.__fetch(location)
+        DescriptionCache.save()
+        return services_list
+
+    @staticmethod
+    def get_services_from_locations(locations):
+        """dict location -> services list, every distinct location is fetched once with bounded parallelism"""
+        unique = list(dict.fromkeys(location for location in locations if location))
+        if len(unique) == 0:
+            return dict()
+        with ThreadPoolExecutor(max_workers=min(Services.max_parallel, len(unique))) as executor:
+            futures = [executor.submit(contextvars.copy_context().run, Services.__fetch, location)
+                       for location in unique]
+            descriptions = dict((location, future.result()) for location, future in zip(unique, futures))
+        DescriptionCache.save()
+        return descriptions
+
 
 class UpnpService:
     def __init__(self):
@@ -36,11 +83,15 @@ class UpnpService:
         self.xml_location = ""
         self.network_location = ""
 
-    def set_location(self, location):
+    def set_location(self, location, descriptions=None):
+        """descriptions is an optional dict location -> services list fetched beforehand"""
         self.xml_location = location
         result = urllib3.util.parse_url(location)
         self.network_location = result.netloc
-        self.services_list = Services.get_services_from_location(location)
+        if descriptions is not None and location in descriptions:
+            self.services_list = descriptions[location]
+        else:
+            self.services_list = Services.get_services_from_location(location)
 
     def get_network_location(self):
         return self.network_location
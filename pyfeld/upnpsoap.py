@@ -1,8 +1,132 @@
 from __future__ import unicode_literals
 
+import socket
+import threading
+
 import urllib3
 
+from pyfeld.callPolicy import CallPolicy
+from pyfeld.soapAction import SoapAction
+
+
+class SoapConnection:
+    """keep-alive socket with a reusable receive buffer, responses are framed by Content-Length or chunks"""
+
+    buffer_size = 65536
+
+    def __init__(self, host, port, timeout):
+        self.sock = socket.create_connection((host, port), timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.buffer = bytearray(SoapConnection.buffer_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+        self.response_started = False
+
+    def close(self):
+        try:
+            self.view.release()
+            self.sock.close()
+        except Exception:
+            pass
+
+    def set_timeout(self, timeout):
+        self.sock.settimeout(timeout)
+
+    def __fill(self):
+        if self.start == self.end:
+            self.start = 0
+            self.end = 0
+        elif self.end == len(self.buffer):
+            pending = self.end - self.start
+            if self.start == 0:
+                # a single header line does not fit, grow once
+                self.view.release()
+                self.buffer = self.buffer + bytearray(len(self.buffer))
+                self.view = memoryview(self.buffer)
+            else:
+                self.buffer[0:pending] = self.buffer[self.start:self.end]
+                self.start = 0
+                self.end = pending
+        received = self.sock.recv_into(self.view[self.end:])
+        if received == 0:
+            raise ConnectionError("connection closed by device")
+        self.end += received
+
+    def read_until(self, delimiter):
+        scanned = 0
+        while True:
+            index = self.buffer.find(delimiter, self.start + scanned, self.end)
+            if index != -1:
+                line = bytes(self.view[self.start:index])
+                self.start = index + len(delimiter)
+                return line
+            scanned = max(0, self.end - self.start - len(delimiter) + 1)
+            self.__fill()
+
+    def read_exact(self, length, feed):
+        while length > 0:
+            if self.start == self.end:
+                self.__fill()
+            take = min(length, self.end - self.start)
+            feed(self.view[self.start:self.start + take])
+            self.start += take
+            length -= take
+
+    def read_to_end(self, feed):
+        while True:
+            try:
+                if self.start == self.end:
+                    self.__fill()
+            except ConnectionError:
+                return
+            feed(self.view[self.start:self.end])
+            self.start = self.end
+
+    def request(self, request, feed):
+        self.response_started = False
+        self.sock.sendall(request)
+        header_block = self.read_until(b"\r\n\r\n").decode('iso-8859-1')
+        self.response_started = True
+        lines = header_block.split("\r\n")
+        status_code = int(lines[0].split(' ')[1])
+        headers = dict()
+        for line in lines[1:]:
+            if ':' in line:
+                (key, value) = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int(self.read_until(b"\r\n").split(b';')[0], 16)
+                if size == 0:
+                    self.read_until(b"\r\n")
+                    break
+                self.read_exact(size, feed)
+                self.read_until(b"\r\n")
+        elif 'content-length' in headers:
+            self.read_exact(int(headers['content-length']), feed)
+        else:
+            self.read_to_end(feed)
+            headers['connection'] = 'close'
+        keep_alive = headers.get('connection', '').lower() != 'close'
+        return status_code, keep_alive
+
+
 class UpnpSoap:
+    timeout = 10.0
+    max_idle_per_host = 4
+
+    # description and topology fetches share one PoolManager
+    get_timeout = urllib3.Timeout(connect=2.0, read=5.0)
+    # connection level retries are left to CallPolicy, which backs off with jitter
+    get_retries = urllib3.Retry(total=2, connect=0, read=0, other=0, redirect=2)
+    get_maxsize = 4
+    get_num_pools = 64
+
+    __lock = threading.Lock()
+    __idle = dict()
+    __http = None
+
     @staticmethod
     def extractSingleTag(self, data, tag):
         startTag = "<%s" % tag
@@ -17,6 +141,65 @@ class UpnpSoap:
             pass
         return None
 
+    @staticmethod
+    def split_host_name(host_name):
+        # Check if a port number was specified in the host name; default is port 80
+        if ':' in host_name:
+            host_names = host_name.split(':')
+            return host_names[0], int(host_names[1])
+        return host_name, 80
+
+    @staticmethod
+    def __acquire(host_name, timeout):
+        with UpnpSoap.__lock:
+            idle = UpnpSoap.__idle.get(host_name)
+            if idle:
+                connection = idle.pop()
+                connection.set_timeout(timeout)
+                return connection, True
+        (host, port) = UpnpSoap.split_host_name(host_name)
+        return SoapConnection(host, port, timeout), False
+
+    @staticmethod
+    def __release(host_name, connection):
+        with UpnpSoap.__lock:
+            idle = UpnpSoap.__idle.setdefault(host_name, list())
+            if len(idle) < UpnpSoap.max_idle_per_host:
+                idle.append(connection)
+                return
+        connection.close()
+
+    @staticmethod
+    def close_all():
+        with UpnpSoap.__lock:
+            connections = [c for idle in UpnpSoap.__idle.values() for c in idle]
+            UpnpSoap.__idle.clear()
+        for connection in connections:
+            connection.close()
+
+    @staticmethod
+    def post(host_name, request, feed, timeout=None):
+        """send a complete request over a pooled keep-alive socket, the body is handed to feed piecewise"""
+        if timeout is None:
+            timeout = UpnpSoap.timeout
+        (connection, reused) = UpnpSoap.__acquire(host_name, timeout)
+        try:
+            (status_code, keep_alive) = connection.request(request, feed)
+        except (ConnectionError, socket.timeout) as e:
+            connection.close()
+            if reused and not connection.response_started and not isinstance(e, socket.timeout):
+                # the device dropped an idle keep-alive connection, try once more on a fresh one
+                return UpnpSoap.post(host_name, request, feed, timeout)
+            raise
+        except BaseException:
+            connection.close()
+            raise
+        if keep_alive:
+            UpnpSoap.__release(host_name, connection)
+        else:
+            connection.close()
+        return status_code
+
     @staticmethod
     def send(host_name, service_type, control_url, action_name, action_arguments):
 
@@ -27,90 +210,121 @@ class UpnpSoap:
             else:
                 control_url = '/' + urls[3]
 
-        request = 'POST %s HTTP/1.1\r\n' % control_url
-
-        # Check if a port number was specified in the host name; default is port 80
-        if ':' in host_name:
-            host_names = host_name.split(':')
-            host = host_names[0]
-            try:
-                port = int(host_names[1])
-            except:
-                print('Invalid port specified for host connection:', host_name[1])
-                return False
-        else:
-            host = host_name
-            port = 80
-
-        argList = ''
-        for arg, (val, dt) in action_arguments.items():
-            argList += '<%s>%s</%s>' % (arg, val, arg)
-
-        body = '<?xml version="1.0"?>\n' \
-                   '<SOAP-ENV:Envelope xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" '\
-                   'SOAP-ENV:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">\n' \
-                   '<SOAP-ENV:Body>\n' \
-                   '<m:%s xmlns:m="%s">\n' \
-                   '%s\n' \
-                   '</m:%s>\n' \
-                   '</SOAP-ENV:Body>\n' \
-                   '</SOAP-ENV:Envelope>\n' % (action_name, service_type, argList, action_name)
-
-        headers = {
-            'Host': host_name,
-            'Content-Length': len(body.encode('ascii')),
-            'Content-Type': 'text/xml',
-            'SOAPAction': '"%s#%s"' % (service_type, action_name)
-        }
-
-        for head, value in headers.items():
-            request += '%s: %s\r\n' % (head, value)
-        request += '\r\n%s' % body
-        soap_envelope_end = re.compile('<\/.*:envelope>')
-
         try:
-            sock = socket(AF_INET, SOCK_STREAM)
-            sock.connect((host, port))
+            UpnpSoap.split_host_name(host_name)
+        except:
+            print('Invalid port specified for host connection:', host_name)
+            return False
 
-            sock.send(request.encode('ascii'))
-            response = ''
-            while True:
-                data = sock.recv(8192)
-                if not data:
-                    break
-                else:
-                    response += data.decode('UTF-8')
+        arguments = tuple((arg, val) for arg, (val, dt) in action_arguments.items())
+        soap_action = SoapAction.get(service_type, action_name)
+        request = soap_action.request(control_url, host_name, arguments)
 
-                    if soap_envelope_end.search(response.lower()) is not None:
-                        break
-            sock.close()
+        body = bytearray()
 
-            (header, body) = response.split('\r\n\r\n', 1)
-            if not header.upper().startswith('HTTP/1.') and ' 200 ' in header.split('\r\n')[0]:
-                print('SOAP request failed with error code:', header.split('\r\n')[0].split(' ', 1)[1])
+        def attempt(timeout):
+            del body[:]
+            return UpnpSoap.post(host_name, request, body.extend, timeout)
+
+        try:
+            status_code = CallPolicy.call(host_name, attempt, soap_action.idempotent)
+            if status_code != 200:
+                print('SOAP request failed with error code:', status_code)
                 #print(UpnpSoap.extractSingleTag(body, 'errorDescription'))
                 return False
             else:
-                return body
+                return body.decode('UTF-8')
         except Exception as e:
             print('UpnpSoap.send: Caught socket exception:', e)
-            sock.close()
             return False
         except KeyboardInterrupt:
-            sock.close()
             return False
 
+    @staticmethod
+    def configure_get(timeout=None, retries=None, maxsize=None, num_pools=None):
+        with UpnpSoap.__lock:
+            if timeout is not None:
+                UpnpSoap.get_timeout = timeout
+            if retries is not None:
+                UpnpSoap.get_retries = retries
+            if maxsize is not None:
+                UpnpSoap.get_maxsize = maxsize
+            if num_pools is not None:
+                UpnpSoap.get_num_pools = num_pools
+            http = UpnpSoap.__http
+            UpnpSoap.__http = None
+        if http is not None:
+            http.clear()
+
+    @staticmethod
+    def get_pool_manager():
+        http = UpnpSoap.__http
+        if http is None:
+            with UpnpSoap.__lock:
+                if UpnpSoap.__http is None:
+                    UpnpSoap.__http = urllib3.PoolManager(num_pools=UpnpSoap.get_num_pools,
+                                                          maxsize=UpnpSoap.get_maxsize,
+                                                          timeout=UpnpSoap.get_timeout,
+                                                          retries=UpnpSoap.get_retries)
+                http = UpnpSoap.__http
+        return http
+
     # Send GET request for a UPNP XML file
     @staticmethod
-    def get(url):
-        headers = {
+    def get_response(url, headers=None):
+        """the whole urllib3 response (status, headers, data) or None when the device could not be reached"""
+        request_headers = {
             'CONTENT-TYPE': 'text/xml; charset="utf-8"',
             'USER-AGENT': 'uPNP/1.0'
         }
+        if headers is not None:
+            request_headers.update(headers)
+        return UpnpSoap.request("GET", url, request_headers)
+
+    @staticmethod
+    def attempt_timeout(timeout):
+        """get_timeout for one attempt, the connect part is cut to the seconds the attempt has left"""
+        connect = UpnpSoap.get_timeout.connect_timeout
+        if not isinstance(connect, (int, float)):
+            connect = timeout
+        return urllib3.Timeout(connect=min(connect, timeout), read=timeout)
+
+    @staticmethod
+    def request(method, url, headers=None, idempotent=True):
+        """any method (GET, SUBSCRIBE, UNSUBSCRIBE...) over the shared PoolManager, None when the device could not be reached"""
+        request_headers = {'USER-AGENT': 'uPNP/1.0'}
+        if headers is not None:
+            request_headers.update(headers)
+
+        def attempt(timeout):
+            return UpnpSoap.get_pool_manager().request(method, url, headers=request_headers,
+                                                       timeout=UpnpSoap.attempt_timeout(timeout))
+
         try:
-            http = urllib3.PoolManager()
-            r = http.request("GET", url, headers=headers)
-            return r.status, r.data
+            return CallPolicy.call(urllib3.util.parse_url(url).netloc, attempt, idempotent,
+                                   (OSError, urllib3.exceptions.HTTPError))
         except Exception as e:
             print("Request for '%s' failed: %s" % (url, e))
+            return None
+
+    @staticmethod
+    def long_poll(url, headers, wait):
+        """GET the device may hold for up to wait seconds, None when nothing came back in time
+
+        bypasses CallPolicy, an unanswered long poll is not a failing device
+        """
+        request_headers = {'USER-AGENT': 'uPNP/1.0'}
+        request_headers.update(headers)
+        timeout = urllib3.Timeout(connect=UpnpSoap.get_timeout.connect_timeout, read=wait)
+        try:
+            return UpnpSoap.get_pool_manager().request("GET", url, headers=request_headers,
+                                                       timeout=timeout, retries=False)
+        except urllib3.exceptions.ReadTimeoutError:
+            return None
+
+    @staticmethod
+    def get(url):
+        r = UpnpSoap.get_response(url)
+        if r is None:
             return False, False
+        return r.status, r.data
@@ -1,25 +1,45 @@
 from __future__ import unicode_literals
 
 class XmlHelper:
+    @staticmethod
+    def iter_elements(xml):
+        """all elements below xml in document order, walked once without building per tag lists"""
+        stack = list(reversed(xml.childNodes))
+        while stack:
+            node = stack.pop()
+            if node.nodeType == node.ELEMENT_NODE:
+                yield node
+                stack.extend(reversed(node.childNodes))
+
     @staticmethod
     def xml_extract_dict(xml, extract_keys):
         result_dict = {}
-        for k in extract_keys:
-            try:
-                element = xml.getElementsByTagName(k)
-                result_dict[k] = element[0].firstChild.nodeValue
-            except Exception as e:
-                pass
+        if xml is None:
+            return result_dict
+        wanted = set(extract_keys)
+        for element in XmlHelper.iter_elements(xml):
+            if element.tagName in wanted:
+                wanted.discard(element.tagName)
+                try:
+                    result_dict[element.tagName] = element.firstChild.nodeValue
+                except Exception as e:
+                    pass
+                if len(wanted) == 0:
+                    break
         return result_dict
 
+    @staticmethod
     def xml_extract_dict_by_val(xml, extract_keys):
         result_dict = {}
-        for k in extract_keys:
-            try:
-                element = xml.getElementsByTagName(k)
-                result_dict[k] = element[0].getAttribute("val")
-            except Exception as e:
-                pass
+        if xml is None:
+            return result_dict
+        wanted = set(extract_keys)
+        for element in XmlHelper.iter_elements(xml):
+            if element.tagName in wanted:
+                wanted.discard(element.tagName)
+                result_dict[element.tagName] = element.getAttribute("val")
+                if len(wanted) == 0:
+                    break
         return result_dict
 
 
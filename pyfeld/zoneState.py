@@ -0,0 +1,207 @@
+from __future__ import unicode_literals
+
+import threading
+import time
+
+from pyfeld.genaListener import GenaListener
+from pyfeld.soapResponse import timecode_to_seconds
+
+
+class ZoneState:
+    """playback state of one zone as told by its events, the position runs on locally while the zone plays"""
+
+    playing = 'PLAYING'
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.volume = -1
+        self.track = -1
+        self.duration = -1
+        self.transport_state = None
+        self.metadata = None
+        self.position_base = -1
+        self.position_time = time.monotonic()
+        # set when an event moved the position somewhere we can not know without asking
+        self.resync = False
+        self.__didl = (None, dict())
+
+    def is_playing(self):
+        return self.transport_state == ZoneState.playing
+
+    def position(self, now=None):
+        if self.position_base < 0:
+            return -1
+        if not self.is_playing():
+            return self.position_base
+        if now is None:
+            now = time.monotonic()
+        position = self.position_base + int(now - self.position_time)
+        if self.duration > 0:
+            position = min(position, self.duration)
+        return position
+
+    def set_position_info(self, info, now=None):
+        with self.condition:
+            self.position_base = info.position
+            self.position_time = time.monotonic() if now is None else now
+            if 'Track' in info:
+                self.track = info.track
+            if 'TrackDuration' in info:
+                self.duration = info.duration
+            if 'TrackMetaData' in info:
+                self.metadata = info['TrackMetaData']
+            self.resync = False
+            self.condition.notify_all()
+
+    def set_volume(self, volume):
+        with self.condition:
+            self.volume = volume
+            self.condition.notify_all()
+
+    def apply_transport_event(self, variables):
+        with self.condition:
+            now = time.monotonic()
+            state = variables.get('TransportState')
+            if state is not None and state != self.transport_state:
+                # freeze or restart the local clock where the position is right now
+                self.position_base = self.position(now)
+                self.position_time = now
+                # the first event only tells the state, the position was read just before
+                if self.transport_state is not None:
+                    self.resync = True
+                self.transport_state = state
+            if 'CurrentTrack' in variables:
+                try:
+                    track = int(variables['CurrentTrack'])
+                except ValueError:
+                    track = -1
+                if track != self.track:
+                    self.track = track
+                    self.resync = True
+            if 'CurrentTrackDuration' in variables:
+                self.duration = timecode_to_seconds(variables['CurrentTrackDuration'])
+            if 'CurrentTrackMetaData' in variables:
+                self.metadata = variables['CurrentTrackMetaData']
+            self.condition.notify_all()
+
+    def apply_rendering_event(self, variables):
+        if 'Volume' not in variables:
+            return
+        try:
+            self.set_volume(int(variables['Volume']))
+        except ValueError:
+            pass
+
+    def __didl_items(self):
+        # the DIDL of a track is parsed once, not on every evaluation
+        if self.__didl[0] != self.metadata:
+            from pyfeld.didlInfo import DidlInfo
+            try:
+                items = DidlInfo(self.metadata).get_items()
+            except Exception:
+                items = dict()
+            self.__didl = (self.metadata, items)
+        return self.__didl[1]
+
+    def values(self, names=None):
+        """the condition variables, title and artist only when names asks for them"""
+        values = {'volume': self.volume,
+                  'position': self.position(),
+                  'duration': self.duration,
+                  'track': self.track,
+                  'title': '',
+                  'artist': ''}
+        if names is None or 'title' in names or 'artist' in names:
+            items = self.__didl_items()
+            values['title'] = items.get('title') or ''
+            values['artist'] = items.get('artist') or ''
+        return values
+
+
+class ZoneWatcher:
+    """keeps the ZoneState of the zone behind an UpnpCommand current through GENA events
+
+    the device is asked only at start and when an event moved the position (seek, next track),
+    zones that do not event are polled every poll_interval seconds like before
+    """
+
+    transport_event_path = "/TransportService/Event"
+    rendering_event_path = "/RenderingService/Event"
+    # local re-evaluation of position conditions while playing, no network involved
+    position_tick = 0.02
+    poll_interval = 1.0
+
+    def __init__(self, uc, listener=None):
+        self.uc = uc
+        self.state = ZoneState()
+        self.own_listener = listener is None
+        self.listener = listener if listener is not None else GenaListener()
+        self.subscriptions = []
+        self.evented = False
+        # subscribing is tried once, a zone that does not event is polled from then on
+        self.subscribed = False
+
+    def start(self):
+        """reads the current state, events are subscribed by the first wait that does not return right away"""
+        self.read_volume()
+        self.read_position()
+
+    def subscribe(self):
+        """True when events arrive, False when the zone has to be polled"""
+        for (path, callback) in ((ZoneWatcher.transport_event_path, self.state.apply_transport_event),
+                                 (ZoneWatcher.rendering_event_path, self.state.apply_rendering_event)):
+            subscription = self.listener.subscribe(self.uc.base_url + path, callback)
+            if subscription is None:
+                self.stop()
+                return False
+            self.subscriptions.append(subscription)
+        self.evented = True
+        return True
+
+    def stop(self):
+        for subscription in self.subscriptions:
+            self.listener.unsubscribe(subscription)
+        self.subscriptions = []
+        self.evented = False
+        if self.own_listener:
+            self.listener.stop()
+
+    def read_volume(self):
+        self.state.set_volume(self.uc.get_volume_info().volume)
+
+    def read_position(self):
+        self.state.set_position_info(self.uc.get_position_info())
+
+    def wait(self, condition, timeout=None):
+        """blocks until the Condition holds, False when timeout seconds passed first"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        next_poll = time.monotonic() + ZoneWatcher.poll_interval
+        with self.state.condition:
+            if condition.evaluate(self.state.values(condition.names)):
+                return True
+        if not self.evented and not self.subscribed:
+            self.subscribed = True
+            self.subscribe()
+        while True:
+            if not self.evented and time.monotonic() >= next_poll:
+                self.read_volume()
+                self.read_position()
+                next_poll = time.monotonic() + ZoneWatcher.poll_interval
+            elif self.state.resync:
+                self.read_position()
+            with self.state.condition:
+                if condition.evaluate(self.state.values(condition.names)):
+                    return True
+                if self.state.resync:
+                    continue
+                wait_time = None
+                if not self.evented:
+                    wait_time = max(0.0, next_poll - time.monotonic())
+                elif self.state.is_playing() and condition.uses('position'):
+                    wait_time = ZoneWatcher.position_tick
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    wait_time = remaining if wait_time is None else min(wait_time, remaining)
+                self.state.condition.wait(wait_time)
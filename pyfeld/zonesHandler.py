@@ -2,24 +2,34 @@ from __future__ import unicode_literals
 
 import json
 import re
-import subprocess
 import sys
-import syslog
 from pprint import pprint
-from xml.dom import minidom
 import hashlib
-
+import time
+import contextvars
+import threading
+import urllib3
+from concurrent.futures import ThreadPoolExecutor
+
+from pyfeld.asyncUpnpCommand import AsyncUpnpCommand
+from pyfeld.callPolicy import Deadline
+from pyfeld.descriptionCache import DescriptionCache
 from pyfeld.errorPrint import err_print
 from pyfeld.getRaumfeld import RaumfeldDeviceSettings, HostDevice
+from pyfeld.localNetwork import LocalNetwork
 from pyfeld.raumfeldZone import RaumfeldZone
+from pyfeld.portScanner import PortScanner
+from pyfeld.quickIndex import QuickIndex
 from pyfeld.room import Room
+from pyfeld.ssdp import SsdpSearch, SsdpListener
 from pyfeld.upnpCommand import UpnpCommand
-from pyfeld.upnpService import UpnpService
+from pyfeld.upnpService import UpnpService, Services
 from pyfeld.upnpsoap import UpnpSoap
 
 from pyfeld.xmlHelper import XmlHelper
 
 from pyfeld.settings import Settings
+from pyfeld.topology import Topology
 
 
 class MediaDevice:
@@ -30,7 +40,101 @@ class MediaDevice:
         self.name = name
 
 
+class HostProbe:
+    """probes candidate addresses on a bounded pool, the first one answering getZones wins
+
+    stop is set as soon as there is a winner, sources given it (ssdp search, port scan) end their traffic then
+    """
+
+    def __init__(self, workers, stop=None):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.stop = stop if stop is not None else threading.Event()
+        self.condition = threading.Condition()
+        self.futures = []
+        self.outstanding = 0
+        self.feeding = 0
+        self.checked = set()
+        self.winner = None
+
+    def __probe(self, ip):
+        data = None
+        try:
+            if self.winner is None:
+                # probes still running after a winner is found only hold up interpreter exit this long
+                with Deadline(ZonesHandler.probe_timeout):
+                    data = ZonesHandler.probe_zone_host(ip)
+        finally:
+            with self.condition:
+                self.outstanding -= 1
+                if data is not None and self.winner is None:
+                    self.winner = (ip, data)
+                    self.stop.set()
+                self.condition.notify_all()
+
+    def __feed(self, candidates):
+        try:
+            for ip in candidates:
+                with self.condition:
+                    if self.stop.is_set():
+                        break
+                    if ip is None or ip in self.checked:
+                        continue
+                    self.checked.add(ip)
+                    self.outstanding += 1
+                    try:
+                        context = contextvars.copy_context()
+                        self.futures.append(self.executor.submit(context.run, self.__probe, ip))
+                    except RuntimeError:
+                        # pool already shut down, a winner was found meanwhile
+                        self.outstanding -= 1
+                        break
+        except Exception as e:
+            err_print("probing candidates failed:{0}".format(e))
+        finally:
+            # ends a source waiting for its next answer right here, closing its sockets
+            if hasattr(candidates, 'close'):
+                candidates.close()
+            with self.condition:
+                self.feeding -= 1
+                self.condition.notify_all()
+
+    def run(self, *sources):
+        """each source may be a slow generator (ssdp answers, scan results), all are consumed side by side on
+        their own threads and an address is probed only once whichever source names it first"""
+        self.feeding = len(sources)
+        for candidates in sources:
+            feeder = threading.Thread(target=self.__feed, args=(candidates,), name="pyfeld-probe-feed")
+            feeder.daemon = True
+            feeder.start()
+        with self.condition:
+            self.condition.wait_for(lambda: self.winner is not None or
+                                    (self.feeding == 0 and self.outstanding == 0))
+            futures = list(self.futures)
+        self.stop.set()
+        for future in futures:
+            future.cancel()
+        self.executor.shutdown(wait=False)
+        return self.winner
+
+
 class ZonesHandler:
+    probe_workers = 16
+    probe_timeout = 2.0
+    # head start of the cached addresses before the subnet scan joins the race
+    scan_delay = 0.25
+    # watch_topology: shortest time between two getZones polls, wait after a failed one
+    min_poll_interval = 1.0
+    retry_interval = 1.0
+    # description fetches of devices announcing themselves, off the ssdp listener thread
+    presence_workers = 4
+    # (device type, friendly name, class attribute collecting them, verbose label)
+    known_devices = (("urn:schemas-upnp-org:device:MediaServer:1", 'Raumfeld MediaServer',
+                      "media_servers", "Media server: "),
+                     ("urn:schemas-raumfeld-com:device:ConfigDevice:1", 'Raumfeld ConfigDevice',
+                      "config_device", "Raumfeld ConfigDevice: "),
+                     ("urn:schemas-raumfeld-com:device:RaumfeldDevice:1", 'Raumfeld Device',
+                      "raumfeld_device", "Raumfeld Device: "))
+
     active_zones = []
     new_zones = []
     media_servers = set()
@@ -42,6 +146,14 @@ class ZonesHandler:
         self.verbose = False
         self.zone_hash = ""
         self.found_protocol_ip = None
+        self.update_id = None
+        self.presence_listener = None
+        self.presence_on_change = None
+        self.presence_executor = None
+        self.presence_lock = threading.Lock()
+        # udn -> ssdp:alive whose description is being fetched
+        self.presence_pending = dict()
+        self.departed_devices = dict()
 
     def set_active_zones(self, zones, zone_hash):
         self.active_zones = zones
@@ -69,17 +181,49 @@ class ZonesHandler:
         else:
             err_print("error request zone")
 
+    def get_request_zones(self, param_dictionary):
+        """indexes of all zones a request addresses: allzones or any number of hasroom, room and zoneindex values"""
+        if 'allzones' in param_dictionary:
+            return [index for (index, zone) in enumerate(self.active_zones) if zone.upnpcmd is not None]
+        indexes = []
+        for key in ('hasroom', 'room'):
+            for room_name in param_dictionary.get(key, []):
+                indexes.append(self.find_zone_for_room(room_name))
+        for index in param_dictionary.get('zoneindex', []):
+            indexes.append(int(index))
+        if len(indexes) == 0:
+            err_print("error request zone")
+        return list(dict.fromkeys(indexes))
+
+    def get_request_rooms(self, param_dictionary):
+        """(zone, room) of the named rooms, all rooms of the addressed zones when no room is named"""
+        names = param_dictionary.get('room', []) + param_dictionary.get('hasroom', [])
+        result = []
+        for index in self.get_request_zones(param_dictionary):
+            zone = self.active_zones[index]
+            for room in zone.rooms:
+                if len(names) == 0 or room.get_name() in names:
+                    result.append((zone, room))
+        return result
+
     def set(self, cmd, param_dictionary):
+        """sets a value on every addressed zone (volume) or room (roomvolume) at once"""
         result = dict()
         try:
-            index = self.get_request_zone(param_dictionary)
-            print("set " + cmd)
-            print("zone index:" + str(index))
+            value = param_dictionary['value'][0]
             result['set'] = cmd
-            result['zoneindex'] = str(index)
-
-            if cmd == "volume":
-                self.active_zones[index].set_volume(param_dictionary['value'][0])
+            print("set " + cmd)
+            if cmd == "roomvolume":
+                calls = [(room.get_name(), zone.upnpcmd.set_room_volume, (room.get_udn(), value))
+                         for (zone, room) in self.get_request_rooms(param_dictionary)]
+            else:
+                indexes = self.get_request_zones(param_dictionary)
+                print("zone index:" + ",".join(str(index) for index in indexes))
+                result['zoneindex'] = ",".join(str(index) for index in indexes)
+                calls = []
+                if cmd == "volume":
+                    calls = [(index, self.active_zones[index].set_volume, (value,)) for index in indexes]
+            result.update(UpnpCommand.fan_out(calls).to_dict())
         except Exception as e:
             result['error'] = "set error {0}".format(e)
             err_print("set  error {0}".format(e))
@@ -118,180 +262,297 @@ class ZonesHandler:
             err_print("get error cmd={0} {1}".format(cmd, e))
         return result
 
+    def get_all(self, cmd):
+        return AsyncUpnpCommand.run(self.get_all_async(cmd))
+
+    async def get_all_async(self, cmd):
+        indexes = []
+        coroutines = []
+        for index in range(0, len(self.active_zones)):
+            uc = self.active_zones[index].async_upnpcmd
+            if uc is None:
+                continue
+            if cmd == "volume":
+                coroutines.append(uc.get_volume())
+            elif cmd == "position":
+                coroutines.append(uc.get_position_info())
+            elif cmd == "media":
+                coroutines.append(uc.get_media_info())
+            else:
+                err_print("get_all: unknown cmd {0}".format(cmd))
+                return []
+            indexes.append(index)
+        results = []
+        for index, value in zip(indexes, await AsyncUpnpCommand.gather(*coroutines)):
+            result = dict()
+            result['get'] = cmd
+            result['zoneindex'] = str(index)
+            if isinstance(value, Exception):
+                result['error'] = "get error cmd={0} {1}".format(cmd, value)
+            elif cmd == "volume":
+                result['volume'] = str(value)
+            else:
+                result.update(value)
+            results.append(result)
+        return results
+
+    @staticmethod
+    def __do_zone(zone, cmd, param_dictionary):
+        if cmd == "pause":
+            return zone.pause()
+        elif cmd == "stop":
+            return zone.stop()
+        elif cmd == "play":
+            return zone.play()
+        elif cmd in ["prev", "previous"]:
+            return zone.previous()
+        elif cmd == "next":
+            return zone.next()
+        elif cmd == "seek":
+            return zone.seek(param_dictionary['value'][0])
+        elif cmd == "seekback":
+            return zone.seek_backward(10)
+        elif cmd == "seekfwd":
+            return zone.seek_forward(10)
+        elif cmd == "fade":
+            zone.set_fade(param_dictionary['vs'][0]
+                          , param_dictionary['ve'][0]
+                          , param_dictionary['t'][0]
+                          , param_dictionary.get('curve', ['linear'])[0]
+                          , 'rooms' in param_dictionary
+                          )
+            return True
+        elif cmd == "loop":
+            zone.set_loop(param_dictionary['cuein'][0]
+                          , param_dictionary['cueout'][0]
+                          )
+            return True
+        elif cmd == 'stoploop':
+            zone.terminate_loop = True
+            return True
+        raise ValueError("unknown action " + cmd)
+
     def do(self, cmd, param_dictionary):
+        """runs a transport action on every addressed zone at once, per zone results and the overall latency"""
         result = dict()
         try:
-            index = self.get_request_zone(param_dictionary)
+            indexes = self.get_request_zones(param_dictionary)
             print("do " + cmd)
-            print("zone index:" + str(index))
+            print("zone index:" + ",".join(str(index) for index in indexes))
             result['do'] = cmd
-            result['zoneindex'] = str(index)
-
-            if cmd == "pause":
-                self.active_zones[index].pause()
-            elif cmd == "stop":
-                self.active_zones[index].stop()
-            elif cmd == "play":
-                self.active_zones[index].play()
-            elif cmd in ["prev", "previous"]:
-                self.active_zones[index].previous()
-            elif cmd == "next":
-                self.active_zones[index].next()
-            elif cmd == "seek":
-                self.active_zones[index].seek(param_dictionary['value'][0])
-            elif cmd == "seekback":
-                self.active_zones[index].seek_backward(10)
-            elif cmd == "seekfwd":
-                self.active_zones[index].seek_forward(10)
-            elif cmd == "fade":
-                self.active_zones[index].set_fade(param_dictionary['vs'][0]
-                                                  , param_dictionary['ve'][0]
-                                                  , param_dictionary['t'][0]
-                                                  )
-            elif cmd == "loop":
-                self.active_zones[index].set_loop(param_dictionary['cuein'][0]
-                                                  , param_dictionary['cueout'][0]
-                                                  )
-            elif cmd == 'stoploop':
-                self.active_zones[index].terminate_loop = True
-
+            result['zoneindex'] = ",".join(str(index) for index in indexes)
+            calls = [(index, ZonesHandler.__do_zone, (self.active_zones[index], cmd, param_dictionary))
+                     for index in indexes]
+            result.update(UpnpCommand.fan_out(calls).to_dict())
         except Exception as e:
             err_print("set action error {0}".format(e))
         return result
 
-    def get_network_location_by_udn(self, udn, xmlListDevices):
+    def get_network_location_by_udn(self, udn, topology):
         if udn is None:
             return None
-        devices = xmlListDevices.getElementsByTagName("device")
-        try:
-            for device in devices:
-                if device.getAttribute('udn') == udn:
-                    location = device.getAttribute('location')
-                    return location
-                #                    host_path = re.match("http://(.*)/", location)
-                #                    return host_path.group(1)
-        except Exception as e:
-            err_print("Error in regex find:{0}".format(e))
-        err_print("WARNING: could not find location by udn in listDevices {0}".format(udn))
-        return None
-
-    def parse_other_devices_in_zone_raumfeld(self, xmlListDevices, zone_udn, zone):
-        zone_obj = RaumfeldZone(zone_udn)
-        rooms = zone.getElementsByTagName('room')
-        for room in rooms:
-            room_udn = room.getAttribute('udn')
-            # print(room_udn)
-            element = room.getElementsByTagName('renderer')
-            room_renderer_udn = element[0].getAttribute('udn')
-            location  = self.get_network_location_by_udn(room_renderer_udn, xmlListDevices)
-            room_obj = Room(room_udn, room_renderer_udn, room.attributes['name'].value, location)
-            room_obj.set_upnp_service(location)
+        location = topology.location(udn)
+        if location is None:
+            err_print("WARNING: could not find location by udn in listDevices {0}".format(udn))
+        return location
+
+    def parse_rooms_in_zone_raumfeld(self, topology, zone):
+        zone_obj = RaumfeldZone(zone.udn)
+        for room in zone.rooms:
+            location = self.get_network_location_by_udn(room.renderer_udn, topology)
+            room_obj = Room(room.udn, room.renderer_udn, room.name, location)
+            room_obj.set_upnp_service(location, topology.descriptions)
             zone_obj.add_room(room_obj)
-        zone_obj.set_soap_host(self.get_network_location_by_udn(zone_udn, xmlListDevices))
+        zone_obj.set_soap_host(self.get_network_location_by_udn(zone.udn, topology))
         return zone_obj
 
-    def parse_rooms_in_zone_raumfeld(self, xmlListDevices, zone_udn, zone):
-        zone_obj = RaumfeldZone(zone_udn)
-        rooms = zone.getElementsByTagName('room')
-        for room in rooms:
-            room_udn = room.getAttribute('udn')
-            # print(room_udn)
-            element = room.getElementsByTagName('renderer')
-            room_renderer_udn = element[0].getAttribute('udn')
-            location  = self.get_network_location_by_udn(room_renderer_udn, xmlListDevices)
-            room_obj = Room(room_udn, room_renderer_udn, room.attributes["name"].value, location)
-            room_obj.set_upnp_service(location)
-            zone_obj.add_room(room_obj)
-        zone_obj.set_soap_host(self.get_network_location_by_udn(zone_udn, xmlListDevices))
-        return zone_obj
-
-    def parse_devices_in_zone_raumfeld(self, xmlListDevices):
-        ZonesHandler.media_servers = set()
-        ZonesHandler.config_device = set()
-        ZonesHandler.raumfeld_device = set()
-        devices = xmlListDevices.getElementsByTagName("device")
-        for device in devices:
-            if device.getAttribute('type') == "urn:schemas-upnp-org:device:MediaServer:1":
-                if device.childNodes[0].nodeValue == 'Raumfeld MediaServer':
-                    location = device.getAttribute('location')
-                    udn = device.getAttribute('udn')
-                    type = device.getAttribute('type')
-                    host_path = re.match("(http://.*)/", location)
-                    if self.verbose:
-                        print("Media server: ", host_path.group(1))
-                    found_device = MediaDevice(udn, host_path.group(1), type)
-                    found_device.upnp_service = self.get_zone_services(xmlListDevices, udn)
-                    ZonesHandler.media_servers.add(found_device)
-
-            if device.getAttribute('type') == "urn:schemas-raumfeld-com:device:ConfigDevice:1":
-                if device.childNodes[0].nodeValue == 'Raumfeld ConfigDevice':
-                    location = device.getAttribute('location')
-                    udn = device.getAttribute('udn')
-                    type = device.getAttribute('type')
-                    host_path = re.match("(http://.*)/", location)
-                    if self.verbose:
-                        print("Raumfeld ConfigDevice: ", host_path.group(1))
-                    found_device = MediaDevice(udn, host_path.group(1), type)
-                    found_device.upnp_service = self.get_zone_services(xmlListDevices, udn)
-                    ZonesHandler.config_device.add(found_device)
-
-            if device.getAttribute('type') == "urn:schemas-raumfeld-com:device:RaumfeldDevice:1":
-                if device.childNodes[0].nodeValue == 'Raumfeld Device':
-                    location = device.getAttribute('location')
-                    udn = device.getAttribute('udn')
-                    type = device.getAttribute('type')
-                    host_path = re.match("(http://.*)/", location)
-                    if self.verbose:
-                        print("Raumfeld Device: ", host_path.group(1))
-                    found_device = MediaDevice(udn, host_path.group(1), type)
-                    found_device.upnp_service = self.get_zone_services(xmlListDevices, udn)
-                    ZonesHandler.raumfeld_device.add(found_device)
-
-    def get_zone_services(self, xmlListDevices, udn):
-        devices = xmlListDevices.getElementsByTagName("device")
+    def fetch_descriptions(self, topology, zones=None):
+        """device descriptions of the rooms and zones to build and of known devices in one concurrent batch"""
+        locations = list(topology.room_locations(zones))
+        for (device_type, name, attribute, label) in ZonesHandler.known_devices:
+            locations.extend(device.location for device in topology.devices_of_type(device_type, name))
+        topology.descriptions = Services.get_services_from_locations(locations)
+
+    def parse_devices_in_zone_raumfeld(self, topology):
+        for (device_type, name, attribute, label) in ZonesHandler.known_devices:
+            found_set = set()
+            for device in topology.devices_of_type(device_type, name):
+                host_path = re.match("(http://.*)/", device.location)
+                if self.verbose:
+                    print(label, host_path.group(1))
+                found_device = MediaDevice(device.udn, host_path.group(1), device.type)
+                found_device.upnp_service = self.get_zone_services(topology, device.udn)
+                found_set.add(found_device)
+            # sets are replaced, never changed in place, the presence listener swaps them from its own thread
+            setattr(ZonesHandler, attribute, found_set)
+
+    def start_presence_listener(self, on_change=None):
+        """keeps media_servers, config_device and raumfeld_device current from ssdp alive/byebye announcements
+
+        on_change(nts, device) is called after a device set changed, on the listener thread for a byebye and
+        on a presence worker once the description of an alive device is fetched
+        """
+        if self.presence_listener is not None:
+            return
+        self.presence_on_change = on_change
+        self.presence_executor = ThreadPoolExecutor(max_workers=ZonesHandler.presence_workers,
+                                                    thread_name_prefix="pyfeld-presence")
+        self.presence_listener = SsdpListener(self.__on_notify, LocalNetwork.addresses())
+        self.presence_listener.start()
+
+    def stop_presence_listener(self):
+        if self.presence_listener is not None:
+            self.presence_listener.stop()
+            self.presence_listener = None
+        if self.presence_executor is not None:
+            self.presence_executor.shutdown(wait=False)
+            self.presence_executor = None
+
+    def __on_notify(self, response):
+        for (device_type, name, attribute, label) in ZonesHandler.known_devices:
+            if response.st != device_type:
+                continue
+            with self.presence_lock:
+                devices = getattr(ZonesHandler, attribute)
+                current = None
+                for device in devices:
+                    if device.udn == response.udn:
+                        current = device
+                if response.nts == SsdpListener.byebye:
+                    # a description still being fetched is dropped when it arrives
+                    self.presence_pending.pop(response.udn, None)
+                    if current is None:
+                        return
+                    self.departed_devices[response.udn] = current
+                    setattr(ZonesHandler, attribute, set(device for device in devices if device is not current))
+                else:
+                    DescriptionCache.note_ssdp(response.location, response.config_id, response.boot_id)
+                    host_path = re.match("(http://.*)/", response.location)
+                    if host_path is None:
+                        return
+                    if current is not None and current.location == host_path.group(1):
+                        # periodic re-announcement
+                        return
+                    pending = self.presence_pending.get(response.udn)
+                    if pending is not None and pending.location == response.location:
+                        return
+                    changed = current or self.departed_devices.pop(response.udn, None)
+                    if changed is None:
+                        if device_type == "urn:schemas-upnp-org:device:MediaServer:1":
+                            # any dlna server announces this type, only raumfeld ones seen in listDevices are tracked
+                            return
+                        changed = MediaDevice(response.udn, host_path.group(1), device_type)
+                    self.presence_pending[response.udn] = response
+                    # the listener keeps reading announcements while the description is fetched
+                    self.presence_executor.submit(self.__on_alive, response, attribute, label, changed,
+                                                  host_path.group(1))
+                    return
+            self.__presence_changed(response.nts, label, current)
+            return
+
+    def __on_alive(self, response, attribute, label, changed, location):
         try:
-            for device in devices:
-                if device.getAttribute('udn') == udn:
-                    location = device.getAttribute('location')
-                    upnp_service = UpnpService()
-                    upnp_service.set_location(location)
-                    return upnp_service
+            upnp_service = UpnpService()
+            upnp_service.set_location(response.location)
+            with self.presence_lock:
+                if self.presence_pending.get(response.udn) is not response:
+                    # a byebye or an announcement from another location came in meanwhile
+                    return
+                del self.presence_pending[response.udn]
+                devices = getattr(ZonesHandler, attribute)
+                changed.location = location
+                changed.upnp_service = upnp_service
+                setattr(ZonesHandler, attribute,
+                        set(device for device in devices if device.udn != response.udn) | {changed})
+            self.__presence_changed(response.nts, label, changed)
+        except Exception as e:
+            err_print("ssdp: notify handler failed: {0}".format(e))
+
+    def __presence_changed(self, nts, label, changed):
+        if self.verbose:
+            print("{0} {1}{2}".format(nts, label, changed.location))
+        if self.presence_on_change is not None:
+            self.presence_on_change(nts, changed)
 
+    def get_zone_services(self, topology, udn):
+        location = topology.location(udn)
+        if location is None:
+            return None
+        try:
+            upnp_service = UpnpService()
+            upnp_service.set_location(location, topology.descriptions)
+            return upnp_service
         except Exception as e:
-            err_print("Error in regex find:{0}".format(e))
+            err_print("Error in get_zone_services:{0}".format(e))
         return None
 
-    def check_for_zone(self, ip):
+    @staticmethod
+    def probe_zone_host(ip):
+        """(getZones body, updateID) when ip is a raumfeld host, None otherwise"""
+        protocol_ip = ip if '://' in ip else "http://" + ip
+        response = UpnpSoap.get_response(protocol_ip + ":47365/getZones")
+        if response is None or response.status != 200 or not response.data:
+            return None
+        try:
+            Topology().feed_zones(response.data)
+        except Exception:
+            return None
+        return response.data, response.headers.get('updateID')
+
+    def find_host(self, *sources, stop=None):
+        """first candidate (ip without protocol) of any source that is a raumfeld host, probed concurrently
+
+        stop is set once the host is found, sources should watch it to end their search
+        """
+        winner = HostProbe(ZonesHandler.probe_workers, stop).run(*sources)
+        if winner is None:
+            return None
+        (ip, (xml_data, update_id)) = winner
+        zones = self.check_for_zone("http://" + ip, xml_data, update_id)
+        if zones is None:
+            return None
+        self.found_protocol_ip = ip
+        HostDevice.set(ip)
+        return zones
+
+    def check_for_zone(self, ip, xml_data=None, update_id=None):
+        """zone objects of the host at ip, zones whose rooms and locations did not change are taken over from
+        active_zones so only changed zones are rebuilt"""
         try:
-            (xml_headers, xml_data) = UpnpSoap.get(ip + ":47365/getZones")
+            if xml_data is None:
+                response = UpnpSoap.get_response(ip + ":47365/getZones")
+                if response is None or response.status != 200:
+                    return None
+                (xml_data, update_id) = (response.data, response.headers.get('updateID'))
             (xml_headers_devices, xml_data_devices) = UpnpSoap.get(ip + ":47365/listDevices")
 
-            # print(xml_data)
-            if xml_data is not False:
+            if xml_data is not False and xml_data_devices is not False:
                 active_zones = []
-                xml_root = minidom.parseString(xml_data)
-                xml_root_devices = minidom.parseString(xml_data_devices)
-                self.parse_devices_in_zone_raumfeld(xml_root_devices)
-                zones = xml_root.getElementsByTagName("zone")
-
-                for zone in zones:
+                topology = Topology.parse(xml_data, xml_data_devices)
+                topology.update_id = update_id
+                previous = dict((zone.topology_key, zone) for zone in self.active_zones
+                                if getattr(zone, 'topology_key', None) is not None)
+                changed = [zone for zone in topology.all_zones() if topology.zone_key(zone) not in previous]
+                self.fetch_descriptions(topology, changed)
+                self.parse_devices_in_zone_raumfeld(topology)
+                for zone in topology.all_zones():
+                    key = topology.zone_key(zone)
+                    if key in previous:
+                        active_zones.append(previous[key])
+                        continue
                     try:
-                        udn_id = zone.attributes["udn"].value
-                        zone_obj = self.parse_rooms_in_zone_raumfeld(xml_root_devices, udn_id, zone)
-                        zone_obj.services = self.get_zone_services(xml_root_devices, udn_id)
+                        zone_obj = self.parse_rooms_in_zone_raumfeld(topology, zone)
+                        if zone.udn is None:
+                            zone_obj.services = None
+                        else:
+                            zone_obj.services = self.get_zone_services(topology, zone.udn)
+                        zone_obj.topology_key = key
                         active_zones.append(zone_obj)
                     except Exception as e:
                         err_print("Warning: error on reading zone:{0}".format(e))
-                try:
-                    elements = xml_root.getElementsByTagName("unassignedRooms")
-                    if len(elements) > 0:
-                        unassigned = elements[0]
-                        zone_obj = self.parse_rooms_in_zone_raumfeld(xml_root_devices, None, unassigned)
-                        zone_obj.services = None
-                        active_zones.append(zone_obj)
-                except Exception as e:
-                    err_print("Info: parsing unassignedRooms:{0}".format(e))
-                    pass
+                if self.verbose:
+                    print("zones rebuilt: {0} of {1}".format(len(changed), len(active_zones)))
+                self.update_id = update_id
                 return active_zones
             else:
                 return None
@@ -307,97 +568,184 @@ class ZonesHandler:
         zone_hash.sort()
         return hashlib.md5(str(zone_hash).encode()).hexdigest()
 
+    def refresh(self, wait=None):
+        """incremental update from the known host, True when zones changed, False if not, None on failure
+
+        with wait the host holds getZones until its updateID moves on (long poll), at most wait seconds
+        """
+        if self.found_protocol_ip is None:
+            return None
+        url = "http://" + self.found_protocol_ip + ":47365/getZones"
+        try:
+            if wait and self.update_id is not None:
+                response = UpnpSoap.long_poll(url, {'updateID': self.update_id}, wait)
+                if response is None:
+                    return False
+            else:
+                response = UpnpSoap.get_response(url)
+        except Exception as e:
+            err_print("refresh: " + str(e))
+            return None
+        if response is None or response.status != 200:
+            return None
+        update_id = response.headers.get('updateID')
+        if update_id is not None and update_id == self.update_id and len(self.active_zones):
+            return False
+        zones = self.check_for_zone("http://" + self.found_protocol_ip, response.data, update_id)
+        if zones is None:
+            return None
+        zone_hash = ZonesHandler.hash_zone(zones)
+        if zone_hash == self.zone_hash:
+            return False
+        self.set_active_zones(zones, zone_hash)
+        return True
+
+    def watch_topology(self, callback=None, stop_event=None, wait=60):
+        """blocks and keeps active_zones current, callback(zones) is called after every change"""
+        while stop_event is None or not stop_event.is_set():
+            started = time.monotonic()
+            changed = self.refresh(wait)
+            if changed is None:
+                # host unreachable, do not spin
+                delay = ZonesHandler.retry_interval
+            else:
+                if changed and callback is not None:
+                    callback(self.active_zones)
+                # a host answering the long poll at once without news is not asked again right away
+                delay = ZonesHandler.min_poll_interval - (time.monotonic() - started)
+            if delay > 0:
+                if stop_event is None:
+                    time.sleep(delay)
+                else:
+                    stop_event.wait(delay)
+
     def reprocess(self):
         global raumfeldHostDevice
         try:
             if self.found_protocol_ip is None:
                 self.found_protocol_ip = self.__get_host_ip_from_local()
             HostDevice.set(self.found_protocol_ip)
-            zones = self.check_for_zone("http://" + self.found_protocol_ip)
-            current_zone_hash = ZonesHandler.hash_zone(zones)
-            if current_zone_hash != self.zone_hash:
-                HostDevice.set(self.found_protocol_ip)
-                self.set_active_zones(zones, current_zone_hash)
-            return True
+            return self.refresh() is not None
         except Exception as e:
             err_print("reprocess: " + str(e))
             return False
 
+    def process_ips(self, ips, with_protocol):
+        if with_protocol:
+            ips = [re.sub("^https?://", "", ip) for ip in ips]
+        zones = self.find_host(ips)
+        if zones is None:
+            zones = []
+        zone_hash = ZonesHandler.hash_zone(self.active_zones)
+        self.set_active_zones(zones, zone_hash)
+
     def process_batch(self, lines, with_protocol):
         try:
             if with_protocol:
                 manyips = re.findall("(https?://.*):", lines.decode('UTF-8'))
             else:
                 manyips = re.findall("([0-9]+[.][0-9]+[.][0-9]+[.][0-9]+)", lines.decode('UTF-8'))
-            new_zones = []
-            ips = set(manyips)
-            for ip in ips:
-
-                protocol_ip = ip
-                if not with_protocol:
-                    protocol_ip = "http://" + ip
-                zones = self.check_for_zone(protocol_ip)
-                if zones is not None:
-                    self.found_protocol_ip = ip
-                    new_zones.extend(zones)
-            zone_hash = ZonesHandler.hash_zone(self.active_zones)
-            self.set_active_zones(new_zones, zone_hash)
-
+            self.process_ips(set(manyips), with_protocol)
         except Exception as e:
             err_print("process_batch: command failed:" + str(e))
 
-    # this does not work on some macs
-    def search_gssdp_service(self, service):
+    @staticmethod
+    def __ssdp_hosts(responses):
+        for response in responses:
+            DescriptionCache.note_ssdp(response.location, response.config_id, response.boot_id)
+            yield response.host
+
+    def search_ssdp_service(self, targets=None, timeout=None):
+        """multicast search, stops at the first device that answers getZones"""
         if self.verbose:
             print("searching")
-        command = 'gssdp-discover -n 3 | grep -A 1 ' + service
-        try:
-            process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-        except Exception as e:
-            print("search_gssdp_service: command failed:" + str(e))
-            syslog.syslog("command failed:" + str(e))
-        lines = b""
-        while True:
-            nextline = process.stdout.readline()
-            if len(nextline) == 0 and process.poll() != None:
-                break
-            lines += nextline
-        self.process_batch(lines, True)
-        exitCode = process.returncode
+        stop = threading.Event()
+        zones = self.find_host(ZonesHandler.__ssdp_hosts(SsdpSearch.search(targets, timeout,
+                                                                           LocalNetwork.addresses(), stop)),
+                               stop=stop)
+        if zones is None:
+            if self.verbose:
+                print("searching done, no host found")
+            return 1
+        self.set_active_zones(zones, ZonesHandler.hash_zone(zones))
         if self.verbose:
-            print("searching done")
-        return exitCode
+            print("searching done, host " + self.found_protocol_ip)
+        return 0
 
+    def search_gssdp_service(self, service=None):
+        return self.search_ssdp_service(service)
+
+    def search_port_range(self, ranges):
+        """connect scan for port 47365, stops at the first address that answers getZones"""
+        if self.verbose:
+            print("scanning " + str(ranges))
+        stop = threading.Event()
+        zones = self.find_host(PortScanner.scan(ranges, stop=stop), stop=stop)
+        if zones is None:
+            if self.verbose:
+                err_print("scanning done, no host found")
+            return 1
+        self.set_active_zones(zones, ZonesHandler.hash_zone(zones))
+        if self.verbose:
+            print("scanning done, host " + self.found_protocol_ip)
+        return 0
 
     def nmap_fallback(self):
-        """task for a long rainy day, could run through guessed ip ranges (192.168.0/25 172.31.0/26 10.0.0/24 10.1.1/24 10.90.90/24"""
-        return ""
+        """run through guessed ip ranges (192.168.0/24 172.31.0/26 10.0.0/24 10.1.1/24 10.90.90/24 ...)"""
+        return self.search_port_range(PortScanner.fallback_ranges)
 
-    # this works on most, we could implement our own port 47365 search (very specific to raumfeld!)
+    # kept for callers of the nmap based search, nmap is not needed anymore
     def search_nmap_range(self, iprange):
-        command = 'nmap --open -p 47365 ' + iprange
-        if self.verbose:
-            print("searching with command: " + command)
-        try:
-            process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-        except Exception as e:
-            err_print("nmap: command failed:" + str(e))
-            syslog.syslog("command failed:" + str(e))
-            # should run a fallback now
-            lines = self.nmap_fallback()
-            self.process_batch(lines, False)
-            return 0
-        lines = b""
-        while True:
-            nextline = process.stdout.readline()
-            if len(nextline) == 0 and process.poll() != None:
-                break
-            lines += nextline
-        self.process_batch(lines, False)
-        exitCode = process.returncode
+        return self.search_port_range(iprange)
+
+    def known_ips(self):
+        """last known host first, then every device address remembered in data.json"""
+        quick_access = self.__load_quick_access()
+        if quick_access is None:
+            return
+        yield quick_access.get('host')
+        locations = [device.get('location') for device in quick_access.get('devices', [])]
+        for zone in quick_access.get('zones', []):
+            locations.append(zone.get('host'))
+            locations.extend(room.get('location') for room in zone.get('rooms') or [])
+        locations.extend(server.get('location') for server in quick_access.get('mediaserver', []))
+        for location in locations:
+            if location and location != 'None':
+                host = urllib3.util.parse_url(location).host
+                if host:
+                    yield host
+
+    @staticmethod
+    def __after(seconds, make_candidates, stop):
+        # the scan is not started at all when a known address answered meanwhile
+        if stop.wait(seconds):
+            return
+        for ip in make_candidates():
+            yield ip
+
+    @staticmethod
+    def local_ranges():
+        return LocalNetwork.scan_ranges()
+
+    def discover(self, ranges=None, ssdp_timeout=None):
+        """races the last known addresses, an ssdp search and a port scan, the first getZones responder wins"""
+        stop = threading.Event()
+        if ranges is None:
+            make_scan = lambda: PortScanner.scan(ZonesHandler.local_ranges(), stop=stop)
+        else:
+            make_scan = lambda: PortScanner.scan(ranges, stop=stop)
+        zones = self.find_host(self.known_ips(),
+                               ZonesHandler.__ssdp_hosts(SsdpSearch.search(None, ssdp_timeout,
+                                                                           LocalNetwork.addresses(), stop)),
+                               ZonesHandler.__after(ZonesHandler.scan_delay, make_scan, stop),
+                               stop=stop)
+        if zones is None:
+            err_print("discover: no raumfeld host found")
+            return False
+        self.set_active_zones(zones, ZonesHandler.hash_zone(zones))
         if self.verbose:
-            err_print("searching done")
-        return exitCode
+            print("discover: host " + self.found_protocol_ip)
+        return True
 
     def play_zone(self, name):
         for zone in self.active_zones:
@@ -606,18 +954,25 @@ class ZonesHandler:
 
         values['devices'] = device_list
 
-        with open(Settings.home_directory()+"/data.json", 'w') as f:
+        data_path = Settings.home_directory()+"/data.json"
+        with open(data_path, 'w') as f:
             json.dump(values, f, ensure_ascii=True, sort_keys=True, indent=4)
+        QuickIndex.save(values, data_path)
 
-    def __get_host_ip_from_local(self):
+    def __load_quick_access(self):
         try:
             s = open(Settings.home_directory()+"/data.json", 'r').read()
-            quick_access = json.loads(s)
-            return quick_access['host']
+            return json.loads(s)
         except Exception as err:
-            err_print("get_host_ip_from_local error: {0}".format(err))
+            err_print("load_quick_access error: {0}".format(err))
         return None
 
+    def __get_host_ip_from_local(self):
+        quick_access = self.__load_quick_access()
+        if quick_access is None or 'host' not in quick_access:
+            return None
+        return quick_access['host']
+
 
 def main(argv):
     if len(sys.argv) < 2:
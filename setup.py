@@ -43,7 +43,8 @@ setup(
     entry_points={
         'console_scripts': [
             'pyfeld-browse=pyfeld.browseRF:run_main',
-            'pyfeld=pyfeld.rfcmd:run_main'
+            'pyfeld=pyfeld.rfcmd:run_main',
+            'pyfeld-daemon=pyfeld.daemon:run_main'
         ],
     }
 )
@@ -0,0 +1,112 @@
+from __future__ import unicode_literals
+
+import contextvars
+import time
+import unittest
+
+from pyfeld.callPolicy import CallPolicy, CircuitBreaker, Deadline, DeadlineExceeded, HostUnavailable, RetryPolicy
+
+
+class Flaky:
+    """fails the first failures calls with OSError, then answers"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+        self.timeouts = []
+
+    def __call__(self, timeout):
+        self.calls += 1
+        self.timeouts.append(timeout)
+        if self.calls <= self.failures:
+            raise OSError("no route to host")
+        return "answer"
+
+
+class TestCallPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.base_delay = RetryPolicy.base_delay
+        RetryPolicy.base_delay = 0.001
+        CircuitBreaker.reset()
+
+    def tearDown(self):
+        RetryPolicy.base_delay = self.base_delay
+        CircuitBreaker.reset()
+
+    def test_idempotent_calls_are_retried(self):
+        function = Flaky(2)
+        self.assertEqual(CallPolicy.call('host', function, True), "answer")
+        self.assertEqual(function.calls, 3)
+        self.assertFalse(CircuitBreaker.is_open('host'))
+
+    def test_other_calls_are_not_retried(self):
+        function = Flaky(1)
+        with self.assertRaises(OSError):
+            CallPolicy.call('host', function)
+        self.assertEqual(function.calls, 1)
+
+    def test_one_failed_call_does_not_open_the_breaker(self):
+        with self.assertRaises(OSError):
+            CallPolicy.call('host', Flaky(RetryPolicy.attempts), True)
+        self.assertFalse(CircuitBreaker.is_open('host'))
+
+    def test_breaker_opens_after_threshold_calls(self):
+        for i in range(CircuitBreaker.failure_threshold):
+            with self.assertRaises(OSError):
+                CallPolicy.call('host', Flaky(1))
+        self.assertTrue(CircuitBreaker.is_open('host'))
+        function = Flaky(0)
+        with self.assertRaises(HostUnavailable):
+            CallPolicy.call('host', function)
+        self.assertEqual(function.calls, 0)
+        self.assertEqual(CallPolicy.call('other', function), "answer")
+
+    def test_success_resets_the_count(self):
+        for i in range(CircuitBreaker.failure_threshold - 1):
+            with self.assertRaises(OSError):
+                CallPolicy.call('host', Flaky(1))
+        CallPolicy.call('host', Flaky(0))
+        with self.assertRaises(OSError):
+            CallPolicy.call('host', Flaky(1))
+        self.assertFalse(CircuitBreaker.is_open('host'))
+
+    def test_half_open_after_reset_timeout(self):
+        reset_timeout = CircuitBreaker.reset_timeout
+        CircuitBreaker.reset_timeout = 0.01
+        try:
+            for i in range(CircuitBreaker.failure_threshold):
+                with self.assertRaises(OSError):
+                    CallPolicy.call('host', Flaky(1))
+            time.sleep(0.02)
+            self.assertEqual(CallPolicy.call('host', Flaky(0)), "answer")
+            self.assertFalse(CircuitBreaker.is_open('host'))
+        finally:
+            CircuitBreaker.reset_timeout = reset_timeout
+
+
+class TestDeadline(unittest.TestCase):
+
+    def test_timeout_is_bounded_by_the_deadline(self):
+        self.assertEqual(Deadline.timeout(), Deadline.call_timeout())
+        with Deadline(0.5):
+            self.assertLessEqual(Deadline.timeout(), 0.5)
+            with Deadline(10):
+                # an inner deadline can not extend the outer one
+                self.assertLessEqual(Deadline.timeout(), 0.5)
+
+    def test_expired_deadline(self):
+        with Deadline(0):
+            with self.assertRaises(DeadlineExceeded):
+                CallPolicy.call('host', Flaky(0))
+
+    def test_call_timeout_ends_with_its_context(self):
+        def command():
+            Deadline.set_call_timeout(0.25)
+            return Deadline.timeout()
+        self.assertEqual(contextvars.copy_context().run(command), 0.25)
+        self.assertEqual(Deadline.timeout(), Deadline.default_timeout)
+
+
+if __name__ == '__main__':
+    unittest.main()
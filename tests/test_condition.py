@@ -0,0 +1,47 @@
+from __future__ import unicode_literals
+
+import unittest
+
+from pyfeld.condition import Condition, ConditionError
+
+
+VALUES = {'volume': 4, 'position': 120, 'duration': 200, 'title': 'Blue', 'artist': 'Miles', 'track': 2}
+
+
+class TestCondition(unittest.TestCase):
+
+    def test_evaluate(self):
+        self.assertTrue(Condition("volume < 5 or position >= 130").evaluate(VALUES))
+        self.assertFalse(Condition("volume > 5 and position >= 120").evaluate(VALUES))
+        self.assertTrue(Condition("duration - position == 80").evaluate(VALUES))
+        self.assertTrue(Condition("title == 'Blue' and track in (1, 2)").evaluate(VALUES))
+        self.assertTrue(Condition("not artist != 'Miles'").evaluate(VALUES))
+
+    def test_names(self):
+        condition = Condition("volume < 5 or position == 120")
+        self.assertEqual(condition.names, {'volume', 'position'})
+        self.assertTrue(condition.uses('position'))
+        self.assertFalse(condition.uses('title', 'artist'))
+
+    def test_mismatched_types_are_false(self):
+        self.assertFalse(Condition("title > 3").evaluate(VALUES))
+        self.assertFalse(Condition("volume / 0 > 1").evaluate(VALUES))
+
+    def test_rejected(self):
+        for text in ("__import__('os').system('true')",
+                     "volume.real > 1",
+                     "title[0] == 'B'",
+                     "speed > 1",
+                     "[x for x in title]",
+                     "lambda: 1",
+                     "volume == None",
+                     "volume <"):
+            with self.assertRaises(ConditionError, msg=text):
+                Condition(text)
+
+    def test_condition_error_is_a_value_error(self):
+        self.assertTrue(issubclass(ConditionError, ValueError))
+
+
+if __name__ == '__main__':
+    unittest.main()
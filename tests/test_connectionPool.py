@@ -0,0 +1,66 @@
+from __future__ import unicode_literals
+
+import unittest
+from unittest import mock
+
+from pyfeld.connectionPool import ConnectionPool, HostSession
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = (ConnectionPool.pool_size, ConnectionPool.max_hosts, ConnectionPool.idle_timeout)
+        ConnectionPool.close_all()
+        self.close = mock.patch.object(HostSession, 'close', autospec=True)
+        self.closed = self.close.start()
+
+    def tearDown(self):
+        self.close.stop()
+        (pool_size, max_hosts, idle_timeout) = self.settings
+        ConnectionPool.configure(pool_size, max_hosts, idle_timeout)
+
+    def closed_hosts(self):
+        return [call[0][0].host_name for call in self.closed.call_args_list]
+
+    def test_one_session_per_host(self):
+        with ConnectionPool.session('a:80') as first, ConnectionPool.session('a:80') as second:
+            self.assertIs(first, second)
+        with ConnectionPool.session('b:80') as third:
+            self.assertIsNot(first, third)
+        self.assertEqual(sorted(ConnectionPool.get_hosts()), ['a:80', 'b:80'])
+        self.assertEqual(self.closed_hosts(), [])
+
+    def test_configure_waits_for_the_last_user(self):
+        with ConnectionPool.session('a:80') as session:
+            ConnectionPool.configure(pool_size=2)
+            self.assertEqual(self.closed_hosts(), [])
+            with ConnectionPool.session('a:80') as fresh:
+                self.assertIsNot(session, fresh)
+        self.assertEqual(self.closed_hosts(), ['a:80'])
+
+    def test_sessions_in_use_are_evicted_last(self):
+        ConnectionPool.configure(max_hosts=2)
+        with ConnectionPool.session('busy:80'):
+            with ConnectionPool.session('idle:80'):
+                pass
+            with ConnectionPool.session('new:80'):
+                pass
+            self.assertEqual(self.closed_hosts(), ['idle:80'])
+            with ConnectionPool.session('newer:80'):
+                pass
+            self.assertEqual(sorted(ConnectionPool.get_hosts()), ['busy:80', 'newer:80'])
+            self.assertEqual(self.closed_hosts(), ['idle:80', 'new:80'])
+
+    def test_busy_session_is_not_idle(self):
+        ConnectionPool.configure(idle_timeout=0)
+        with ConnectionPool.session('a:80') as session:
+            with ConnectionPool.session('b:80'):
+                pass
+            with ConnectionPool.session('a:80') as again:
+                self.assertIs(session, again)
+        # b was idle when a was asked for again
+        self.assertEqual(self.closed_hosts(), ['b:80'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+from __future__ import unicode_literals
+
+import contextvars
+import io
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from pyfeld import rfcmd
+from pyfeld.daemon import DaemonClient, PyfeldDaemon, ThreadOutput
+
+
+class TestThreadOutput(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.output = ThreadOutput(self.stream)
+
+    def test_capture(self):
+        buffer = io.StringIO()
+        self.output.capture(buffer)
+        self.output.write("captured\n")
+        self.output.capture(None)
+        self.output.write("stream\n")
+        self.assertEqual(buffer.getvalue(), "captured\n")
+        self.assertEqual(self.stream.getvalue(), "stream\n")
+
+    def test_worker_in_a_copied_context_writes_to_the_capture(self):
+        buffer = io.StringIO()
+
+        def command():
+            self.output.capture(buffer)
+            context = contextvars.copy_context()
+            worker = threading.Thread(target=context.run, args=(self.output.write, "from worker\n"))
+            worker.start()
+            worker.join()
+            self.output.capture(None)
+        contextvars.copy_context().run(command)
+        self.assertEqual(buffer.getvalue(), "from worker\n")
+        self.assertEqual(self.stream.getvalue(), "")
+
+    def test_commands_do_not_see_each_others_capture(self):
+        buffers = [io.StringIO(), io.StringIO()]
+        barrier = threading.Barrier(2)
+
+        def command(index):
+            self.output.capture(buffers[index])
+            barrier.wait()
+            self.output.write("command {0}\n".format(index))
+            self.output.capture(None)
+        threads = [threading.Thread(target=command, args=(index,)) for index in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([buffer.getvalue() for buffer in buffers], ["command 0\n", "command 1\n"])
+        self.assertEqual(self.stream.getvalue(), "")
+
+
+class TestDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.home = tempfile.mkdtemp()
+        self.environment = mock.patch.dict(os.environ, {'HOME': self.home})
+        self.environment.start()
+        os.mkdir(os.path.join(self.home, '.pyfeld'))
+        values = {'host': '127.0.0.1', 'devices': [], 'mediaserver': [],
+                  'zones': [{'udn': 'uuid:z1', 'name': 'Kitchen', 'host': '127.0.0.1:1',
+                             'rooms': [{'name': 'Kitchen', 'udn': 'uuid:r1', 'location': ''}]}]}
+        with open(os.path.join(self.home, '.pyfeld', 'data.json'), 'w') as f:
+            json.dump(values, f)
+        self.path = DaemonClient.socket_path()
+        rfcmd.quick_access_mtime = None
+
+    def tearDown(self):
+        rfcmd.quick_access_mtime = None
+        self.environment.stop()
+        shutil.rmtree(self.home)
+
+    def serve(self, handler):
+        """listens on the daemon socket, handler gets every connection"""
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.path)
+        server.listen(1)
+        self.addCleanup(server.close)
+
+        def accept():
+            (connection, address) = server.accept()
+            with connection:
+                handler(connection)
+        threading.Thread(target=accept, daemon=True).start()
+
+    def test_no_daemon(self):
+        self.assertIsNone(DaemonClient.run(['rooms']))
+
+    def test_daemon_closing_without_answer_is_an_error(self):
+        self.serve(lambda connection: connection.makefile('rb').readline())
+        (code, output) = DaemonClient.run(['stop'])
+        self.assertEqual(code, 1)
+        self.assertIn("without answering", output)
+
+    def test_run_main_does_not_run_a_sent_command_again(self):
+        with mock.patch.object(DaemonClient, 'run', return_value=(1, "error\n")), \
+                mock.patch.object(rfcmd, 'execute') as execute, \
+                mock.patch('sys.argv', ['pyfeld', 'stop']), \
+                mock.patch('sys.stdout', io.StringIO()):
+            with self.assertRaises(SystemExit) as exit:
+                rfcmd.run_main()
+        self.assertEqual(exit.exception.code, 1)
+        execute.assert_not_called()
+
+    def test_round_trip(self):
+        daemon = PyfeldDaemon(self.path)
+        server = threading.Thread(target=daemon.serve_forever, args=(False,), daemon=True)
+        server.start()
+        for i in range(100):
+            if daemon.running:
+                break
+            threading.Event().wait(0.01)
+        try:
+            self.assertEqual(DaemonClient.run(['rooms']), (0, "Kitchen\n"))
+            (code, output) = DaemonClient.run(['--unknownoption', 'rooms'])
+            self.assertEqual(code, 2)
+            self.assertIn("unknown option", output)
+        finally:
+            daemon.shutdown()
+            server.join(5)
+        self.assertFalse(server.is_alive())
+        self.assertFalse(os.path.exists(self.path))
+        self.assertNotIsInstance(sys.stdout, ThreadOutput)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+from __future__ import unicode_literals
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from pyfeld.descriptionCache import DescriptionCache
+
+
+class TestDescriptionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.home = tempfile.mkdtemp()
+        self.environment = mock.patch.dict(os.environ, {'HOME': self.home})
+        self.environment.start()
+        DescriptionCache.invalidate()
+
+    def tearDown(self):
+        DescriptionCache.invalidate()
+        self.environment.stop()
+        shutil.rmtree(self.home)
+
+    def saved(self):
+        with open(DescriptionCache.path()) as f:
+            return json.load(f)['entries']
+
+    def test_save(self):
+        DescriptionCache.put('http://10.0.0.5:80/d.xml', [{'serviceType': 'x'}], etag='"1"')
+        DescriptionCache.save()
+        entry = self.saved()['http://10.0.0.5:80/d.xml']
+        self.assertEqual(entry['etag'], '"1"')
+        self.assertTrue(DescriptionCache.is_fresh(entry))
+        self.assertEqual(os.listdir(os.path.dirname(DescriptionCache.path())), [DescriptionCache.file_name])
+
+    def test_writers_do_not_share_a_temporary_file(self):
+        # a fixed name like descriptions.json.tmp another process is busy with
+        os.mkdir(DescriptionCache.path() + ".tmp")
+        DescriptionCache.put('a', [])
+        with mock.patch('pyfeld.descriptionCache.err_print') as err_print:
+            DescriptionCache.save()
+        err_print.assert_not_called()
+        self.assertIn('a', self.saved())
+
+    def test_changed_config_drops_the_entry(self):
+        DescriptionCache.put('a', [])
+        DescriptionCache.note_ssdp('a', config_id='1')
+        DescriptionCache.note_ssdp('a', boot_id='7')
+        self.assertEqual(DescriptionCache.get('a')['config_id'], '1')
+        DescriptionCache.note_ssdp('a', config_id='2')
+        self.assertIsNone(DescriptionCache.get('a'))
+
+    def test_saves_while_entries_change(self):
+        errors = []
+
+        def writer(index):
+            try:
+                for i in range(50):
+                    DescriptionCache.put('http://10.0.{0}.{1}/d.xml'.format(index, i), [{'n': i}])
+                    DescriptionCache.save()
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=writer, args=(index,)) for index in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.saved()), 200)
+        self.assertEqual(os.listdir(os.path.dirname(DescriptionCache.path())), [DescriptionCache.file_name])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+from __future__ import unicode_literals
+
+import threading
+import time
+import unittest
+
+from pyfeld.fadeEngine import Fade, FadeCurve, FadeEngine
+
+
+class Target:
+    """set_volume of a fake device answering after latency seconds"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.steps = []
+
+    def __call__(self, value):
+        time.sleep(self.latency)
+        with self.lock:
+            self.steps.append((time.monotonic(), value))
+        return True
+
+    @property
+    def values(self):
+        return [value for (sent, value) in self.steps]
+
+    def intervals(self):
+        return [b[0] - a[0] for (a, b) in zip(self.steps, self.steps[1:])]
+
+
+class TestFadeCurve(unittest.TestCase):
+
+    def test_end_points(self):
+        for curve in FadeCurve.names:
+            self.assertAlmostEqual(FadeCurve.progress(curve, 0.0), 0.0, msg=curve)
+            self.assertAlmostEqual(FadeCurve.progress(curve, 1.0), 1.0, msg=curve)
+
+    def test_monotonic_and_clamped(self):
+        for curve in FadeCurve.names:
+            points = [FadeCurve.progress(curve, i / 20.0) for i in range(-2, 23)]
+            self.assertEqual(points, sorted(points), msg=curve)
+            self.assertEqual(FadeCurve.progress(curve, 2.0), 1.0)
+            self.assertEqual(FadeCurve.progress(curve, -1.0), 0.0)
+
+    def test_shapes(self):
+        self.assertGreater(FadeCurve.progress(FadeCurve.log, 0.25), 0.25)
+        self.assertLess(FadeCurve.progress(FadeCurve.scurve, 0.25), 0.25)
+        self.assertAlmostEqual(FadeCurve.progress(FadeCurve.scurve, 0.5), 0.5)
+
+
+class TestFade(unittest.TestCase):
+
+    def test_value_at(self):
+        fade = Fade([], 10, 30, 2.0)
+        self.assertEqual(fade.value_at(0.0), 10)
+        self.assertEqual(fade.value_at(1.0), 20)
+        self.assertEqual(fade.value_at(5.0), 30)
+        self.assertEqual(Fade([], 10, 30, 0).value_at(0.0), 30)
+
+    def test_unknown_curve(self):
+        with self.assertRaises(ValueError):
+            Fade([], 0, 10, 1.0, 'cubic')
+
+    def test_steps_are_at_least_min_step_interval_apart(self):
+        target = Target()
+        fade = Fade([('zone', target)], 0, 100, 0.5)
+        fade.run()
+        self.assertTrue(fade.wait(0))
+        self.assertEqual(target.values[0], 0)
+        self.assertEqual(target.values[-1], 100)
+        self.assertEqual(target.values, sorted(target.values))
+        # only changed values are sent, 100 volume steps in 0.5s are thinned out to 20 a second
+        self.assertLessEqual(len(target.steps), 0.5 / Fade.min_step_interval + 2)
+        # the end value goes out when the time is up, however close to the step before, single steps
+        # arrive with the jitter of the fan out threads
+        intervals = target.intervals()[:-1]
+        self.assertGreaterEqual(sum(intervals) / len(intervals), Fade.min_step_interval * 0.9)
+
+    def test_slow_targets_get_bigger_steps(self):
+        target = Target(0.15)
+        fade = Fade([('zone', target)], 0, 50, 0.9)
+        fade.run()
+        self.assertEqual(target.values[-1], 50)
+        self.assertLessEqual(len(target.steps), 0.9 / 0.15 + 2)
+        self.assertGreaterEqual(fade.latency, 0.1)
+
+    def test_no_steps_when_the_value_does_not_move(self):
+        target = Target()
+        Fade([('zone', target)], 20, 20, 0.3).run()
+        self.assertEqual(target.values, [20])
+
+    def test_all_targets_get_every_step(self):
+        (first, second) = (Target(), Target())
+        Fade([('a', first), ('b', second)], 5, 0, 0.2).run()
+        self.assertEqual(first.values, second.values)
+        self.assertEqual(first.values[-1], 0)
+
+
+class TestFadeEngine(unittest.TestCase):
+
+    def test_cancel_is_immediate(self):
+        target = Target()
+        done = []
+        fade = FadeEngine.start('zone-cancel', [('zone', target)], 0, 100, 10.0, on_done=lambda: done.append(1))
+        time.sleep(0.1)
+        self.assertTrue(FadeEngine.is_fading('zone-cancel'))
+        started = time.monotonic()
+        self.assertTrue(FadeEngine.cancel('zone-cancel'))
+        self.assertFalse(fade.wait(1.0))
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertFalse(FadeEngine.is_fading('zone-cancel'))
+        self.assertEqual(done, [])
+        self.assertLess(target.values[-1], 100)
+
+    def test_new_fade_replaces_the_running_one(self):
+        target = Target()
+        first = FadeEngine.start('zone-replace', [('zone', target)], 0, 100, 10.0)
+        time.sleep(0.1)
+        second = FadeEngine.start('zone-replace', [('zone', target)], 50, 0, 0.2)
+        self.assertFalse(first.wait(1.0))
+        self.assertTrue(second.wait(2.0))
+        self.assertEqual(target.values[-1], 0)
+        self.assertFalse(FadeEngine.is_fading('zone-replace'))
+
+    def test_cancel_without_fade(self):
+        self.assertFalse(FadeEngine.cancel('zone-idle'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+from __future__ import unicode_literals
+
+import unittest
+from xml.sax.saxutils import escape
+
+from pyfeld.genaListener import GenaListener, GenaSubscription
+
+
+LAST_CHANGE = ('<Event xmlns="urn:schemas-upnp-org:metadata-1-0/AVT/">'
+               '<InstanceID val="0">'
+               '<TransportState val="PLAYING"/>'
+               '<CurrentTrack val="4"/>'
+               '<CurrentTrackDuration val="0:04:00"/>'
+               '<Volume channel="Master" val="25"/>'
+               '<Volume channel="LF" val="30"/>'
+               '<Mute val="0"><Nested val="x"/></Mute>'
+               '</InstanceID>'
+               '</Event>')
+
+
+def propertyset(*properties):
+    body = '<?xml version="1.0"?><e:propertyset xmlns:e="urn:schemas-upnp-org:event-1-0">'
+    for (name, value) in properties:
+        body += '<e:property><{0}>{1}</{0}></e:property>'.format(name, escape(value))
+    return (body + '</e:propertyset>').encode('utf-8')
+
+
+class TestParse(unittest.TestCase):
+
+    def test_last_change(self):
+        variables = GenaListener.parse_last_change(LAST_CHANGE)
+        self.assertEqual(variables, {'TransportState': 'PLAYING',
+                                     'CurrentTrack': '4',
+                                     'CurrentTrackDuration': '0:04:00',
+                                     'Volume': '25',
+                                     'Mute': '0'})
+
+    def test_unreadable_last_change(self):
+        self.assertEqual(GenaListener.parse_last_change('<Event><InstanceID val="0">'), dict())
+
+    def test_propertyset_unpacks_last_change(self):
+        variables = GenaListener.parse_propertyset(propertyset(('LastChange', LAST_CHANGE),
+                                                               ('SecondsSinceStart', '12')))
+        self.assertNotIn('LastChange', variables)
+        self.assertEqual(variables['TransportState'], 'PLAYING')
+        self.assertEqual(variables['Volume'], '25')
+        self.assertEqual(variables['SecondsSinceStart'], '12')
+
+    def test_propertyset_without_last_change(self):
+        self.assertEqual(GenaListener.parse_propertyset(propertyset(('Volume', '7'))), {'Volume': '7'})
+
+
+class TestNotify(unittest.TestCase):
+
+    def setUp(self):
+        self.sid_wait = GenaListener.sid_wait
+        GenaListener.sid_wait = 0.05
+        self.listener = GenaListener()
+
+    def tearDown(self):
+        GenaListener.sid_wait = self.sid_wait
+
+    def test_notify_known_subscription(self):
+        events = []
+        subscription = GenaSubscription("http://device/Event", events.append)
+        subscription.sid = 'uuid:sid-1'
+        self.listener.subscriptions[subscription.sid] = subscription
+        self.assertTrue(self.listener.notify('uuid:sid-1', propertyset(('LastChange', LAST_CHANGE))))
+        self.assertEqual(events[0]['CurrentTrack'], '4')
+
+    def test_notify_unknown_sid(self):
+        self.assertFalse(self.listener.notify('uuid:nobody', propertyset(('Volume', '7'))))
+
+    def test_failing_callback_is_still_known(self):
+        def callback(variables):
+            raise RuntimeError("broken handler")
+        subscription = GenaSubscription("http://device/Event", callback)
+        subscription.sid = 'uuid:sid-2'
+        self.listener.subscriptions[subscription.sid] = subscription
+        self.assertTrue(self.listener.notify('uuid:sid-2', propertyset(('Volume', '7'))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+from __future__ import unicode_literals
+
+import unittest
+from unittest import mock
+
+from pyfeld.localNetwork import LocalInterface, LocalNetwork
+
+
+class TestLocalInterface(unittest.TestCase):
+
+    def test_real_netmask(self):
+        self.assertEqual(LocalInterface('eth0', '10.1.2.3', '255.255.254.0').scan_range(1024), '10.1.2.0/23')
+        self.assertEqual(LocalInterface('eth0', '192.168.1.7', '255.255.255.192').scan_range(1024),
+                         '192.168.1.0/26')
+
+    def test_large_subnet_is_narrowed_to_a_22(self):
+        self.assertEqual(LocalInterface('eth0', '10.20.30.40', '255.0.0.0').scan_range(1024), '10.20.28.0/22')
+
+
+class TestLocalNetwork(unittest.TestCase):
+
+    def test_every_attached_subnet_once(self):
+        interfaces = [LocalInterface('eth0', '192.168.1.7', '255.255.255.0'),
+                      LocalInterface('eth0:1', '192.168.1.8', '255.255.255.0'),
+                      LocalInterface('wlan0', '10.20.30.40', '255.255.0.0')]
+        with mock.patch.object(LocalNetwork, 'interfaces', return_value=interfaces):
+            self.assertEqual(LocalNetwork.scan_ranges(), ['192.168.1.0/24', '10.20.28.0/22'])
+
+    def test_loopback_is_left_out(self):
+        self.assertNotIn('127.0.0.1', LocalNetwork.addresses())
+
+
+if __name__ == '__main__':
+    unittest.main()
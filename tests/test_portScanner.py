@@ -0,0 +1,46 @@
+from __future__ import unicode_literals
+
+import socket
+import threading
+import time
+import unittest
+
+from pyfeld.portScanner import PortScanner
+
+
+class TestHosts(unittest.TestCase):
+
+    def test_ranges_are_interleaved(self):
+        self.assertEqual(list(PortScanner.hosts("10.0.0.0/30, 10.0.1.0/30")),
+                         ['10.0.0.1', '10.0.1.1', '10.0.0.2', '10.0.1.2'])
+
+    def test_each_address_once(self):
+        self.assertEqual(list(PortScanner.hosts(['10.0.0.0/30', '10.0.0.2/32', 'garbage'])),
+                         ['10.0.0.1', '10.0.0.2'])
+
+
+class TestScan(unittest.TestCase):
+
+    def setUp(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(8)
+        self.port = self.listener.getsockname()[1]
+
+    def tearDown(self):
+        self.listener.close()
+
+    def test_finds_the_listening_address(self):
+        found = list(PortScanner.scan("127.0.0.1/32 127.0.0.2/32", port=self.port, timeout=0.5))
+        self.assertEqual(found, ['127.0.0.1'])
+
+    def test_stop_ends_the_scan(self):
+        stop = threading.Event()
+        stop.set()
+        started = time.monotonic()
+        self.assertEqual(list(PortScanner.scan("127.0.0.1/32", port=self.port, stop=stop)), [])
+        self.assertLess(time.monotonic() - started, 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
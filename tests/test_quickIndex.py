@@ -0,0 +1,96 @@
+from __future__ import unicode_literals
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from pyfeld.quickIndex import QuickIndex
+from pyfeld.settings import Settings
+
+
+VALUES = {'host': '192.168.1.2',
+          'zones': [{'udn': 'uuid:z1', 'name': 'Kitchen, Living', 'host': 'http://192.168.1.10:8080',
+                     'rooms': [{'name': 'Kitchen', 'udn': 'uuid:r1', 'renderer_udn': 'uuid:rr1'},
+                               {'name': 'Living', 'udn': 'uuid:r3', 'renderer_udn': 'uuid:rr3'}]},
+                    {'udn': 'None', 'name': 'unassigned room', 'host': None,
+                     'rooms': [{'name': 'Bath', 'udn': 'uuid:r2'}]},
+                    {'udn': 'uuid:z2', 'name': 'Empty', 'host': 'http://192.168.1.11:8080', 'rooms': None}],
+          'devices': [{'udn': 'uuid:d1', 'type': 'urn:schemas-raumfeld-com:device:RaumfeldDevice:1'}],
+          'mediaserver': [{'udn': 'uuid:ms', 'type': 'urn:schemas-upnp-org:device:MediaServer:1'}]}
+
+
+class TestQuickIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.home = tempfile.mkdtemp()
+        self.environment = mock.patch.dict(os.environ, {'HOME': self.home})
+        self.environment.start()
+        self.data_path = Settings.home_directory() + "/data.json"
+
+    def tearDown(self):
+        self.environment.stop()
+        shutil.rmtree(self.home)
+
+    def write_data(self, values):
+        with open(self.data_path, 'w') as f:
+            json.dump(values, f)
+
+    def test_lookups(self):
+        index = QuickIndex.from_values(VALUES)
+        self.assertEqual(index.room_udn('Living'), 'uuid:r3')
+        self.assertEqual(index.room_zone_index('Living'), 0)
+        self.assertEqual(index.room_host('Kitchen'), 'http://192.168.1.10:8080')
+        self.assertEqual(index.room_zone_index('Bath'), 1)
+        self.assertIsNone(index.room_udn('Cellar'))
+        self.assertEqual(index.room_zone_index('Cellar'), -1)
+
+    def test_unassigned(self):
+        index = QuickIndex.from_values(VALUES)
+        self.assertEqual(index.unassigned, ['Bath'])
+        self.assertTrue(index.is_unassigned('Bath'))
+        self.assertFalse(index.is_unassigned('Kitchen'))
+
+    def test_entities(self):
+        index = QuickIndex.from_values(VALUES)
+        self.assertEqual(index.entity('uuid:z1'), ['zone', 0, 'Kitchen, Living'])
+        self.assertEqual(index.entity('uuid:r2'), ['room', 1, 'Bath'])
+        self.assertEqual(index.entity('uuid:rr3'), ['renderer', 0, 'Living'])
+        self.assertEqual(index.entity('uuid:ms')[0], 'mediaserver')
+        self.assertEqual(index.entity('uuid:d1')[0], 'device')
+        self.assertIsNone(index.entity('None'))
+
+    def test_save_and_load(self):
+        self.write_data(VALUES)
+        QuickIndex.save(VALUES, self.data_path)
+        index = QuickIndex.load(self.data_path)
+        self.assertIsNotNone(index)
+        self.assertEqual(index.room_udn('Kitchen'), 'uuid:r1')
+
+    def test_missing_index(self):
+        self.write_data(VALUES)
+        self.assertIsNone(QuickIndex.load(self.data_path))
+
+    def test_stale_index(self):
+        self.write_data(VALUES)
+        QuickIndex.save(VALUES, self.data_path)
+        changed = dict(VALUES, host='192.168.1.3')
+        self.write_data(changed)
+        os.utime(self.data_path, ns=(0, 0))
+        self.assertIsNone(QuickIndex.load(self.data_path))
+
+    def test_other_version(self):
+        self.write_data(VALUES)
+        QuickIndex.save(VALUES, self.data_path)
+        with open(QuickIndex.path(), 'r') as f:
+            content = json.load(f)
+        content['version'] = QuickIndex.version + 1
+        with open(QuickIndex.path(), 'w') as f:
+            json.dump(content, f)
+        self.assertIsNone(QuickIndex.load(self.data_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+from __future__ import unicode_literals
+
+import contextlib
+import http.server
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from pyfeld import rfcmd
+from pyfeld.callPolicy import CircuitBreaker
+from pyfeld.connectionPool import ConnectionPool
+
+
+class FakeZone(http.server.BaseHTTPRequestHandler):
+    """renderer of one zone, remembers the SOAP actions it got"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        action = self.headers.get('SOAPACTION', '').strip('"').split('#')[-1]
+        self.server.actions.append(action)
+        body = ('<?xml version="1.0"?><s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"><s:Body>'
+                '<u:{0}Response xmlns:u="urn:x">{1}</u:{0}Response></s:Body></s:Envelope>').format(
+            action, '<CurrentVolume>{0}</CurrentVolume>'.format(self.server.volume) if action == 'GetVolume' else '')
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_zone(volume):
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FakeZone)
+    server.daemon_threads = True
+    server.actions = []
+    server.volume = volume
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class TestBatchLines(unittest.TestCase):
+
+    def test_line_options(self):
+        self.assertEqual(rfcmd.get_line_options(['-r', 'Bath', '--json', 'seek', '-1']), ['-r', '--json'])
+        self.assertEqual(rfcmd.get_line_options(['stop']), [])
+
+    def test_own_zone_replaces_the_batch_zone(self):
+        self.assertEqual(rfcmd.get_batch_line(['--json'], ['-r', 'Kitchen'], ['-m', '1'], ['-r', 'Bath', 'stop']),
+                         ['--json', '-m', '1', '-r', 'Bath', 'stop'])
+        self.assertEqual(rfcmd.get_batch_line([], ['-r', 'Kitchen'], [], ['-a', 'stop']), ['-a', 'stop'])
+        self.assertEqual(rfcmd.get_batch_line([], ['-r', 'Kitchen'], ['-m', '1'], ['-m', '0', 'play', 'x']),
+                         ['-r', 'Kitchen', '-m', '0', 'play', 'x'])
+
+    def test_batch_zone_applies_to_lines_naming_none(self):
+        self.assertEqual(rfcmd.get_batch_line(['--timeout', '2'], ['-z', '1'], [], ['stop']),
+                         ['--timeout', '2', '-z', '1', 'stop'])
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.home = tempfile.mkdtemp()
+        self.environment = mock.patch.dict(os.environ, {'HOME': self.home})
+        self.environment.start()
+        self.kitchen = start_zone(11)
+        self.bath = start_zone(22)
+        values = {'host': '127.0.0.1', 'devices': [],
+                  'mediaserver': [{'udn': 'uuid:ms', 'location': self.zone('', '', self.kitchen)['host']}],
+                  'zones': [self.zone('uuid:z1', 'Kitchen', self.kitchen), self.zone('uuid:z2', 'Bath', self.bath)]}
+        os.mkdir(os.path.join(self.home, '.pyfeld'))
+        with open(os.path.join(self.home, '.pyfeld', 'data.json'), 'w') as f:
+            json.dump(values, f)
+        self.batch = os.path.join(self.home, 'batch.txt')
+        rfcmd.quick_access_mtime = None
+        CircuitBreaker.reset()
+
+    def tearDown(self):
+        for server in (self.kitchen, self.bath):
+            server.shutdown()
+            server.server_close()
+        ConnectionPool.close_all()
+        rfcmd.quick_access_mtime = None
+        self.environment.stop()
+        shutil.rmtree(self.home)
+
+    @staticmethod
+    def zone(udn, name, server):
+        return {'udn': udn, 'name': name, 'host': "127.0.0.1:{0}".format(server.server_address[1]),
+                'rooms': [{'name': name, 'udn': udn + ':room', 'location': ''}]}
+
+    def run_batch(self, lines, *options):
+        with open(self.batch, 'w') as f:
+            f.write(lines)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            code = rfcmd.execute(['pyfeld'] + list(options) + ['--batch', self.batch])
+        return code, output.getvalue().splitlines()
+
+    def test_one_line_per_command(self):
+        (code, lines) = self.run_batch("# volumes\n-r Kitchen getvolume\n\n-r Bath getvolume\nrooms\n")
+        self.assertEqual(code, 0)
+        self.assertEqual(lines, ['11', '22', 'Bath\tKitchen'])
+
+    def test_line_selection_replaces_the_batch_selection(self):
+        (code, lines) = self.run_batch("-r Bath stop\nnext\n", '-r', 'Kitchen')
+        self.assertEqual(code, 0)
+        self.assertEqual(self.bath.actions, ['Stop'])
+        self.assertEqual(self.kitchen.actions, ['Next'])
+
+    def test_options_after_batch(self):
+        with open(self.batch, 'w') as f:
+            f.write("-r Kitchen getvolume\n")
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            code = rfcmd.execute(['pyfeld', '--batch', self.batch, '--json', '--parallel', '2'])
+        self.assertEqual(code, 0)
+        self.assertEqual(json.loads(output.getvalue())['command'], "-r Kitchen getvolume")
+
+    def test_failed_device_command_fails_the_batch(self):
+        self.bath.shutdown()
+        self.bath.server_close()
+        (code, lines) = self.run_batch("-r Bath stop\n-r Kitchen getvolume\n")
+        self.assertEqual(code, 1)
+        self.assertTrue(lines[0].endswith("error"))
+        self.assertEqual(lines[1], '11')
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(rfcmd.execute(['pyfeld', '-r', 'Bath', 'getvolume']), 1)
+            self.assertEqual(rfcmd.execute(['pyfeld', '-r', 'Kitchen', 'getvolume']), 0)
+
+    def test_fan_out_prints_stay_on_their_line(self):
+        self.bath.shutdown()
+        self.bath.server_close()
+        (code, lines) = self.run_batch("-a getvolume\nrooms\n", '--parallel', '2')
+        self.assertEqual(code, 1)
+        self.assertEqual(len(lines), 2)
+        self.assertIn("Bath\terror", lines[0])
+        self.assertEqual(lines[1], 'Bath\tKitchen')
+
+
+if __name__ == '__main__':
+    unittest.main()
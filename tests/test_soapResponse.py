@@ -0,0 +1,74 @@
+from __future__ import unicode_literals
+
+import unittest
+
+from pyfeld.soapResponse import SoapResponseParser, SoapResult, VolumeInfo, PositionInfo, timecode_to_seconds
+
+
+def envelope(body):
+    return ('<?xml version="1.0"?>'
+            '<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/" '
+            's:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">'
+            '<s:Body>' + body + '</s:Body></s:Envelope>').encode('utf-8')
+
+
+POSITION = envelope('<u:GetPositionInfoResponse xmlns:u="urn:schemas-upnp-org:service:AVTransport:1">'
+                    '<Track>3</Track>'
+                    '<TrackDuration>0:03:20</TrackDuration>'
+                    '<TrackMetaData>&lt;DIDL-Lite&gt;&lt;/DIDL-Lite&gt;</TrackMetaData>'
+                    '<TrackURI></TrackURI>'
+                    '<RelTime>0:01:05</RelTime>'
+                    '<AbsTime>0:01:05</AbsTime>'
+                    '<Unwanted>x</Unwanted>'
+                    '</u:GetPositionInfoResponse>')
+
+FAULT = envelope('<s:Fault><faultcode>s:Client</faultcode><faultstring>UPnPError</faultstring>'
+                 '<detail><UPnPError xmlns="urn:schemas-upnp-org:control-1-0">'
+                 '<errorCode>701</errorCode><errorDescription>Transition not available</errorDescription>'
+                 '</UPnPError></detail></s:Fault>')
+
+
+class TestSoapResponseParser(unittest.TestCase):
+
+    def test_out_arguments(self):
+        result = SoapResponseParser.parse(POSITION, PositionInfo)
+        self.assertIsInstance(result, PositionInfo)
+        self.assertIsNone(result.error)
+        self.assertEqual(result.track, 3)
+        self.assertEqual(result.duration, 200)
+        self.assertEqual(result.position, 65)
+        self.assertEqual(result['TrackMetaData'], '<DIDL-Lite></DIDL-Lite>')
+
+    def test_keys_wanted_and_empty_values_are_left_out(self):
+        result = SoapResponseParser.parse(POSITION, PositionInfo)
+        self.assertNotIn('Unwanted', result)
+        self.assertNotIn('TrackURI', result)
+        self.assertIn('Unwanted', SoapResponseParser.parse(POSITION, SoapResult))
+
+    def test_fed_in_small_chunks(self):
+        parser = SoapResponseParser(PositionInfo)
+        for i in range(0, len(POSITION), 7):
+            parser.feed(POSITION[i:i + 7])
+        self.assertEqual(dict(parser.close()), dict(SoapResponseParser.parse(POSITION, PositionInfo)))
+
+    def test_fault(self):
+        result = SoapResponseParser.parse(FAULT)
+        self.assertEqual(result.error, 'Transition not available')
+        self.assertEqual(len(result), 0)
+
+    def test_missing_values(self):
+        result = SoapResponseParser.parse(envelope('<u:GetVolumeResponse xmlns:u="x"/>'), VolumeInfo)
+        self.assertEqual(result.volume, -1)
+
+
+class TestTimecode(unittest.TestCase):
+
+    def test_timecode_to_seconds(self):
+        self.assertEqual(timecode_to_seconds('1:02:03'), 3723)
+        self.assertEqual(timecode_to_seconds('0:00:10.500'), 10)
+        self.assertEqual(timecode_to_seconds('NOT_IMPLEMENTED'), -1)
+        self.assertEqual(timecode_to_seconds(''), -1)
+
+
+if __name__ == '__main__':
+    unittest.main()
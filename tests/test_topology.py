@@ -0,0 +1,72 @@
+from __future__ import unicode_literals
+
+import unittest
+
+from pyfeld.topology import Topology
+
+
+ZONES = '''<?xml version="1.0" encoding="utf-8"?>
+<zoneConfig numRooms="3" spotifyMode="multi">
+  <zones>
+    <zone udn="uuid:zone-1">
+      <room color="4294967295" name="Kitchen" udn="uuid:room-1">
+        <renderer name="Speaker K" udn="uuid:renderer-1"/>
+      </room>
+      <room name="Bath" udn="uuid:room-2">
+        <renderer name="Speaker B" udn="uuid:renderer-2"/>
+        <renderer name="Speaker B2" udn="uuid:renderer-3"/>
+      </room>
+    </zone>
+  </zones>
+  <unassignedRooms>
+    <room name="Garden" udn="uuid:room-3"/>
+  </unassignedRooms>
+</zoneConfig>'''
+
+DEVICES = '''<?xml version="1.0" encoding="utf-8"?>
+<devices>
+  <device location="http://10.0.0.2:47365/zone.xml" type="urn:schemas-upnp-org:device:MediaRenderer:1" udn="uuid:zone-1">Virtual Media Player</device>
+  <device location="http://10.0.0.7:52000/r.xml" type="urn:schemas-upnp-org:device:MediaRenderer:1" udn="uuid:renderer-1">Speaker K</device>
+  <device location="http://10.0.0.2:52001/ms.xml" type="urn:schemas-upnp-org:device:MediaServer:1" udn="uuid:media">Raumfeld MediaServer</device>
+  <device type="urn:schemas-upnp-org:device:MediaRenderer:1" udn="uuid:renderer-2">Speaker B</device>
+</devices>'''
+
+
+class TestTopology(unittest.TestCase):
+
+    def setUp(self):
+        self.topology = Topology.parse(ZONES, DEVICES)
+
+    def test_zones_and_rooms(self):
+        (zone,) = self.topology.zones
+        self.assertEqual(zone.udn, 'uuid:zone-1')
+        self.assertEqual([room.name for room in zone.rooms], ['Kitchen', 'Bath'])
+        self.assertEqual(zone.rooms[1].renderer_udns, ['uuid:renderer-2', 'uuid:renderer-3'])
+        self.assertEqual(zone.rooms[1].renderer_udn, 'uuid:renderer-2')
+        self.assertEqual([room.name for room in self.topology.unassigned.rooms], ['Garden'])
+        self.assertIsNone(self.topology.unassigned.rooms[0].renderer_udn)
+        self.assertEqual(len(self.topology.all_zones()), 2)
+
+    def test_locations(self):
+        self.assertEqual(self.topology.location('uuid:zone-1'), 'http://10.0.0.2:47365/zone.xml')
+        self.assertIsNone(self.topology.location('uuid:renderer-2'))
+        self.assertIsNone(self.topology.location(None))
+        self.assertEqual(list(self.topology.room_locations()),
+                         ['http://10.0.0.2:47365/zone.xml', 'http://10.0.0.7:52000/r.xml', None, None, None])
+
+    def test_devices_of_type(self):
+        servers = self.topology.devices_of_type('urn:schemas-upnp-org:device:MediaServer:1', 'Raumfeld MediaServer')
+        self.assertEqual([device.udn for device in servers], ['uuid:media'])
+        self.assertEqual(self.topology.devices_of_type('urn:schemas-upnp-org:device:MediaServer:1', 'Other'), [])
+        self.assertEqual(len(self.topology.devices_of_type('urn:schemas-upnp-org:device:MediaRenderer:1')), 3)
+
+    def test_zone_key(self):
+        (zone,) = self.topology.zones
+        same = Topology.parse(ZONES, DEVICES)
+        self.assertEqual(self.topology.zone_key(zone), same.zone_key(same.zones[0]))
+        moved = Topology.parse(ZONES, DEVICES.replace('10.0.0.7', '10.0.0.8'))
+        self.assertNotEqual(self.topology.zone_key(zone), moved.zone_key(moved.zones[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
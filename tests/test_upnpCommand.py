@@ -0,0 +1,110 @@
+from __future__ import unicode_literals
+
+import contextvars
+import http.server
+import threading
+import unittest
+
+from pyfeld.callPolicy import CircuitBreaker
+from pyfeld.connectionPool import ConnectionPool
+from pyfeld.upnpCommand import UpnpCommand
+
+
+VOLUME = (b'<?xml version="1.0"?>'
+          b'<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"><s:Body>'
+          b'<u:GetVolumeResponse xmlns:u="urn:schemas-upnp-org:service:RenderingControl:1">'
+          b'<CurrentVolume>42</CurrentVolume></u:GetVolumeResponse>'
+          b'</s:Body></s:Envelope>')
+
+# longer than UpnpCommand.chunk_size, the parser fails while most of the body is still unread
+ERROR_PAGE = b'<html><body><h1>Internal error</h1><p></body>' + b' ' * 65536 + b'</html>'
+
+
+class FakeDevice(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        (status, body) = self.server.answer
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestHostSend(unittest.TestCase):
+
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FakeDevice)
+        self.server.daemon_threads = True
+        self.server.answer = (200, VOLUME)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.uc = UpnpCommand("127.0.0.1:{0}".format(self.server.server_address[1]))
+        CircuitBreaker.reset()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        ConnectionPool.close_all()
+        CircuitBreaker.reset()
+
+    def call_all(self, count):
+        """volume infos of count calls, fails instead of hanging when the pool runs dry"""
+        results = []
+        caller = threading.Thread(target=lambda: results.extend(self.uc.get_volume_info() for i in range(count)))
+        caller.daemon = True
+        caller.start()
+        caller.join(10)
+        self.assertFalse(caller.is_alive(), "calls hang, connections are not given back to the pool")
+        return results
+
+    def test_volume(self):
+        self.assertEqual(self.uc.get_volume_info().volume, 42)
+
+    def test_unreadable_answers_release_their_connection(self):
+        self.server.answer = (500, ERROR_PAGE)
+        results = self.call_all(ConnectionPool.pool_size + 2)
+        self.assertEqual([result.volume for result in results], [-1] * (ConnectionPool.pool_size + 2))
+        self.server.answer = (200, VOLUME)
+        self.assertEqual(self.call_all(1)[0].volume, 42)
+
+    def test_raw_socket(self):
+        def command():
+            UpnpCommand.set_raw_socket(True)
+            return UpnpCommand.uses_raw_socket(), self.uc.get_volume_info().volume
+        self.assertEqual(contextvars.copy_context().run(command), (True, 42))
+        self.assertFalse(UpnpCommand.uses_raw_socket())
+
+    def test_fan_out(self):
+        result = UpnpCommand.fan_out([('a', self.uc.get_volume_info, ()),
+                                      ('b', self.uc.set_volume, (10,))])
+        self.assertEqual([target.target for target in result.targets], ['a', 'b'])
+        self.assertEqual(result.failed, [])
+        self.assertEqual(result.targets[0].result.volume, 42)
+
+    def test_fan_out_reports_dead_hosts(self):
+        dead = UpnpCommand("127.0.0.1:1")
+        result = UpnpCommand.fan_out([('live', self.uc.get_volume_info, ()),
+                                      ('dead get', dead.get_volume_info, ()),
+                                      ('dead set', dead.set_volume, (10,))])
+        self.assertEqual([target.target for target in result.failed], ['dead get', 'dead set'])
+        targets = result.to_dict()['targets']
+        self.assertTrue(targets[0]['ok'])
+        self.assertFalse(targets[1]['ok'])
+        self.assertNotIn('result', targets[1])
+        self.assertEqual(targets[1]['error'], "no answer")
+
+    def test_empty_answer_is_no_answer(self):
+        self.server.answer = (200, b'<?xml version="1.0"?><s:Envelope xmlns:s="x"><s:Body>'
+                                   b'<u:GetVolumeResponse xmlns:u="y"/></s:Body></s:Envelope>')
+        self.assertEqual(UpnpCommand.fan_out([('zone', self.uc.get_volume_info, ())]).to_dict()['failed'], 1)
+        # actions answer without out-arguments
+        self.assertEqual(UpnpCommand.fan_out([('zone', self.uc.set_volume, (10,))]).to_dict()['failed'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+from __future__ import unicode_literals
+
+import unittest
+from unittest import mock
+
+import urllib3
+
+from pyfeld.callPolicy import CircuitBreaker, Deadline
+from pyfeld.upnpsoap import UpnpSoap
+
+
+class TestRequest(unittest.TestCase):
+
+    def setUp(self):
+        self.get_timeout = UpnpSoap.get_timeout
+        CircuitBreaker.reset()
+
+    def tearDown(self):
+        UpnpSoap.configure_get(timeout=self.get_timeout)
+        CircuitBreaker.reset()
+
+    def test_configured_connect_timeout_holds(self):
+        UpnpSoap.configure_get(timeout=urllib3.Timeout(connect=0.3, read=5.0))
+        http = mock.Mock()
+        with mock.patch.object(UpnpSoap, 'get_pool_manager', return_value=http):
+            UpnpSoap.request("GET", "http://127.0.0.1:1/description.xml")
+        timeout = http.request.call_args[1]['timeout']
+        self.assertEqual(timeout.connect_timeout, 0.3)
+        self.assertEqual(timeout.read_timeout, Deadline.timeout())
+
+    def test_deadline_caps_the_connect_timeout(self):
+        UpnpSoap.configure_get(timeout=urllib3.Timeout(connect=2.0, read=5.0))
+        self.assertEqual(UpnpSoap.attempt_timeout(0.5).connect_timeout, 0.5)
+        UpnpSoap.configure_get(timeout=urllib3.Timeout(read=5.0))
+        self.assertEqual(UpnpSoap.attempt_timeout(0.5).connect_timeout, 0.5)
+
+    def test_breaker_key_is_the_device_endpoint(self):
+        http = mock.Mock()
+        http.request.side_effect = urllib3.exceptions.NewConnectionError(None, "refused")
+        with mock.patch.object(UpnpSoap, 'get_pool_manager', return_value=http), \
+                mock.patch('sys.stdout'):
+            for i in range(CircuitBreaker.failure_threshold):
+                self.assertIsNone(UpnpSoap.request("GET", "http://10.0.0.5/description.xml", idempotent=False))
+        self.assertTrue(CircuitBreaker.is_open("10.0.0.5:80"))
+        self.assertTrue(CircuitBreaker.is_open("10.0.0.5"))
+        self.assertFalse(CircuitBreaker.is_open("10.0.0.5:47365"))
+
+
+class TestBreakerKey(unittest.TestCase):
+
+    def test_key(self):
+        self.assertEqual(CircuitBreaker.key("10.0.0.5"), "10.0.0.5:80")
+        self.assertEqual(CircuitBreaker.key("10.0.0.5:47365"), "10.0.0.5:47365")
+        self.assertEqual(CircuitBreaker.key("Host.local"), "host.local:80")
+        self.assertEqual(CircuitBreaker.key("[fe80::1]"), "[fe80::1]:80")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+from __future__ import unicode_literals
+
+import threading
+import time
+import unittest
+from unittest import mock
+
+from pyfeld.ssdp import SsdpListener, SsdpResponse
+from pyfeld.upnpService import Services
+from pyfeld.zonesHandler import ZonesHandler
+
+
+def notify(nts, location='http://10.0.0.7:52000/description.xml'):
+    return SsdpResponse({'nt': 'urn:schemas-raumfeld-com:device:RaumfeldDevice:1', 'nts': nts,
+                         'usn': 'uuid:speaker::urn:schemas-raumfeld-com:device:RaumfeldDevice:1',
+                         'location': location}, ('10.0.0.7', 1900))
+
+
+class TestPresence(unittest.TestCase):
+
+    def setUp(self):
+        self.devices = ZonesHandler.raumfeld_device
+        ZonesHandler.raumfeld_device = set()
+        self.fetching = threading.Event()
+        self.answer = threading.Event()
+        self.changes = []
+        self.changed = threading.Event()
+        self.fetch = mock.patch.object(Services, 'get_services_from_location', side_effect=self.description)
+        self.fetch.start()
+        self.listen = mock.patch.object(SsdpListener, 'start')
+        self.listen.start()
+        self.handler = ZonesHandler()
+        self.handler.start_presence_listener(self.on_change)
+        self.on_notify = self.handler.presence_listener.callback
+
+    def tearDown(self):
+        self.answer.set()
+        self.handler.stop_presence_listener()
+        self.listen.stop()
+        self.fetch.stop()
+        ZonesHandler.raumfeld_device = self.devices
+
+    def description(self, location):
+        self.fetching.set()
+        self.answer.wait(5)
+        return [{'serviceType': 'urn:schemas-upnp-org:service:RenderingControl:1'}]
+
+    def on_change(self, nts, device):
+        self.changes.append((nts, device.udn))
+        self.changed.set()
+
+    def test_description_is_fetched_off_the_listener_thread(self):
+        started = time.monotonic()
+        self.on_notify(notify(SsdpListener.alive))
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertTrue(self.fetching.wait(5))
+        self.assertEqual(ZonesHandler.raumfeld_device, set())
+        # the announcement repeated while the fetch runs starts no second one
+        self.on_notify(notify(SsdpListener.alive))
+        self.answer.set()
+        self.assertTrue(self.changed.wait(5))
+        self.assertEqual(self.changes, [(SsdpListener.alive, 'uuid:speaker')])
+        (device,) = ZonesHandler.raumfeld_device
+        self.assertEqual(device.location, 'http://10.0.0.7:52000')
+        self.assertEqual(len(device.upnp_service.get_services_list()), 1)
+
+    def test_byebye_during_the_fetch_wins(self):
+        self.on_notify(notify(SsdpListener.alive))
+        self.assertTrue(self.fetching.wait(5))
+        self.on_notify(notify(SsdpListener.byebye))
+        self.answer.set()
+        self.handler.presence_executor.shutdown(wait=True)
+        self.assertEqual(ZonesHandler.raumfeld_device, set())
+        self.assertEqual(self.changes, [])
+
+
+if __name__ == '__main__':
+    unittest.main()